@@ -9,6 +9,57 @@ class Settings(BaseSettings):
     deepseek_api_key: str
     deepseek_api_base_url: str = "https://api.deepseek.com/v1"
     
+    # Outbound HTTP connection pools (one per upstream host)
+    http_max_connections: int = 50
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_timeout: float = 30.0
+    http_connect_timeout: float = 5.0
+    
+    # Explanation generation in /api/v1/search/answer
+    explanation_mode: str = "batch"          # "batch" (one LLM call) or "parallel" (one call per item)
+    explanation_concurrency: int = 3         # concurrent LLM calls per request
+    explanation_deadline_seconds: float = 12.0  # items still pending after this get fallback text
+    explanation_batch_share: float = 0.6     # share of the deadline the batch call may use; the rest is for per-item retries
+    
+    # Circuit breaker for LLM providers (see app/services/circuit_breaker.py)
+    circuit_window_seconds: float = 60.0     # sliding window for error rate and p95 latency
+    circuit_min_calls: int = 5               # calls in the window before the breaker may open
+    circuit_error_rate: float = 0.5          # open at this error rate...
+    circuit_p95_seconds: float = 12.0        # ...or at this p95 latency
+    circuit_open_seconds: float = 30.0       # fail fast for this long, then send a trial request
+    
+    # Outbound LLM rate limits, shared by all worker processes (see app/services/llm_rate_limiter.py)
+    llm_limiter_path: str = ""               # SQLite file for the buckets (created 0600); defaults to app/data/llm_limits.db
+    llm_max_concurrency: int = 8             # in-flight LLM calls per provider per process
+    llm_interactive_deadline: float = 10.0   # user-facing calls give up (and fall back) after this wait
+    llm_background_deadline: float = 120.0
+    llm_background_reserve: float = 0.25     # share of each bucket background calls must leave free
+    deepseek_rpm: int = 60
+    deepseek_tpm: int = 100000
+    groq_rpm: int = 30
+    groq_tpm: int = 6000
+    
+    # Persistent LLM completion cache (see app/services/llm_cache.py)
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = ""                 # SQLite file (created 0600); defaults to app/data/llm_cache.db
+    llm_cache_ttl: float = 604800.0          # 7 days
+    llm_cache_size: int = 5000               # entries kept (least recently used are evicted)
+    llm_cache_pool_size: int = 5             # samples kept per prompt for creative (dua) calls
+    
+    # Coalescing of identical concurrent calls (see app/services/single_flight.py)
+    single_flight_timeout: float = 45.0      # seconds a caller waits for a shared in-flight call
+    
+    # Asynchronous dua jobs (/api/v1/dua/jobs)
+    dua_job_workers: int = 4                 # concurrent LLM calls for dua jobs
+    dua_job_max_pending: int = 500           # submissions are rejected (503) beyond this
+    dua_job_stale_seconds: int = 300         # running jobs older than this are re-queued on startup
+    dua_job_callback_hosts: str = ""         # comma-separated allowlist for callback_url hosts (empty: any public host)
+    
+    # Keyset pagination of list endpoints (see app/services/pagination.py)
+    page_size_default: int = 50              # rows per page when the request gives no limit
+    page_size_max: int = 100                 # largest limit a request may ask for
+    
     # Server
     api_host: str = "0.0.0.0"
     api_port: int = 8000
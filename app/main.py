@@ -1,11 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import Base, engine
+from app.migrations import run_migrations
 from app.routes import search, health, imam, chat, dua
 from app.config import settings
+from app.services.http_clients import close_http_clients
+from app.services.dua_jobs import dua_job_queue
 
-# Create tables
+# Create tables, then bring existing ones up to date
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -21,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset cursor of list endpoints
 )
 
 # Include routers
@@ -30,6 +35,17 @@ app.include_router(imam.router)
 app.include_router(chat.router)
 app.include_router(dua.router)
 
+@app.on_event("startup")
+async def startup():
+    """Start dua job workers (re-queues jobs left over from a previous run)"""
+    await dua_job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop dua job workers and close pooled outbound HTTP connections"""
+    await dua_job_queue.stop()
+    await close_http_clients()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -0,0 +1,168 @@
+"""
+Versioned schema changes for existing databases
+
+Base.metadata.create_all() creates missing tables (with their indexes) but
+never alters a table that already exists. Columns and indexes added to the
+models later are applied here instead: MIGRATIONS is an ordered list of
+(version, description, apply) steps, and the versions already applied are
+recorded in the schema_migrations table.
+
+Every step is idempotent (columns are added only when missing, indexes are
+created with CREATE INDEX IF NOT EXISTS) and skips tables that do not exist
+yet (create_all() creates those complete), so it is safe on databases that
+were created fresh from the current models, on Postgres and SQLite alike.
+app/main.py runs pending migrations at startup, right after create_all().
+
+Add a step by appending to MIGRATIONS; never edit one that has shipped.
+
+Several workers may start at once. Each step runs under a migration lock
+(a transaction-level advisory lock on Postgres, BEGIN IMMEDIATE on SQLite)
+and is skipped if another process recorded it while this one waited.
+
+Usage:
+    python -m app.migrations            # apply pending migrations
+    python -m app.migrations --status   # list migrations and whether they are applied
+"""
+import sys
+from typing import Callable, List, Sequence, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, column, false, func, inspect, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(64), primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+# pg_advisory_xact_lock key shared by every process migrating this database
+MIGRATION_LOCK_KEY = 726_100_002
+
+
+def add_column(conn: Connection, table: str, column: Column):
+    """ALTER TABLE ADD COLUMN unless the table already has it"""
+    if not inspect(conn).has_table(table):
+        return
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Sequence[str]):
+    """CREATE INDEX IF NOT EXISTS (SQLite, Postgres 9.5+)"""
+    if not inspect(conn).has_table(table):
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+# ============= MIGRATIONS =============
+
+def _chat_counters(conn: Connection):
+    # Maintained by ChatService.record_message; scripts/reconcile_chat_counters.py repairs drift
+    add_column(conn, "chats", Column("unread_for_user", Integer, server_default="0"))
+    add_column(conn, "chats", Column("unread_for_imam", Integer, server_default="0"))
+    add_column(conn, "chats", Column("last_message_preview", String(100)))
+    if not (inspect(conn).has_table("chats") and inspect(conn).has_table("chat_messages")):
+        return
+
+    # Backfill from the existing messages (ChatService.reconcile_counters in one UPDATE)
+    chats = table(
+        "chats", column("id"), column("unread_for_user"), column("unread_for_imam"),
+        column("last_message_preview"), column("last_message_at"),
+    )
+    messages = table(
+        "chat_messages", column("id"), column("chat_id"), column("sender_type"),
+        column("message"), column("is_read"), column("created_at"),
+    )
+    of_chat = messages.c.chat_id == chats.c.id
+
+    def unread_from(sender_type):
+        return select(func.count()).where(
+            of_chat, messages.c.sender_type == sender_type, messages.c.is_read == false()
+        ).scalar_subquery()
+
+    latest = select(func.substr(messages.c.message, 1, 100)).where(of_chat).order_by(
+        messages.c.created_at.desc(), messages.c.id.desc()
+    ).limit(1).scalar_subquery()
+    conn.execute(chats.update().values(
+        unread_for_user=unread_from("imam"),
+        unread_for_imam=unread_from("user"),
+        last_message_preview=latest,
+        last_message_at=func.coalesce(
+            select(func.max(messages.c.created_at)).where(of_chat).scalar_subquery(), chats.c.last_message_at
+        ),
+    ))
+
+
+def _hot_path_indexes(conn: Connection):
+    # Inbox listings (ChatService.get_inbox)
+    create_index(conn, "ix_chats_user_email_updated_at", "chats", ["user_email", "updated_at", "id"])
+    create_index(conn, "ix_chats_imam_id_updated_at", "chats", ["imam_id", "updated_at", "id"])
+    # Chat history pages and unread counts per chat
+    create_index(conn, "ix_chat_messages_chat_id_created_at_id", "chat_messages", ["chat_id", "created_at", "id"])
+    create_index(conn, "ix_chat_messages_chat_id_is_read", "chat_messages", ["chat_id", "is_read"])
+    # Dua history pages
+    create_index(conn, "ix_dua_requests_user_email_created_at_id", "dua_requests", ["user_email", "created_at", "id"])
+
+
+MIGRATIONS: List[Tuple[str, str, Callable[[Connection], None]]] = [
+    ("0001_chat_counters", "chats: unread counters and last-message preview", _chat_counters),
+    ("0002_hot_path_indexes", "composite indexes for inbox, chat message and dua history listings", _hot_path_indexes),
+]
+
+
+# ============= RUNNER =============
+
+def applied_versions(engine: Engine) -> set:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(schema_migrations.select())}
+
+
+def lock_migrations(conn: Connection):
+    """Hold the migration lock until this transaction ends"""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    elif conn.dialect.name == "sqlite":
+        # Write-lock the database now rather than on the first write
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations(engine: Engine, migrations=MIGRATIONS) -> List[str]:
+    """Apply pending migrations in order, each in its own transaction; returns the versions applied"""
+    done = applied_versions(engine)
+    applied = []
+    for version, description, apply in migrations:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                lock_migrations(conn)
+                if conn.execute(schema_migrations.select().where(schema_migrations.c.version == version)).first():
+                    continue  # another process applied it while we waited for the lock
+                apply(conn)
+                conn.execute(schema_migrations.insert().values(version=version, description=description))
+        except IntegrityError:
+            continue  # another process applied it at the same time
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+    return applied
+
+
+if __name__ == "__main__":
+    from app.database import Base, engine
+    from app.models import chat, dua, imam  # noqa: F401 - registers the models on Base
+
+    Base.metadata.create_all(bind=engine)
+    if "--status" in sys.argv:
+        done = applied_versions(engine)
+        for version, description, _ in MIGRATIONS:
+            print(f"{'✓' if version in done else ' '} {version}  {description}")
+    else:
+        applied = run_migrations(engine)
+        print(f"✅ Database is up to date ({len(applied)} migrations applied)")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 from datetime import datetime
@@ -6,6 +6,11 @@ from datetime import datetime
 class Chat(Base):
     """Chat conversation between user and imam"""
     __tablename__ = "chats"
+    __table_args__ = (
+        # Inbox listings: one range scan per user / imam, newest first, keyset pages on (updated_at, id)
+        Index("ix_chats_user_email_updated_at", "user_email", "updated_at", "id"),
+        Index("ix_chats_imam_id_updated_at", "imam_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     imam_id = Column(Integer, nullable=False)  # FK to Imam
@@ -25,6 +30,11 @@ class Chat(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     last_message_at = Column(DateTime)  # Last message timestamp
     
+    # Maintained by the message endpoints; repaired by scripts/reconcile_chat_counters.py
+    unread_for_user = Column(Integer, default=0, server_default="0")  # unread messages from the imam
+    unread_for_imam = Column(Integer, default=0, server_default="0")  # unread messages from the user
+    last_message_preview = Column(String(100))
+    
     class Config:
         from_attributes = True
 
@@ -32,6 +42,12 @@ class Chat(Base):
 class ChatMessage(Base):
     """Individual chat messages"""
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Chat history: keyset pages per chat on (created_at, id)
+        Index("ix_chat_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        # Unread counts per chat
+        Index("ix_chat_messages_chat_id_is_read", "chat_id", "is_read"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.database import Base
 from datetime import datetime
@@ -6,6 +6,10 @@ from datetime import datetime
 class DuaRequest(Base):
     """Store dua generator requests"""
     __tablename__ = "dua_requests"
+    __table_args__ = (
+        # History listing: keyset pages per user on (created_at, id)
+        Index("ix_dua_requests_user_email_created_at_id", "user_email", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -50,3 +54,30 @@ class DuaCategory(Base):
     
     class Config:
         from_attributes = True
+
+
+class DuaJob(Base):
+    """Asynchronous dua generation job (see app/services/dua_jobs.py)"""
+    __tablename__ = "dua_jobs"
+    
+    id = Column(String(36), primary_key=True)  # uuid4 hex
+    status = Column(String(20), default="pending", index=True)  # pending/running/succeeded/failed
+    
+    # Request details (same fields as DuaGeneratorRequest)
+    user_email = Column(String(255))
+    user_name = Column(String(255))
+    problem_description = Column(Text, nullable=False)
+    problem_category = Column(String(100))
+    language = Column(String(50), default="English")
+    callback_url = Column(String(2048))
+    
+    # Outcome
+    result = Column(JSON)  # dua_text_en/dua_text_ar/how_to_use_en/how_to_use_ar
+    error = Column(Text)
+    dua_request_id = Column(Integer, ForeignKey("dua_requests.id"))
+    attempts = Column(Integer, default=0)
+    callback_status = Column(String(20))  # delivered / failed
+    
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
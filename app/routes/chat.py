@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.database import get_db
 from app.models.chat import Chat, ChatMessage, ImamAvailability
 from app.models.imam import Imam
+from app.services.chat_service import ChatService
+from app.services.pagination import paginate, InvalidCursorError, NEXT_CURSOR_HEADER, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from app.schemas.chat import (
     ChatCreate,
     ChatResponse,
@@ -119,46 +121,38 @@ async def get_chat_detail(chat_id: int, db: Session = Depends(get_db)) -> ChatDe
 @router.get("/conversations/user/{user_email}", response_model=List[ChatListResponse])
 async def get_user_chats(
     user_email: str,
+    response: Response,
     active_only: bool = Query(True, description="Show only active chats"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Chats per page"),
     db: Session = Depends(get_db)
 ) -> List[ChatListResponse]:
     """
-    Get all chat conversations for a user
+    Get a user's chat conversations, most recently updated first, one page at a time
     
     Parameters:
     - user_email: User's email address
     - active_only: Show only active chats (default: true)
+    - cursor: X-Next-Cursor response header of the previous page (omit for the first page)
+    - limit: Chats per page
     """
     try:
-        query = db.query(Chat).filter(Chat.user_email == user_email)
-        
-        if active_only:
-            query = query.filter(Chat.is_active == True)
-        
-        chats = query.order_by(Chat.updated_at.desc()).all()
-        
-        # Get unread count for each chat
-        result = []
-        for chat in chats:
-            unread_count = db.query(func.count(ChatMessage.id)).filter(
-                ChatMessage.chat_id == chat.id,
-                ChatMessage.is_read == False
-            ).scalar()
-            
-            result.append(ChatListResponse(
-                id=chat.id,
-                imam_id=chat.imam_id,
-                user_email=chat.user_email,
-                user_name=chat.user_name,
-                title=chat.title,
-                is_active=chat.is_active,
-                imam_is_available=chat.imam_is_available,
-                last_message_at=chat.last_message_at,
-                unread_count=unread_count or 0,
-            ))
+        chats, next_cursor = ChatService.get_inbox(
+            db, user_email=user_email, active_only=active_only, cursor=cursor, limit=limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        # Unread counts every unread message in the chat, from either side
+        result = [
+            _chat_list_item(chat, imam_name, (chat.unread_for_user or 0) + (chat.unread_for_imam or 0))
+            for chat, imam_name in chats
+        ]
         
         return result
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chats: {str(e)}")
 
@@ -166,51 +160,59 @@ async def get_user_chats(
 @router.get("/conversations/imam/{imam_id}", response_model=List[ChatListResponse])
 async def get_imam_chats(
     imam_id: int,
+    response: Response,
     active_only: bool = Query(True, description="Show only active chats"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Chats per page"),
     db: Session = Depends(get_db)
 ) -> List[ChatListResponse]:
     """
-    Get all chat conversations for an imam
+    Get an imam's chat conversations, most recently updated first, one page at a time
     
     Parameters:
     - imam_id: Imam's ID
     - active_only: Show only active chats (default: true)
+    - cursor: X-Next-Cursor response header of the previous page (omit for the first page)
+    - limit: Chats per page
     """
     try:
-        query = db.query(Chat).filter(Chat.imam_id == imam_id)
-        
-        if active_only:
-            query = query.filter(Chat.is_active == True)
-        
-        chats = query.order_by(Chat.updated_at.desc()).all()
-        
-        # Get unread count for each chat
-        result = []
-        for chat in chats:
-            unread_count = db.query(func.count(ChatMessage.id)).filter(
-                ChatMessage.chat_id == chat.id,
-                ChatMessage.is_read == False,
-                ChatMessage.sender_type == "user"
-            ).scalar()
-            
-            result.append(ChatListResponse(
-                id=chat.id,
-                imam_id=chat.imam_id,
-                user_email=chat.user_email,
-                user_name=chat.user_name,
-                title=chat.title,
-                is_active=chat.is_active,
-                imam_is_available=chat.imam_is_available,
-                last_message_at=chat.last_message_at,
-                unread_count=unread_count or 0,
-            ))
+        chats, next_cursor = ChatService.get_inbox(
+            db, imam_id=imam_id, active_only=active_only, cursor=cursor, limit=limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        # Unread counts messages from the user
+        result = [
+            _chat_list_item(chat, imam_name, chat.unread_for_imam or 0)
+            for chat, imam_name in chats
+        ]
         
         return result
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chats: {str(e)}")
 
 
+def _chat_list_item(chat: Chat, imam_name: Optional[str], unread_count: int) -> ChatListResponse:
+    """ChatListResponse for one ChatService.get_inbox() entry"""
+    return ChatListResponse(
+        id=chat.id,
+        imam_id=chat.imam_id,
+        user_email=chat.user_email,
+        user_name=chat.user_name,
+        title=chat.title,
+        is_active=chat.is_active,
+        imam_is_available=chat.imam_is_available,
+        last_message_at=chat.last_message_at,
+        unread_count=unread_count,
+        imam_name=imam_name,
+        last_message=chat.last_message_preview[:50] if chat.last_message_preview is not None else None,
+    )
+
+
 # ==================== MESSAGE ENDPOINTS ====================
 
 @router.post("/conversations/{chat_id}/messages", response_model=ChatMessageResponse)
@@ -249,9 +251,8 @@ async def send_message(
         
         db.add(new_message)
         
-        # Update chat's last message timestamp
-        chat.last_message_at = datetime.utcnow()
-        chat.updated_at = datetime.utcnow()
+        # Update chat's last message timestamp, unread counter and preview
+        ChatService.record_message(db, new_message)
         
         db.commit()
         db.refresh(new_message)
@@ -266,21 +267,41 @@ async def send_message(
 
 
 @router.get("/conversations/{chat_id}/messages", response_model=List[ChatMessageResponse])
-async def get_messages(chat_id: int, db: Session = Depends(get_db)) -> List[ChatMessageResponse]:
-    """Get all messages in a chat conversation"""
+async def get_messages(
+    chat_id: int,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Messages per page"),
+    db: Session = Depends(get_db)
+) -> List[ChatMessageResponse]:
+    """
+    Get the latest messages in a chat conversation, in chronological order
+    
+    Parameters:
+    - chat_id: ID of the chat conversation
+    - cursor: X-Next-Cursor response header of the previous page, for older messages
+    - limit: Messages per page
+    """
     try:
         chat = db.query(Chat).filter(Chat.id == chat_id).first()
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.chat_id == chat_id
-        ).order_by(ChatMessage.created_at).all()
+        messages, next_cursor = paginate(
+            db.query(ChatMessage).filter(ChatMessage.chat_id == chat_id),
+            (ChatMessage.created_at, ChatMessage.id),
+            cursor=cursor,
+            limit=limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
-        return messages
+        return list(reversed(messages))
     
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching messages: {str(e)}")
 
@@ -292,12 +313,7 @@ async def mark_messages_read(
 ) -> dict:
     """Mark specific messages as read"""
     try:
-        db.query(ChatMessage).filter(
-            ChatMessage.id.in_(request.message_ids)
-        ).update(
-            {ChatMessage.is_read: True, ChatMessage.read_at: datetime.utcnow()},
-            synchronize_session=False
-        )
+        ChatService.mark_messages_read(db, request.message_ids)
         db.commit()
         
         return {"status": "success", "marked_as_read": len(request.message_ids)}
@@ -316,12 +332,7 @@ async def mark_chat_read(chat_id: int, db: Session = Depends(get_db)) -> dict:
             ChatMessage.is_read == False
         ).scalar()
         
-        db.query(ChatMessage).filter(
-            ChatMessage.chat_id == chat_id
-        ).update(
-            {ChatMessage.is_read: True, ChatMessage.read_at: datetime.utcnow()},
-            synchronize_session=False
-        )
+        ChatService.mark_chat_read(db, chat_id)
         db.commit()
         
         return {"status": "success", "marked_as_read": count or 0}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models.dua import DuaRequest, DuaCategory
@@ -9,13 +9,17 @@ from app.schemas.dua import (
     DuaFeedbackRequest,
     DuaCategoryResponse,
     DuaHistoryResponse,
+    DuaJobRequest,
+    DuaJobResponse,
 )
 from typing import List, Optional
 from datetime import datetime
 import json
 
-# Import Deepseek Service
-from app.services import DeepseekService
+from app.services.callback_urls import UnsafeCallbackURLError
+from app.services.dua_generator import generate_dua, save_dua_request
+from app.services.dua_jobs import dua_job_queue, job_to_dict, JobQueueFullError
+from app.services.pagination import paginate, InvalidCursorError, NEXT_CURSOR_HEADER, PAGE_SIZE_MAX
 
 router = APIRouter(prefix="/api/v1/dua", tags=["dua-generator"])
 
@@ -55,92 +59,17 @@ async def generate_personalized_dua(
                 detail="Problem description must be at least 20 characters long"
             )
         
-        # Build prompt for Deepseek to generate a bilingual dua (English + Arabic)
-        prompt = f"""Generate a personalized Islamic dua (supplication) based on this problem.
-Produce both an English and an Arabic version.
-
-Problem: {request_data.problem_description}
-Category: {request_data.problem_category or 'General'}
-
-Please provide EXACTLY in this JSON format (no other text):
-{{
-  "dua_text_en": "A heartfelt, personalized dua/supplication in English asking Allah for help. Make it personal and directly address the user's concern with specific words relevant to their problem.",
-  "dua_text_ar": "A heartfelt, personalized dua/supplication in Arabic asking Allah for help. Make it personal and directly address the user's concern with specific words relevant to their problem.",
-  "how_to_use_en": "Brief instructions in English on how and when to recite this dua (e.g., daily, after Fajr prayer, etc.)",
-  "how_to_use_ar": "Brief instructions in Arabic on how and when to recite this dua"
-}}
-
-Guidelines:
-- Make both versions authentic and respectful of Islamic teachings.
-- Ensure the Arabic version uses clear, simple Modern Standard Arabic.
-- Keep both versions concise and directly applicable to the user's problem.
-"""
-
-        # Get response from Deepseek
-        deepseek_service = DeepseekService()
-        try:
-            deepseek_response_text = await deepseek_service._call_deepseek_api(prompt)
-        except Exception as e:
-            # Fallback response if API fails
-            print(f"Deepseek API error: {e}")
-            # Provide both English and Arabic fallback dua
-            deepseek_response_text = json.dumps({
-                "dua_text_en": f"O Allah, I turn to You seeking help with my concern about {request_data.problem_category or 'this matter'}. Grant me wisdom, patience, and strength to overcome these challenges. Help me with sincere intentions and make this an opportunity for growth. I trust in Your mercy and guidance. Ameen.",
-                "dua_text_ar": f"اللهم إني ألجأ إليك في كربتي بشأن {request_data.problem_category or 'هذا الأمر'}. امنحني الحكمة والصبر والقوة لتجاوز هذه المحن. أعِنّي على نية صادقة واجعلها فرصة للنمو. إني أتوكّل على رحمتك وهدايتك، آمين.",
-                "how_to_use_en": "Recite this dua daily, preferably after prayer. You may also recite it whenever you feel overwhelmed.",
-                "how_to_use_ar": "كرر هذا الدعاء يومياً ويفضل بعد الصلاة. يمكنك ترديده عندما تشعر بالضغط أو القلق."
-            })
-
-        # Prepare fallback content
-        fallback_dua_en = f"O Allah, I turn to You seeking help with my concern about {request_data.problem_category or 'this matter'}. Grant me wisdom, patience, and strength to overcome these challenges. Help me with sincere intentions and make this an opportunity for growth. I trust in Your mercy and guidance. Ameen."
-        fallback_dua_ar = f"اللهم إني ألجأ إليك في كربتي بشأن {request_data.problem_category or 'هذا الأمر'}. امنحني الحكمة والصبر والقوة لتجاوز هذه المحن. أعِنّي على نية صادقة واجعلها فرصة للنمو. إني أتوكّل على رحمتك وهدايتك، آمين."
-        fallback_how_en = "Recite this dua daily, preferably after prayer. You may also recite it whenever you feel overwhelmed."
-        fallback_how_ar = "كرر هذا الدعاء يومياً ويفضل بعد الصلاة. يمكنك ترديده عندما تشعر بالضغط أو القلق."
-
-        # Parse the response
-        dua_en = ""
-        dua_ar = ""
-        how_en = fallback_how_en
-        how_ar = fallback_how_ar
-
-        try:
-            # Extract JSON from response
-            json_start = deepseek_response_text.find('{')
-            json_end = deepseek_response_text.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_str = deepseek_response_text[json_start:json_end]
-                parsed_response = json.loads(json_str)
-            else:
-                parsed_response = json.loads(deepseek_response_text)
-
-            dua_en = parsed_response.get('dua_text_en') or parsed_response.get('dua_text') or fallback_dua_en
-            dua_ar = parsed_response.get('dua_text_ar') or '' or fallback_dua_ar
-            how_en = parsed_response.get('how_to_use_en') or fallback_how_en
-            how_ar = parsed_response.get('how_to_use_ar') or fallback_how_ar
-
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
-            # Fallback if parsing fails
-            dua_en = fallback_dua_en
-            dua_ar = fallback_dua_ar
-            how_en = fallback_how_en
-            how_ar = fallback_how_ar
-
-        # Store request in database - store bilingual dua as JSON string in generated_dua
-        dua_request = DuaRequest(
-            user_email=request_data.user_email or 'anonymous',
-            user_name=request_data.user_name or 'User',
+        generated = await generate_dua(request_data.problem_description, request_data.problem_category)
+        dua_request = save_dua_request(
+            db,
+            generated,
             problem_description=request_data.problem_description,
             problem_category=request_data.problem_category,
+            user_email=request_data.user_email,
+            user_name=request_data.user_name,
             language=request_data.language,
-            generated_dua=json.dumps({"en": dua_en, "ar": dua_ar}),
-            deepseek_prompt=prompt,
-            deepseek_response=deepseek_response_text,
         )
 
-        db.add(dua_request)
-        db.commit()
-        db.refresh(dua_request)
-
         return DuaGeneratedResponse(
             id=dua_request.id,
             user_email=dua_request.user_email,
@@ -148,10 +77,10 @@ Guidelines:
             problem_description=dua_request.problem_description,
             problem_category=dua_request.problem_category,
             language=dua_request.language,
-            dua_text_en=dua_en,
-            dua_text_ar=dua_ar,
-            how_to_use_en=how_en,
-            how_to_use_ar=how_ar,
+            dua_text_en=generated["dua_text_en"],
+            dua_text_ar=generated["dua_text_ar"],
+            how_to_use_en=generated["how_to_use_en"],
+            how_to_use_ar=generated["how_to_use_ar"],
             created_at=dua_request.created_at,
         )
     
@@ -160,23 +89,71 @@ Guidelines:
         raise HTTPException(status_code=500, detail=f"Error generating dua: {str(e)}")
 
 
+@router.post("/jobs", response_model=DuaJobResponse, status_code=202)
+async def submit_dua_job(request_data: DuaJobRequest) -> DuaJobResponse:
+    """
+    Queue a personalized dua for generation and return its job id immediately
+    
+    Same request body as /generate plus an optional callback_url. Poll
+    GET /api/v1/dua/jobs/{job_id} for the result, or receive the finished
+    job as a POST to callback_url. The dua is stored in the user's history
+    like /generate does.
+    """
+    if len(request_data.problem_description) < 20:
+        raise HTTPException(
+            status_code=400,
+            detail="Problem description must be at least 20 characters long"
+        )
+    try:
+        job = await dua_job_queue.submit(
+            request_data.problem_description,
+            problem_category=request_data.problem_category,
+            user_email=request_data.user_email,
+            user_name=request_data.user_name,
+            language=request_data.language,
+            callback_url=request_data.callback_url,
+        )
+    except UnsafeCallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return DuaJobResponse(**job)
+
+
+@router.get("/jobs/{job_id}", response_model=DuaJobResponse)
+async def get_dua_job(job_id: str) -> DuaJobResponse:
+    """Get the status (and result once finished) of a dua job"""
+    job = dua_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return DuaJobResponse(**job_to_dict(job))
+
+
 @router.get("/history/{user_email}", response_model=List[DuaHistoryResponse])
 async def get_dua_history(
     user_email: str,
-    limit: int = Query(10, ge=1, le=100, description="Number of records to return"),
+    response: Response,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: int = Query(10, ge=1, le=PAGE_SIZE_MAX, description="Number of records to return"),
     db: Session = Depends(get_db)
 ) -> List[DuaHistoryResponse]:
     """
-    Get user's dua generation history
+    Get user's dua generation history, newest first, one page at a time
     
     Parameters:
     - user_email: User's email address
-    - limit: Number of records to return (default: 10, max: 100)
+    - cursor: X-Next-Cursor response header of the previous page (omit for the first page)
+    - limit: Number of records to return (default: 10, max: PAGE_SIZE_MAX)
     """
     try:
-        requests = db.query(DuaRequest).filter(
-            DuaRequest.user_email == user_email
-        ).order_by(DuaRequest.created_at.desc()).limit(limit).all()
+        requests, next_cursor = paginate(
+            db.query(DuaRequest).filter(DuaRequest.user_email == user_email),
+            (DuaRequest.created_at, DuaRequest.id),
+            cursor=cursor,
+            limit=limit
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         history = []
         for req in requests:
@@ -204,6 +181,8 @@ async def get_dua_history(
             )
         return history
     
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching history: {str(e)}")
 
@@ -1,22 +1,25 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.services.circuit_breaker import get_breaker_states
 
 router = APIRouter(prefix="/api/v1/health", tags=["health"])
 
 @router.get("")
 async def health_check(db: Session = Depends(get_db)):
-    """Check API health and database connection"""
+    """Check API health, database connection and LLM provider circuit breakers"""
     try:
         # Try a simple query to test DB connection
         db.execute("SELECT 1")
         return {
             "status": "healthy",
-            "database": "connected"
+            "database": "connected",
+            "circuit_breakers": get_breaker_states()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "database": "disconnected",
-            "error": str(e)
+            "error": str(e),
+            "circuit_breakers": get_breaker_states()
         }
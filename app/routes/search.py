@@ -1,12 +1,76 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import get_db
 from app.schemas import SearchRequest
 from app.services import DeepseekService, MatchingService
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 router = APIRouter(prefix="/api/v1/search", tags=["search"])
 
+
+async def generate_explanations(
+    deepseek_service: DeepseekService,
+    user_prompt: str,
+    items: List[Tuple[str, str]]
+) -> List[Dict[str, str]]:
+    """
+    Generate explanations for (text, item_type) pairs, keeping their order.
+    
+    With settings.explanation_mode == "batch" and more than one item, all items
+    go to the model in a single call, which may use
+    settings.explanation_batch_share of the deadline. Items the batch reply
+    does not cover (or all of them, if the call fails) are retried
+    individually in the time that is left.
+    
+    Individual calls run concurrently, at most settings.explanation_concurrency
+    at a time. Everything shares one deadline of
+    settings.explanation_deadline_seconds. An item that fails or misses the
+    deadline gets the fallback explanation on its own; the other items are
+    unaffected.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.explanation_deadline_seconds
+    semaphore = asyncio.Semaphore(max(1, settings.explanation_concurrency))
+    
+    async def explain(text: str, item_type: str) -> Dict[str, str]:
+        try:
+            async with semaphore:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                return await asyncio.wait_for(
+                    deepseek_service.generate_explanation(user_prompt, text, item_type),
+                    timeout=remaining
+                )
+        except asyncio.TimeoutError:
+            print(f"Explanation for {item_type} missed the {settings.explanation_deadline_seconds}s deadline")
+        except Exception as e:
+            print(f"Error generating explanation: {e}")
+        return dict(DeepseekService.FALLBACK_EXPLANATION)
+    
+    explanations: List[Optional[Dict[str, str]]] = [None] * len(items)
+    if settings.explanation_mode == "batch" and len(items) > 1:
+        batch_timeout = settings.explanation_deadline_seconds * settings.explanation_batch_share
+        try:
+            explanations = await asyncio.wait_for(
+                deepseek_service.generate_explanations_batch(user_prompt, items),
+                timeout=batch_timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Batch explanation missed its {batch_timeout:.1f}s share of the deadline")
+        except Exception as e:
+            print(f"Error generating batch explanation: {e}")
+    
+    missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+    if missing:
+        retried = await asyncio.gather(*(explain(*items[i]) for i in missing))
+        for i, explanation in zip(missing, retried):
+            explanations[i] = explanation
+    return explanations
+
+
 @router.post("/answer")
 async def find_answer(
     request: SearchRequest,
@@ -76,15 +140,19 @@ async def find_answer(
                 limit=3
             )
         
-        # Step 4: Generate explanations for each result
+        # Step 4: Generate explanations for all results concurrently
+        explanations = await generate_explanations(
+            deepseek_service,
+            request.prompt,
+            [(verse.ayah_text, "Quranic verse") for verse in quran_results]
+            + [(hadith.hadith_text_english, "Hadith") for hadith in hadith_results]
+        )
+        verse_explanations = explanations[:len(quran_results)]
+        hadith_explanations = explanations[len(quran_results):]
+        
         quran_verse_responses = []
-        for verse in quran_results:
+        for verse, explanation in zip(quran_results, verse_explanations):
             verse_text = verse.ayah_text
-            explanation = await deepseek_service.generate_explanation(
-                request.prompt,
-                verse_text,
-                "Quranic verse"
-            )
             
             verse_response = {
                 "surah_number": verse.surah_number,
@@ -108,14 +176,7 @@ async def find_answer(
             quran_verse_responses.append(verse_response)
         
         hadith_responses = []
-        for hadith in hadith_results:
-            hadith_text = hadith.hadith_text_english
-            explanation = await deepseek_service.generate_explanation(
-                request.prompt,
-                hadith_text,
-                "Hadith"
-            )
-            
+        for hadith, explanation in zip(hadith_results, hadith_explanations):
             hadith_response = {
                 "hadith_number": hadith.hadith_number,
                 "narrator": hadith.narrator,
@@ -107,6 +107,8 @@ class ChatListResponse(BaseModel):
     imam_is_available: bool
     last_message_at: Optional[datetime]
     unread_count: int = 0
+    imam_name: Optional[str] = None
+    last_message: Optional[str] = None
     
     class Config:
         from_attributes = True
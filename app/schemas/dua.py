@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import Dict, Optional
 from datetime import datetime
 
+from app.services.callback_urls import check_callback_url
+
 
 # ==================== DUA GENERATOR SCHEMAS ====================
 
@@ -14,6 +16,30 @@ class DuaGeneratorRequest(BaseModel):
     language: Optional[str] = "English"  # Language for response
 
 
+class DuaJobRequest(DuaGeneratorRequest):
+    """Request schema for asynchronous dua generation"""
+    callback_url: Optional[str] = None  # Receives a POST with the job once it finishes
+
+    @field_validator("callback_url")
+    @classmethod
+    def validate_callback_url(cls, v):
+        # Form, allowlist and literal IPs only; the host is resolved on submit
+        if v is not None:
+            check_callback_url(v, resolve=False)
+        return v
+
+
+class DuaJobResponse(BaseModel):
+    """Status of an asynchronous dua job"""
+    job_id: str
+    status: str  # pending, running, succeeded, failed
+    result: Optional[Dict[str, str]] = None
+    error: Optional[str] = None
+    dua_request_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
 class DuaGeneratedResponse(BaseModel):
     """Generated dua response with bilingual output"""
     id: int
@@ -0,0 +1,76 @@
+"""
+Callback URLs - Keep dua job webhooks off internal networks
+
+Dua jobs POST their result to a callback_url chosen by the client. Unchecked,
+that lets any client make the server call localhost, the cloud metadata
+service (169.254.169.254) or hosts on the private network.
+
+check_callback_url() accepts only http(s) URLs whose host resolves to public
+addresses exclusively and, when settings.dua_job_callback_hosts is set (comma
+separated), is one of those hosts or a subdomain of one. The schema checks
+the URL's form; DuaJobQueue.submit() resolves it, and the worker resolves it
+again before every delivery attempt, since DNS answers can change in between
+(rebinding). Deliveries never follow redirects.
+"""
+import asyncio
+import ipaddress
+import socket
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from app.config import settings
+
+CALLBACK_ALLOWED_HOSTS = [
+    host.strip().lower() for host in settings.dua_job_callback_hosts.split(",") if host.strip()
+]
+
+
+class UnsafeCallbackURLError(ValueError):
+    """Raised for callback URLs the server must not call"""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])  # drop IPv6 zone ids
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_callback_url(url: str, resolve: bool = True, allowed_hosts: Optional[List[str]] = None) -> str:
+    """
+    Return url if it is safe to POST to, else raise UnsafeCallbackURLError.
+    With resolve=False only the form, the allowlist and literal IPs are
+    checked (no DNS lookup, safe to call on the event loop).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeCallbackURLError("callback_url must be an http(s) URL")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeCallbackURLError("callback_url has an invalid port")
+
+    host = parts.hostname.lower().rstrip(".")
+    allowed = CALLBACK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    if allowed and not any(host == entry or host.endswith("." + entry) for entry in allowed):
+        raise UnsafeCallbackURLError(f"callback_url host {host} is not allowed")
+
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        if not resolve:
+            return url
+        try:
+            addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+        except (socket.gaierror, UnicodeError):
+            raise UnsafeCallbackURLError(f"callback_url host {host} does not resolve")
+
+    blocked = [address for address in addresses if not _is_public(address)]
+    if blocked:
+        raise UnsafeCallbackURLError(f"callback_url host {host} resolves to a non-public address ({blocked[0]})")
+    return url
+
+
+async def resolve_callback_url(url: str) -> str:
+    """check_callback_url with the DNS lookup run off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, check_callback_url, url)
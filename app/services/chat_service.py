@@ -0,0 +1,200 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, select
+from app.models.chat import Chat, ChatMessage
+from app.models.imam import Imam
+from app.services.pagination import paginate
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+class ChatService:
+    """Queries and counter maintenance shared by the live-chat routes"""
+
+    # Characters of the last message kept on the chat
+    PREVIEW_LENGTH = 100
+
+    @staticmethod
+    def record_message(db: Session, message: ChatMessage) -> None:
+        """
+        Count a new (not yet committed) message on its chat: bump the other
+        side's unread counter and refresh last_message_preview and
+        last_message_at, as one UPDATE in the caller's transaction
+        """
+        message.created_at = message.created_at or datetime.utcnow()
+        counter = Chat.unread_for_imam if message.sender_type == "user" else Chat.unread_for_user
+        db.query(Chat).filter(Chat.id == message.chat_id).update({
+            counter: func.coalesce(counter, 0) + 1,
+            Chat.last_message_preview: (message.message or "")[:ChatService.PREVIEW_LENGTH],
+            Chat.last_message_at: message.created_at,
+            Chat.updated_at: message.created_at,
+        }, synchronize_session=False)
+
+    @staticmethod
+    def mark_messages_read(db: Session, message_ids: List[int]) -> None:
+        """Mark messages read and take them off their chats' unread counters (the caller commits)"""
+        groups = db.query(ChatMessage.chat_id, ChatMessage.sender_type).filter(
+            ChatMessage.id.in_(message_ids),
+            ChatMessage.is_read == False
+        ).distinct().all()
+
+        for chat_id, sender_type in groups:
+            # Decrement by what this UPDATE flipped: a concurrent call that
+            # already marked some of these messages read flips (and counts) none
+            flipped = db.query(ChatMessage).filter(
+                ChatMessage.id.in_(message_ids),
+                ChatMessage.chat_id == chat_id,
+                ChatMessage.sender_type == sender_type,
+                ChatMessage.is_read == False
+            ).update(
+                {ChatMessage.is_read: True, ChatMessage.read_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            if not flipped:
+                continue
+            counter = Chat.unread_for_imam if sender_type == "user" else Chat.unread_for_user
+            # Reading must not move the chat up the inbox: keep updated_at
+            db.query(Chat).filter(Chat.id == chat_id).update({
+                counter: case((counter > flipped, counter - flipped), else_=0),
+                Chat.updated_at: Chat.updated_at,
+            }, synchronize_session=False)
+
+    @staticmethod
+    def mark_chat_read(db: Session, chat_id: int) -> None:
+        """Mark every message in a chat read and reset both unread counters (the caller commits)"""
+        db.query(ChatMessage).filter(
+            ChatMessage.chat_id == chat_id
+        ).update(
+            {ChatMessage.is_read: True, ChatMessage.read_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.query(Chat).filter(Chat.id == chat_id).update(
+            {Chat.unread_for_user: 0, Chat.unread_for_imam: 0, Chat.updated_at: Chat.updated_at},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def get_inbox(
+        db: Session,
+        user_email: Optional[str] = None,
+        imam_id: Optional[int] = None,
+        active_only: bool = True,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List, Optional[str]]:
+        """
+        One page of [(chat, imam_name)] most recently updated first, and the
+        cursor of the next page (None on the last one). Read straight from
+        the maintained counter and snapshot columns: an index range scan on
+        (user_email | imam_id, updated_at, id), no per-chat aggregation.
+        """
+        query = db.query(Chat, Imam.name).outerjoin(Imam, Imam.id == Chat.imam_id)
+        if user_email is not None:
+            query = query.filter(Chat.user_email == user_email)
+        if imam_id is not None:
+            query = query.filter(Chat.imam_id == imam_id)
+        if active_only:
+            query = query.filter(Chat.is_active == True)
+        return paginate(
+            query,
+            (Chat.updated_at, Chat.id),
+            cursor=cursor,
+            limit=limit,
+            key=lambda row: (row[0].updated_at, row[0].id)
+        )
+
+    @staticmethod
+    def reconcile_counters(db: Session) -> int:
+        """
+        Recompute every chat's unread counters and last-message snapshot from
+        chat_messages; returns how many chats had drifted (and were fixed)
+        """
+        repaired = 0
+        for summary in ChatService.get_chat_summaries(db, active_only=False):
+            chat = summary["chat"]
+            expected = {
+                "unread_for_user": summary["unread_from_imam"],
+                "unread_for_imam": summary["unread_from_user"],
+                "last_message_preview": summary["last_message"][:ChatService.PREVIEW_LENGTH] if summary["last_message"] is not None else None,
+            }
+            if summary["last_message_at"] is not None:
+                expected["last_message_at"] = summary["last_message_at"]
+            if any(getattr(chat, field) != value for field, value in expected.items()):
+                db.query(Chat).filter(Chat.id == chat.id).update(
+                    {**expected, "updated_at": Chat.updated_at}, synchronize_session=False
+                )
+                repaired += 1
+        db.commit()
+        return repaired
+
+    @staticmethod
+    def get_chat_summaries(
+        db: Session,
+        user_email: Optional[str] = None,
+        imam_id: Optional[int] = None,
+        active_only: bool = True
+    ) -> List[Dict]:
+        """
+        Chats (most recently updated first) with their imam's name, last
+        message and unread counts per side, in one SQL statement.
+
+        A window over chat_messages gives each chat's latest message
+        (row_number) and its unread counts (sums partitioned by chat); it is
+        joined to chats and imams on the latest row only. Works on SQLite
+        (3.25+) and Postgres.
+
+        Used to reconcile the maintained counters. Each dict has: chat,
+        imam_name, last_message, last_message_at, unread_from_user,
+        unread_from_imam.
+        """
+        filters = []
+        if user_email is not None:
+            filters.append(Chat.user_email == user_email)
+        if imam_id is not None:
+            filters.append(Chat.imam_id == imam_id)
+        if active_only:
+            filters.append(Chat.is_active == True)
+
+        # Only the listed chats' messages go through the window
+        partition = ChatMessage.chat_id
+        messages = select(
+            ChatMessage.chat_id,
+            ChatMessage.message,
+            ChatMessage.created_at,
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            ).label("position"),
+            func.sum(case((and_(ChatMessage.sender_type == "user", ChatMessage.is_read == False), 1), else_=0)).over(
+                partition_by=partition
+            ).label("unread_from_user"),
+            func.sum(case((and_(ChatMessage.sender_type == "imam", ChatMessage.is_read == False), 1), else_=0)).over(
+                partition_by=partition
+            ).label("unread_from_imam"),
+        ).where(
+            ChatMessage.chat_id.in_(select(Chat.id).where(*filters))
+        ).subquery()
+
+        rows = db.query(
+            Chat,
+            Imam.name,
+            messages.c.message,
+            messages.c.created_at,
+            messages.c.unread_from_user,
+            messages.c.unread_from_imam,
+        ).outerjoin(
+            Imam, Imam.id == Chat.imam_id
+        ).outerjoin(
+            messages, and_(messages.c.chat_id == Chat.id, messages.c.position == 1)
+        ).filter(*filters).order_by(Chat.updated_at.desc()).all()
+
+        return [
+            {
+                "chat": chat,
+                "imam_name": imam_name,
+                "last_message": last_message,
+                "last_message_at": last_message_at,
+                "unread_from_user": unread_from_user or 0,
+                "unread_from_imam": unread_from_imam or 0,
+            }
+            for chat, imam_name, last_message, last_message_at, unread_from_user, unread_from_imam in rows
+        ]
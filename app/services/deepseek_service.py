@@ -1,18 +1,38 @@
 import httpx
 import json
 from app.config import settings
-from typing import Dict, List, Optional
+from app.services.http_clients import get_http_client, get_sync_http_client
+from app.services.circuit_breaker import get_breaker
+from app.services.llm_rate_limiter import llm_slot
+from app.services.llm_cache import CACHE_DETERMINISTIC, llm_cache
+from app.services.single_flight import single_flight
+from typing import Dict, List, Optional, Tuple
 
 class DeepseekService:
     """Service to interact with Deepseek API for understanding user prompts"""
     
-    def __init__(self):
+    # Returned when an explanation cannot be generated (API error or deadline)
+    FALLBACK_EXPLANATION = {
+        "explanation_english": "Relevant guidance for your situation.",
+        "explanation_arabic": "إرشادات ذات صلة لحالتك."
+    }
+    
+    def __init__(self, client: Optional[httpx.Client] = None, async_client: Optional[httpx.AsyncClient] = None):
         self.api_key = settings.deepseek_api_key
         self.base_url = settings.deepseek_api_base_url
-        # Use sync client by default since we need to call this from sync contexts too
-        self.client = httpx.Client(headers={"Authorization": f"Bearer {self.api_key}"})
-        # Also have an async client available
-        self.async_client = httpx.AsyncClient(headers={"Authorization": f"Bearer {self.api_key}"})
+        self.headers = {"Authorization": f"Bearer {self.api_key}"}
+        # Clients default to the shared application-wide pools, so creating a
+        # service per request no longer opens (and leaks) new connections
+        self._client = client
+        self._async_client = async_client
+    
+    @property
+    def client(self) -> httpx.Client:
+        return self._client or get_sync_http_client("deepseek")
+    
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        return self._async_client or get_http_client("deepseek")
     
     def _detect_language(self, text: str) -> str:
         """Detect if text is Arabic or English"""
@@ -24,6 +44,7 @@ class DeepseekService:
             return "ar"
         return "en"
     
+    @single_flight("deepseek_analyze_prompt", key=lambda self, user_prompt: user_prompt.strip())
     async def analyze_prompt(self, user_prompt: str) -> Dict:
         """
         Use Deepseek to analyze user prompt and extract relevant topics/keywords
@@ -113,13 +134,78 @@ Return as JSON with keys: explanation_english (string), explanation_arabic (stri
                 
         except Exception as e:
             print(f"Error generating explanation: {e}")
-            return {
-                "explanation_english": "Relevant guidance for your situation.",
-                "explanation_arabic": "إرشادات ذات صلة لحالتك."
-            }
+            return dict(self.FALLBACK_EXPLANATION)
     
-    async def _call_deepseek_api(self, prompt: str) -> str:
-        """Call the Deepseek API with the given prompt"""
+    async def generate_explanations_batch(
+        self,
+        user_prompt: str,
+        items: List[Tuple[str, str]]
+    ) -> List[Optional[Dict[str, str]]]:
+        """
+        Explain several (text, item_type) pairs with a single API call.
+        
+        The user prompt is sent once and the model returns a JSON array keyed by
+        item id. The result is aligned with items; an entry is None when the
+        model skipped that item or the reply could not be parsed, so the caller
+        can fall back per item. API errors are raised.
+        """
+        numbered = "\n".join(
+            f'{i}. [{item_type}] "{text}"' for i, (text, item_type) in enumerate(items, start=1)
+        )
+        batch_prompt = f"""The user asked: "{user_prompt}"
+
+These items were found as relevant guidance:
+{numbered}
+
+For EACH item, provide a brief explanation (2-3 sentences) in both English and Arabic for why it is relevant to address the user's concern.
+Focus on the connection between the user's problem and the wisdom in that item.
+
+Return ONLY a JSON array with one object per item, using the item number as id:
+[{{"id": 1, "explanation_english": "...", "explanation_arabic": "..."}}]"""
+        
+        response = await self._call_deepseek_api(
+            batch_prompt,
+            max_tokens=min(200 + 300 * len(items), 4000)
+        )
+        return self._parse_batch_explanations(response, len(items))
+    
+    @staticmethod
+    def _parse_batch_explanations(response: str, count: int) -> List[Optional[Dict[str, str]]]:
+        """Map a keyed JSON reply onto item positions (None for missing items)"""
+        results: List[Optional[Dict[str, str]]] = [None] * count
+        cleaned = response.strip()
+        start, end = cleaned.find("["), cleaned.rfind("]") + 1
+        if start == -1 or end <= start:
+            # Tolerate {"explanations": [...]} and other object wrappers
+            start, end = cleaned.find("{"), cleaned.rfind("}") + 1
+        try:
+            parsed = json.loads(cleaned[start:end])
+        except (json.JSONDecodeError, ValueError):
+            return results
+        
+        if isinstance(parsed, dict):
+            parsed = next((v for v in parsed.values() if isinstance(v, list)), [])
+        for entry in parsed if isinstance(parsed, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                position = int(entry.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < count and entry.get("explanation_english"):
+                results[position] = {
+                    "explanation_english": entry.get("explanation_english", ""),
+                    "explanation_arabic": entry.get("explanation_arabic", "")
+                }
+        return results
+    
+    async def _call_deepseek_api(self, prompt: str, max_tokens: int = 1000, cache: str = CACHE_DETERMINISTIC) -> str:
+        """
+        Call the Deepseek API with the given prompt.
+        
+        cache is the llm_cache mode: "deterministic" (default), "pool" for
+        creative calls that should keep some variety, or "off".
+        """
         try:
             payload = {
                 "model": "deepseek-chat",
@@ -127,17 +213,26 @@ Return as JSON with keys: explanation_english (string), explanation_arabic (stri
                     {"role": "user", "content": prompt}
                 ],
                 "temperature": 0.7,
-                "max_tokens": 1000
+                "max_tokens": max_tokens
             }
+            cached = await llm_cache.aget(payload, cache)
+            if cached is not None:
+                return cached
             
-            response = await self.async_client.post(
-                f"{self.base_url}/chat/completions",
-                json=payload
-            )
-            response.raise_for_status()
+            async with llm_slot("deepseek", prompt, max_tokens=max_tokens) as slot:
+                with get_breaker("deepseek").track():
+                    response = await self.async_client.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=self.headers,
+                        json=payload
+                    )
+                    await slot.settle(response)
+                    response.raise_for_status()
             
             result = response.json()
-            return result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            await llm_cache.aput(payload, content, cache)
+            return content
         except Exception as e:
             print(f"Error calling Deepseek API: {e}")
             raise
@@ -154,11 +249,13 @@ Return as JSON with keys: explanation_english (string), explanation_arabic (stri
                 "max_tokens": 1000
             }
             
-            response = self.client.post(
-                f"{self.base_url}/chat/completions",
-                json=payload
-            )
-            response.raise_for_status()
+            with get_breaker("deepseek").track():
+                response = self.client.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=self.headers,
+                    json=payload
+                )
+                response.raise_for_status()
             
             result = response.json()
             return result.get("choices", [{}])[0].get("message", {}).get("content", "")
@@ -0,0 +1,113 @@
+"""
+Dua generation shared by POST /api/v1/dua/generate and the dua job workers
+"""
+import json
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.dua import DuaRequest
+from app.services.deepseek_service import DeepseekService
+from app.services.llm_cache import CACHE_POOL
+
+
+def build_dua_prompt(problem_description: str, problem_category: Optional[str]) -> str:
+    """Build the prompt for Deepseek to generate a bilingual dua (English + Arabic)"""
+    return f"""Generate a personalized Islamic dua (supplication) based on this problem.
+Produce both an English and an Arabic version.
+
+Problem: {problem_description}
+Category: {problem_category or 'General'}
+
+Please provide EXACTLY in this JSON format (no other text):
+{{
+  "dua_text_en": "A heartfelt, personalized dua/supplication in English asking Allah for help. Make it personal and directly address the user's concern with specific words relevant to their problem.",
+  "dua_text_ar": "A heartfelt, personalized dua/supplication in Arabic asking Allah for help. Make it personal and directly address the user's concern with specific words relevant to their problem.",
+  "how_to_use_en": "Brief instructions in English on how and when to recite this dua (e.g., daily, after Fajr prayer, etc.)",
+  "how_to_use_ar": "Brief instructions in Arabic on how and when to recite this dua"
+}}
+
+Guidelines:
+- Make both versions authentic and respectful of Islamic teachings.
+- Ensure the Arabic version uses clear, simple Modern Standard Arabic.
+- Keep both versions concise and directly applicable to the user's problem.
+"""
+
+
+def fallback_dua(problem_category: Optional[str]) -> Dict[str, str]:
+    """Generic bilingual dua used when the API fails or its response cannot be parsed"""
+    return {
+        "dua_text_en": f"O Allah, I turn to You seeking help with my concern about {problem_category or 'this matter'}. Grant me wisdom, patience, and strength to overcome these challenges. Help me with sincere intentions and make this an opportunity for growth. I trust in Your mercy and guidance. Ameen.",
+        "dua_text_ar": f"اللهم إني ألجأ إليك في كربتي بشأن {problem_category or 'هذا الأمر'}. امنحني الحكمة والصبر والقوة لتجاوز هذه المحن. أعِنّي على نية صادقة واجعلها فرصة للنمو. إني أتوكّل على رحمتك وهدايتك، آمين.",
+        "how_to_use_en": "Recite this dua daily, preferably after prayer. You may also recite it whenever you feel overwhelmed.",
+        "how_to_use_ar": "كرر هذا الدعاء يومياً ويفضل بعد الصلاة. يمكنك ترديده عندما تشعر بالضغط أو القلق."
+    }
+
+
+async def generate_dua(problem_description: str, problem_category: Optional[str]) -> Dict[str, str]:
+    """
+    Generate a dua with Deepseek.
+
+    Returns the dua_text_en/dua_text_ar/how_to_use_en/how_to_use_ar fields plus
+    the prompt and raw response (stored on DuaRequest). Never raises for API
+    errors: the fallback dua is used instead.
+    """
+    prompt = build_dua_prompt(problem_description, problem_category)
+    fallback = fallback_dua(problem_category)
+
+    try:
+        # Identical requests share a small pool of duas instead of one fixed answer
+        response_text = await DeepseekService()._call_deepseek_api(prompt, cache=CACHE_POOL)
+    except Exception as e:
+        print(f"Deepseek API error: {e}")
+        response_text = json.dumps(fallback)
+
+    try:
+        # Extract JSON from response
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+        if json_start >= 0 and json_end > json_start:
+            parsed = json.loads(response_text[json_start:json_end])
+        else:
+            parsed = json.loads(response_text)
+
+        dua = {
+            "dua_text_en": parsed.get('dua_text_en') or parsed.get('dua_text') or fallback["dua_text_en"],
+            "dua_text_ar": parsed.get('dua_text_ar') or fallback["dua_text_ar"],
+            "how_to_use_en": parsed.get('how_to_use_en') or fallback["how_to_use_en"],
+            "how_to_use_ar": parsed.get('how_to_use_ar') or fallback["how_to_use_ar"],
+        }
+    except (json.JSONDecodeError, KeyError, ValueError, AttributeError):
+        dua = dict(fallback)
+
+    return {**dua, "prompt": prompt, "raw_response": response_text}
+
+
+def save_dua_request(
+    db: Session,
+    generated: Dict[str, str],
+    problem_description: str,
+    problem_category: Optional[str],
+    user_email: Optional[str] = None,
+    user_name: Optional[str] = None,
+    language: Optional[str] = "English",
+    commit: bool = True,
+) -> DuaRequest:
+    """Store a generated dua - the bilingual text goes into generated_dua as JSON"""
+    dua_request = DuaRequest(
+        user_email=user_email or 'anonymous',
+        user_name=user_name or 'User',
+        problem_description=problem_description,
+        problem_category=problem_category,
+        language=language,
+        generated_dua=json.dumps({"en": generated["dua_text_en"], "ar": generated["dua_text_ar"]}),
+        deepseek_prompt=generated.get("prompt"),
+        deepseek_response=generated.get("raw_response"),
+    )
+    db.add(dua_request)
+    if commit:
+        db.commit()
+        db.refresh(dua_request)
+    else:
+        db.flush()
+    return dua_request
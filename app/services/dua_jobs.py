@@ -0,0 +1,255 @@
+"""
+Asynchronous dua generation backed by the dua_jobs table.
+
+POST /api/v1/dua/jobs stores a pending DuaJob and returns its id at once; a
+pool of settings.dua_job_workers asyncio workers runs the Deepseek call,
+writes the DuaRequest and the job result in one transaction and POSTs the job
+to its callback_url, if any. Job state lives in the database so any process
+can answer GET /api/v1/dua/jobs/{id}; jobs are claimed with a conditional
+UPDATE (pending -> running) so each one runs once.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import update
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.dua import DuaJob
+from app.services.callback_urls import UnsafeCallbackURLError, resolve_callback_url
+from app.services.dua_generator import generate_dua, save_dua_request
+from app.services.http_clients import get_http_client
+from app.services.llm_rate_limiter import BACKGROUND, llm_priority
+
+CALLBACK_ATTEMPTS = 3
+CALLBACK_TIMEOUT = 10.0
+
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+def job_to_dict(job: DuaJob) -> Dict:
+    """Public representation of a job (status responses and callbacks)"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "dua_request_id": job.dua_request_id,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class DuaJobQueue:
+    """DB-backed job queue with a bounded pool of async workers"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        generate: Callable[[str, Optional[str]], Awaitable[Dict[str, str]]] = generate_dua,
+        workers: int = settings.dua_job_workers,
+        max_pending: int = settings.dua_job_max_pending,
+    ):
+        self.session_factory = session_factory
+        self.generate = generate
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._tasks = []
+
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "callbacks_delivered": 0, "callbacks_failed": 0}
+
+    async def start(self):
+        """Start workers on the running loop and re-queue unfinished jobs"""
+        self._ensure_started()
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.dua_job_stale_seconds)
+        db = self.session_factory()
+        try:
+            db.execute(
+                update(DuaJob)
+                .where(DuaJob.status == "running", DuaJob.started_at < stale_before)
+                .values(status="pending")
+            )
+            db.commit()
+            pending = db.query(DuaJob.id).filter(DuaJob.status == "pending").order_by(DuaJob.created_at).all()
+        finally:
+            db.close()
+        for (job_id,) in pending:
+            self._queue.put_nowait(job_id)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(
+        self,
+        problem_description: str,
+        problem_category: Optional[str] = None,
+        user_email: Optional[str] = None,
+        user_name: Optional[str] = None,
+        language: Optional[str] = "English",
+        callback_url: Optional[str] = None,
+    ) -> Dict:
+        """
+        Store a pending job and queue it; returns the job dict.
+        Raises UnsafeCallbackURLError for a callback_url that is not public.
+        """
+        if callback_url is not None:
+            await resolve_callback_url(callback_url)
+        self._ensure_started()
+        db = self.session_factory()
+        try:
+            pending = db.query(DuaJob).filter(DuaJob.status.in_(["pending", "running"])).count()
+            if pending >= self.max_pending:
+                raise JobQueueFullError(f"{pending} dua jobs already waiting, try again later")
+            job = DuaJob(
+                id=uuid.uuid4().hex,
+                status="pending",
+                user_email=user_email,
+                user_name=user_name,
+                problem_description=problem_description,
+                problem_category=problem_category,
+                language=language,
+                callback_url=callback_url,
+                attempts=0,
+                created_at=datetime.utcnow(),
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            result = job_to_dict(job)
+        finally:
+            db.close()
+
+        self._queue.put_nowait(result["job_id"])
+        self.stats["submitted"] += 1
+        return result
+
+    def get(self, job_id: str) -> Optional[DuaJob]:
+        db = self.session_factory()
+        try:
+            job = db.query(DuaJob).filter(DuaJob.id == job_id).first()
+            if job is not None:
+                db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "queued": self._queue.qsize() if self._queue else 0, "workers": self.workers}
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception as e:
+                print(f"Dua job {job_id} crashed: {e}")
+
+    def _claim(self, job_id: str) -> Optional[DuaJob]:
+        """Atomically move a job from pending to running; None if someone else has it"""
+        db = self.session_factory()
+        try:
+            claimed = db.execute(
+                update(DuaJob)
+                .where(DuaJob.id == job_id, DuaJob.status == "pending")
+                .values(status="running", started_at=datetime.utcnow(), attempts=DuaJob.attempts + 1)
+            ).rowcount
+            db.commit()
+            if not claimed:
+                return None
+            job = db.query(DuaJob).filter(DuaJob.id == job_id).first()
+            db.expunge(job)
+            return job
+        finally:
+            db.close()
+
+    async def run_job(self, job_id: str):
+        """Run one job to completion (generation, DuaRequest row, callback)"""
+        job = self._claim(job_id)
+        if job is None:
+            return
+
+        try:
+            # Jobs yield LLM budget to interactive requests
+            with llm_priority(BACKGROUND):
+                generated = await self.generate(job.problem_description, job.problem_category)
+            error = None
+        except Exception as e:
+            generated, error = None, str(e)
+
+        db = self.session_factory()
+        try:
+            values = {"finished_at": datetime.utcnow()}
+            if error is None:
+                dua_request = save_dua_request(
+                    db,
+                    generated,
+                    problem_description=job.problem_description,
+                    problem_category=job.problem_category,
+                    user_email=job.user_email,
+                    user_name=job.user_name,
+                    language=job.language,
+                    commit=False,
+                )
+                result = {key: generated[key] for key in ("dua_text_en", "dua_text_ar", "how_to_use_en", "how_to_use_ar")}
+                values.update(status="succeeded", result=result, dua_request_id=dua_request.id)
+            else:
+                values.update(status="failed", error=error)
+            db.execute(update(DuaJob).where(DuaJob.id == job_id).values(**values))
+            db.commit()
+        finally:
+            db.close()
+
+        self.stats["succeeded" if error is None else "failed"] += 1
+        if job.callback_url:
+            await self._deliver_callback(job_id, job.callback_url)
+
+    async def _deliver_callback(self, job_id: str, callback_url: str):
+        """POST the finished job to its callback URL, retrying with backoff"""
+        payload = job_to_dict(self.get(job_id))
+        delivered = False
+        for attempt in range(CALLBACK_ATTEMPTS):
+            try:
+                # Resolved again on every attempt: DNS may now point somewhere internal
+                await resolve_callback_url(callback_url)
+                response = await get_http_client("webhooks").post(
+                    callback_url, json=payload, timeout=CALLBACK_TIMEOUT, follow_redirects=False
+                )
+                if response.status_code < 400:
+                    delivered = True
+                    break
+                print(f"Dua job callback {callback_url} returned {response.status_code}")
+            except UnsafeCallbackURLError as e:
+                print(f"Dua job callback refused: {e}")
+                break
+            except Exception as e:
+                print(f"Dua job callback {callback_url} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+        self.stats["callbacks_delivered" if delivered else "callbacks_failed"] += 1
+        db = self.session_factory()
+        try:
+            db.execute(update(DuaJob).where(DuaJob.id == job_id).values(callback_status="delivered" if delivered else "failed"))
+            db.commit()
+        finally:
+            db.close()
+
+
+# Shared queue used by app/routes/dua.py and started in app/main.py
+dua_job_queue = DuaJobQueue()
@@ -0,0 +1,67 @@
+"""
+Shared, pooled HTTP clients for outbound API calls (Deepseek, Groq, YouTube)
+
+One client per upstream for the whole application lifespan: keep-alive,
+per-upstream connection limits, HTTP/2 when the h2 package is installed.
+Services fetch them with get_http_client()/get_sync_http_client();
+app.main closes them on shutdown.
+"""
+import asyncio
+from typing import Dict, Tuple
+
+import httpx
+
+from app.config import settings
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# name -> (client, event loop it belongs to)
+_async_clients: Dict[str, Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+_sync_clients: Dict[str, httpx.Client] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """Shared async client for an upstream (recreated if the event loop changed)"""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(name)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=_timeout())
+        _async_clients[name] = (client, loop)
+    return _async_clients[name][0]
+
+
+def get_sync_http_client(name: str = "default") -> httpx.Client:
+    """Shared blocking client for an upstream"""
+    client = _sync_clients.get(name)
+    if client is None or client.is_closed:
+        client = httpx.Client(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=_timeout())
+        _sync_clients[name] = client
+    return client
+
+
+async def close_http_clients():
+    """Close all shared clients (application shutdown)"""
+    loop = asyncio.get_running_loop()
+    for name, (client, client_loop) in list(_async_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+        del _async_clients[name]
+    for name, client in list(_sync_clients.items()):
+        client.close()
+        del _sync_clients[name]
@@ -0,0 +1,308 @@
+"""
+LLM Rate Limiter - Token buckets and a concurrency cap for outbound LLM calls
+
+Groq and Deepseek enforce requests-per-minute and tokens-per-minute limits per
+API key, shared by every worker process. Each provider gets two token buckets
+(requests and tokens) stored in a small owner-only SQLite file
+(settings.llm_limiter_path, app/data/ by default), so all processes on the
+host draw from the same budget. Updates run in BEGIN IMMEDIATE transactions, which SQLite serializes
+across processes.
+
+Usage:
+
+    async with llm_slot("groq", prompt_text, max_tokens=800) as slot:
+        response = await client.post(...)
+        await slot.settle(response)
+
+llm_slot first waits for one of settings.llm_max_concurrency
+per-process slots, then until both buckets can cover the estimated tokens
+(len(prompt)/4 + max_tokens). Both waits share one deadline, and no budget
+is taken while a call is still queued for a slot. settle() swaps the
+estimate for the usage the provider reports (streamed calls pass the usage
+from their last chunk). On a 429 it pauses the provider for all processes
+for Retry-After seconds.
+
+Priority classes:
+    interactive  user-facing requests (default); may drain the buckets and
+                 gives up after settings.llm_interactive_deadline seconds
+    background   job workers and pre-generation, set with
+                 `with llm_priority("background"):`. Background calls leave
+                 settings.llm_background_reserve of each bucket for
+                 interactive calls and wait up to
+                 settings.llm_background_deadline seconds
+When the deadline passes, or a wait (e.g. for a 429 pause to end) would
+outlast it, llm_slot raises RateLimitTimeout. While the provider's circuit
+is open it raises CircuitOpenError before queueing. Callers handle both like
+any other API error and serve their fallback.
+"""
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.circuit_breaker import CircuitOpenError, get_breaker
+from app.services.llm_cache import DATA_DIR, open_private_db
+
+LLM_LIMITER_PATH = settings.llm_limiter_path or os.path.join(DATA_DIR, "llm_limits.db")
+LLM_MAX_CONCURRENCY = settings.llm_max_concurrency
+LLM_INTERACTIVE_DEADLINE = settings.llm_interactive_deadline
+LLM_BACKGROUND_DEADLINE = settings.llm_background_deadline
+LLM_BACKGROUND_RESERVE = settings.llm_background_reserve
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when an LLM call cannot get budget before its deadline"""
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run LLM calls made inside the block (and tasks it creates) at this priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str, max_tokens: int) -> int:
+    """Rough upper bound for a call: ~4 characters per prompt token plus the completion"""
+    return len(text) // 4 + max_tokens
+
+
+def provider_limits(provider: str) -> Tuple[float, float]:
+    """(requests, tokens) per minute from settings.<provider>_rpm / <provider>_tpm"""
+    return (
+        float(getattr(settings, f"{provider}_rpm", 60)),
+        float(getattr(settings, f"{provider}_tpm", 100000)),
+    )
+
+
+class LLMRateLimiter:
+    """Cross-process RPM/TPM token buckets plus a per-process concurrency cap"""
+
+    def __init__(
+        self,
+        path: str = LLM_LIMITER_PATH,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        background_reserve: float = LLM_BACKGROUND_RESERVE,
+        deadlines: Optional[Dict[str, float]] = None,
+        clock=time.time,
+    ):
+        self.path = path
+        self.max_concurrency = max_concurrency
+        self.limits = limits or {}
+        self.background_reserve = background_reserve
+        self.deadlines = deadlines or {INTERACTIVE: LLM_INTERACTIVE_DEADLINE, BACKGROUND: LLM_BACKGROUND_DEADLINE}
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._db = None
+        self._semaphores: Dict[Tuple[str, asyncio.AbstractEventLoop], asyncio.Semaphore] = {}
+        self.stats = {"acquired": 0, "waited": 0, "timeouts": 0, "throttled": 0}
+
+    # ---- storage ----
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_private_db(self.path, isolation_level=None)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_buckets ("
+                "provider TEXT PRIMARY KEY, requests REAL, tokens REAL, "
+                "updated_at REAL, blocked_until REAL DEFAULT 0)"
+            )
+        return self._db
+
+    def limits_for(self, provider: str) -> Tuple[float, float]:
+        return self.limits.get(provider) or provider_limits(provider)
+
+    def _update(self, provider: str, fn):
+        """Run fn(requests, tokens, blocked_until, now, rpm, tpm) -> (new values or None, result) in one transaction"""
+        rpm, tpm = self.limits_for(provider)
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                now = self.clock()
+                row = db.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM llm_buckets WHERE provider = ?",
+                    (provider,)
+                ).fetchone()
+                if row is None:
+                    requests, tokens, blocked_until = rpm, tpm, 0.0
+                else:
+                    # Refill both buckets for the time since the last update
+                    elapsed = max(0.0, now - row[2])
+                    requests = min(rpm, row[0] + elapsed * rpm / 60.0)
+                    tokens = min(tpm, row[1] + elapsed * tpm / 60.0)
+                    blocked_until = row[3] or 0.0
+                new_values, result = fn(requests, tokens, blocked_until, now, rpm, tpm)
+                if new_values is None:
+                    new_values = (requests, tokens, blocked_until)
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_buckets (provider, requests, tokens, updated_at, blocked_until) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (provider, new_values[0], new_values[1], now, new_values[2])
+                )
+                db.execute("COMMIT")
+                return result
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    # ---- buckets ----
+
+    def try_acquire(self, provider: str, tokens: int, priority: str = INTERACTIVE) -> float:
+        """Take budget for one call; returns 0 on success, else seconds to wait before retrying"""
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+
+        def take(requests, available_tokens, blocked_until, now, rpm, tpm):
+            if blocked_until > now:
+                return None, blocked_until - now
+            # A call larger than the whole bucket could never run; let it through when full
+            need_tokens = min(tokens, tpm * (1 - reserve))
+            need_requests = 1 + rpm * reserve
+            need_token_level = need_tokens + tpm * reserve
+            if requests >= need_requests and available_tokens >= need_token_level:
+                return (requests - 1, available_tokens - need_tokens, blocked_until), 0.0
+            wait = max(
+                (need_requests - requests) * 60.0 / rpm,
+                (need_token_level - available_tokens) * 60.0 / tpm,
+            )
+            return None, max(wait, 0.05)
+
+        return self._update(provider, take)
+
+    def refund(self, provider: str, tokens: int, requests: int = 1):
+        """Give back budget that was not used"""
+        def give(req, available_tokens, blocked_until, now, rpm, tpm):
+            return (min(rpm, req + requests), min(tpm, available_tokens + tokens), blocked_until), None
+        self._update(provider, give)
+
+    def adjust_tokens(self, provider: str, delta: int):
+        """Charge (delta > 0) or refund (delta < 0) tokens after a call reports its real usage"""
+        def adjust(req, available_tokens, blocked_until, now, rpm, tpm):
+            return (req, min(tpm, available_tokens - delta), blocked_until), None
+        self._update(provider, adjust)
+
+    def block(self, provider: str, seconds: float):
+        """Pause a provider for every process (after a 429)"""
+        def pause(req, available_tokens, blocked_until, now, rpm, tpm):
+            return (req, available_tokens, max(blocked_until, now + seconds)), None
+        self._update(provider, pause)
+        self.stats["throttled"] += 1
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        key = (provider, asyncio.get_running_loop())
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def acquire(self, provider: str, tokens: int, priority: Optional[str] = None, deadline: Optional[float] = None):
+        """Wait for budget; raises RateLimitTimeout when the deadline (seconds) passes first"""
+        priority = priority or _priority.get()
+        if deadline is None:
+            deadline = self.deadlines.get(priority, LLM_INTERACTIVE_DEADLINE)
+        give_up_at = time.monotonic() + deadline
+        loop = asyncio.get_running_loop()
+        waited = False
+        while True:
+            wait = await loop.run_in_executor(None, self.try_acquire, provider, tokens, priority)
+            if wait == 0:
+                self.stats["acquired"] += 1
+                self.stats["waited"] += int(waited)
+                return
+            remaining = give_up_at - time.monotonic()
+            # Budget (or the end of a 429 pause) that cannot arrive in time: give up now
+            if wait > remaining:
+                self.stats["timeouts"] += 1
+                raise RateLimitTimeout(f"{provider} rate limit: no budget within {deadline:.0f}s ({priority})")
+            waited = True
+            # Interactive callers re-check more often so they win races for freed budget
+            await asyncio.sleep(min(wait, remaining, 0.25 if priority == INTERACTIVE else 1.0))
+
+    @asynccontextmanager
+    async def slot(self, provider: str, tokens: int, priority: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        A concurrency slot plus budget for one call; yields a _Slot for settle().
+        The slot is taken first, so calls queued behind the concurrency cap do
+        not hold budget, and both waits count against the same deadline.
+        """
+        priority = priority or _priority.get()
+        if deadline is None:
+            deadline = self.deadlines.get(priority, LLM_INTERACTIVE_DEADLINE)
+        give_up_at = time.monotonic() + deadline
+        semaphore = self._semaphore(provider)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=deadline)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise RateLimitTimeout(f"{provider}: no free call slot within {deadline:.0f}s ({priority})")
+        try:
+            await self.acquire(provider, tokens, priority, give_up_at - time.monotonic())
+            try:
+                yield _Slot(self, provider, tokens)
+            except CircuitOpenError:
+                # The provider was never called
+                await asyncio.get_running_loop().run_in_executor(None, self.refund, provider, tokens)
+                raise
+        finally:
+            semaphore.release()
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "path": self.path, "max_concurrency": self.max_concurrency}
+
+
+class _Slot:
+    """Handle yielded by LLMRateLimiter.slot()"""
+
+    def __init__(self, limiter: LLMRateLimiter, provider: str, estimated_tokens: int):
+        self.limiter = limiter
+        self.provider = provider
+        self.estimated_tokens = estimated_tokens
+
+    async def settle(self, response, usage: Optional[dict] = None):
+        """
+        Reconcile the estimate with the reported usage; back off on 429.
+        Streamed responses pass usage (from their last chunk, {} if none)
+        since their body is not read here.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if response.status_code == 429:
+                retry_after = float(response.headers.get("retry-after") or 10)
+                await loop.run_in_executor(None, self.limiter.block, self.provider, retry_after)
+            elif response.status_code == 200:
+                if usage is None:
+                    usage = response.json().get("usage") or {}
+                used = usage.get("total_tokens")
+                if used:
+                    await loop.run_in_executor(
+                        None, self.limiter.adjust_tokens, self.provider, int(used) - self.estimated_tokens
+                    )
+        except Exception as e:
+            print(f"Could not settle {self.provider} rate limit usage: {e}")
+
+
+llm_rate_limiter = LLMRateLimiter()
+
+
+def llm_slot(provider: str, prompt_text: str, max_tokens: int, priority: Optional[str] = None):
+    """
+    Shortcut for llm_rate_limiter.slot() with an estimated token cost. Raises
+    CircuitOpenError at once while the provider's circuit is open, so the
+    caller neither queues for a slot nor takes budget it would have to refund.
+    """
+    get_breaker(provider).check()
+    return llm_rate_limiter.slot(provider, estimate_tokens(prompt_text, max_tokens), priority)
@@ -5,7 +5,11 @@ Provides AI-powered video search with keyword extraction using Groq AI
 
 import os
 import json
-import httpx
+from app.services.http_clients import get_http_client
+from app.services.circuit_breaker import get_breaker
+from app.services.llm_rate_limiter import llm_slot
+from app.services.llm_cache import llm_cache
+from app.services.single_flight import single_flight
 from typing import Optional
 from dotenv import load_dotenv
 
@@ -17,6 +21,7 @@ class YouTubeAIService:
         self.youtube_api_key = os.getenv("YOUTUBE_API_KEY")
         self.groq_model = "llama-3.3-70b-versatile"
         
+    @single_flight("youtube_keywords", key=lambda self, user_prompt: user_prompt.strip())
     async def extract_keywords_from_prompt(self, user_prompt: str) -> dict:
         """
         Uses Groq AI to understand user prompt and extract relevant keywords
@@ -55,53 +60,61 @@ class YouTubeAIService:
             
             user_message = f"Extract search keywords and create a YouTube query for: {user_prompt}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.groq_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.groq_model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 300
-                    },
-                    timeout=15.0
-                )
-                
+            payload = {
+                "model": self.groq_model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": 0.7,
+                "max_tokens": 300
+            }
+            content = await llm_cache.aget(payload)
+            if content is None:
+                client = get_http_client("groq")
+                async with llm_slot("groq", system_prompt + user_message, max_tokens=300) as slot:
+                    with get_breaker("groq").track() as call:
+                        response = await client.post(
+                            "https://api.groq.com/openai/v1/chat/completions",
+                            headers={
+                                "Authorization": f"Bearer {self.groq_api_key}",
+                                "Content-Type": "application/json"
+                            },
+                            json=payload,
+                            timeout=15.0
+                        )
+                        if response.status_code != 200:
+                            call.fail()
+                    await slot.settle(response)
                 if response.status_code == 200:
-                    result = response.json()
-                    content = result['choices'][0]['message']['content'].strip()
-                    
-                    # Parse JSON from response
-                    try:
-                        json_start = content.find('{')
-                        json_end = content.rfind('}') + 1
-                        if json_start != -1 and json_end > json_start:
-                            json_str = content[json_start:json_end]
-                            return json.loads(json_str)
-                    except (json.JSONDecodeError, ValueError):
-                        pass
-                    
-                    # Fallback parsing
-                    return {
-                        "main_topic": "Islamic Guidance",
-                        "keywords": user_prompt.split()[:3],
-                        "search_query": f"Islamic {user_prompt}"
-                    }
-                else:
-                    # Fallback if API fails
-                    return {
-                        "main_topic": "Islamic Content",
-                        "keywords": user_prompt.split()[:3],
-                        "search_query": f"Islamic {user_prompt}"
-                    }
-                    
+                    content = response.json()['choices'][0]['message']['content'].strip()
+                    await llm_cache.aput(payload, content)
+            
+            if content is not None:
+                # Parse JSON from response
+                try:
+                    json_start = content.find('{')
+                    json_end = content.rfind('}') + 1
+                    if json_start != -1 and json_end > json_start:
+                        json_str = content[json_start:json_end]
+                        return json.loads(json_str)
+                except (json.JSONDecodeError, ValueError):
+                    pass
+                
+                # Fallback parsing
+                return {
+                    "main_topic": "Islamic Guidance",
+                    "keywords": user_prompt.split()[:3],
+                    "search_query": f"Islamic {user_prompt}"
+                }
+            else:
+                # Fallback if API fails
+                return {
+                    "main_topic": "Islamic Content",
+                    "keywords": user_prompt.split()[:3],
+                    "search_query": f"Islamic {user_prompt}"
+                }
+                
         except Exception as e:
             print(f"Error in extract_keywords_from_prompt: {e}")
             return {
@@ -110,6 +123,7 @@ class YouTubeAIService:
                 "search_query": f"Islamic {user_prompt}"
             }
     
+    @single_flight("youtube_search", key=lambda self, search_query, max_results=6: (search_query.strip().lower(), max_results), timeout=20.0)
     async def search_youtube_videos(self, search_query: str, max_results: int = 6) -> list:
         """
         Searches YouTube for videos using the provided query
@@ -121,41 +135,41 @@ class YouTubeAIService:
             if not self.youtube_api_key:
                 return []
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://www.googleapis.com/youtube/v3/search",
-                    params={
-                        "part": "snippet",
-                        "q": search_query,
-                        "type": "video",
-                        "maxResults": max_results,
-                        "key": self.youtube_api_key,
-                        "order": "relevance",
-                        "relevanceLanguage": "en"
-                    },
-                    timeout=15.0
-                )
+            client = get_http_client("youtube")
+            response = await client.get(
+                "https://www.googleapis.com/youtube/v3/search",
+                params={
+                    "part": "snippet",
+                    "q": search_query,
+                    "type": "video",
+                    "maxResults": max_results,
+                    "key": self.youtube_api_key,
+                    "order": "relevance",
+                    "relevanceLanguage": "en"
+                },
+                timeout=15.0
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                videos = []
+                
+                for item in data.get('items', []):
+                    video_data = {
+                        'id': item['id'].get('videoId', ''),
+                        'title': item['snippet'].get('title', ''),
+                        'description': item['snippet'].get('description', ''),
+                        'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', ''),
+                        'channel': item['snippet'].get('channelTitle', 'Unknown Channel'),
+                        'url': f"https://www.youtube.com/watch?v={item['id'].get('videoId', '')}"
+                    }
+                    if video_data['id']:  # Only include if valid video ID
+                        videos.append(video_data)
+                
+                return videos
+            else:
+                return []
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    videos = []
-                    
-                    for item in data.get('items', []):
-                        video_data = {
-                            'id': item['id'].get('videoId', ''),
-                            'title': item['snippet'].get('title', ''),
-                            'description': item['snippet'].get('description', ''),
-                            'thumbnail': item['snippet']['thumbnails'].get('medium', {}).get('url', ''),
-                            'channel': item['snippet'].get('channelTitle', 'Unknown Channel'),
-                            'url': f"https://www.youtube.com/watch?v={item['id'].get('videoId', '')}"
-                        }
-                        if video_data['id']:  # Only include if valid video ID
-                            videos.append(video_data)
-                    
-                    return videos
-                else:
-                    return []
-                    
         except Exception as e:
             print(f"Error in search_youtube_videos: {e}")
             return []
@@ -0,0 +1,90 @@
+"""
+Single Flight - Coalesce identical concurrent calls into one
+
+When a popular question arrives many times at once, every request would
+otherwise make the same Deepseek/YouTube call. A function decorated with
+@single_flight runs once per key at a time: callers that arrive while a call
+for the same key is in flight await its result instead of starting another.
+
+- The key is built from the arguments (key=...); by default the arguments
+  themselves.
+- Every caller gets its own deep copy of the result, so one request mutating
+  it cannot affect the others.
+- An exception raised by the call is raised in every waiting caller.
+- Each caller waits at most `timeout` seconds (settings.single_flight_timeout
+  by default) and then gets asyncio.TimeoutError. The shared call itself keeps
+  running for the callers that are still waiting.
+"""
+import asyncio
+import copy
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+
+SINGLE_FLIGHT_TIMEOUT = settings.single_flight_timeout
+
+
+class SingleFlight:
+    """In-flight calls of one function, keyed by argument key"""
+
+    def __init__(self, name: str, timeout: Optional[float] = SINGLE_FLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        # (event loop, key) -> task of the call in flight
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0, "timeouts": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Run fn() unless a call for key is already in flight, then share its result"""
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+        self.stats["calls"] += 1
+
+        task = self._inflight.get(slot)
+        if task is None:
+            self.stats["executions"] += 1
+            task = loop.create_task(fn())
+            self._inflight[slot] = task
+            task.add_done_callback(lambda done, slot=slot: self._finished(slot, done))
+        else:
+            self.stats["coalesced"] += 1
+
+        try:
+            # shield: one caller timing out or being cancelled must not cancel the shared call
+            result = await asyncio.wait_for(asyncio.shield(task), timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        return copy.deepcopy(result)
+
+    def _finished(self, slot, task: asyncio.Task):
+        if self._inflight.get(slot) is task:
+            del self._inflight[slot]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "in_flight": len(self._inflight)}
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str, key: Optional[Callable[..., Hashable]] = None, timeout: Optional[float] = SINGLE_FLIGHT_TIMEOUT):
+    """Decorator for async functions; key(*args, **kwargs) builds the coalescing key"""
+    group = _groups.setdefault(name, SingleFlight(name, timeout))
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            flight_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await group.do(flight_key, lambda: fn(*args, **kwargs))
+        wrapper.flight = group
+        return wrapper
+
+    return decorator
+
+
+def get_single_flight_stats() -> Dict[str, dict]:
+    return {name: group.get_stats() for name, group in sorted(_groups.items())}
@@ -0,0 +1,132 @@
+"""
+Benchmark the SQLite profiles (see database.py / sqlite_tuning.py)
+
+Runs the same mixed chat workload against a scratch database once per
+profile: worker threads either send a message (ChatService.send_message:
+insert plus counter update) or read an inbox page and a message page.
+Reports throughput per operation, p95 latency and "database is locked"
+errors for the default engine (rollback journal, one engine) and the tuned
+one (WAL, pragmas, a single writer connection).
+
+Usage:
+    python benchmark_sqlite.py [--threads N] [--seconds S] [--write-ratio R] [--conversations N]
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models_extended import Conversation, Imam, Message
+from pagination import paginate
+from services_chat import ChatService
+from sqlite_tuning import RoutingSession, create_sqlite_engines
+
+PROFILES = ("default", "tuned")
+
+
+def session_factory(profile: str, url: str):
+    if profile == "tuned":
+        read_engine, write_engine = create_sqlite_engines(url)
+        return read_engine, sessionmaker(class_=RoutingSession, autoflush=False, bind=read_engine, write_bind=write_engine)
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    return engine, sessionmaker(autoflush=False, bind=engine)
+
+
+def seed(factory, conversations: int, messages: int):
+    db = factory()
+    imam = Imam(name="Imam Ahmad", email="imam@mosque.local")
+    db.add(imam)
+    db.flush()
+    for n in range(conversations):
+        db.add(Conversation(user_email=f"user{n % 50}@x.com", imam_id=imam.id, topic=f"topic {n}"))
+    db.commit()
+    ids = [conv.id for conv in db.query(Conversation.id)]
+    for conv_id in ids:
+        for i in range(messages):
+            ChatService.send_message(db, conv_id, "imam@mosque.local", "imam", f"message {i}")
+    db.close()
+    return ids
+
+
+def run(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        engine, factory = session_factory(profile, f"sqlite:///{Path(scratch) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        conversation_ids = seed(factory, args.conversations, 5)
+
+        deadline = time.perf_counter() + args.seconds
+        results = {"read": [], "write": [], "locked": 0}
+        lock = threading.Lock()
+
+        def worker(seed_value):
+            rng = random.Random(seed_value)
+            db = factory()
+            latencies = {"read": [], "write": []}
+            locked = 0
+            while time.perf_counter() < deadline:
+                kind = "write" if rng.random() < args.write_ratio else "read"
+                conv_id = rng.choice(conversation_ids)
+                started = time.perf_counter()
+                try:
+                    if kind == "write":
+                        ChatService.send_message(db, conv_id, "u@x.com", "user", "Assalamu alaikum")
+                    else:
+                        ChatService.get_inbox(db, user_email=f"user{conv_id % 50}@x.com", limit=20)
+                        paginate(db.query(Message).filter(Message.conversation_id == conv_id),
+                                 (Message.created_at, Message.id), limit=20)
+                        db.rollback()  # end the read transaction, as a request would
+                except OperationalError as e:
+                    db.rollback()
+                    if "locked" not in str(e):
+                        raise
+                    locked += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+            db.close()
+            with lock:
+                results["read"] += latencies["read"]
+                results["write"] += latencies["write"]
+                results["locked"] += locked
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+    return results
+
+
+def p95(latencies) -> float:
+    if not latencies:
+        return 0.0
+    return sorted(latencies)[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the default and tuned SQLite profiles")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent workers")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration per profile")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="Share of operations that send a message")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversations seeded before the run")
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.seconds:.0f}s per profile, {args.write_ratio:.0%} writes\n")
+    print(f"{'profile':<10}{'reads/s':>10}{'writes/s':>10}{'read p95':>12}{'write p95':>12}{'locked':>8}")
+    for profile in PROFILES:
+        results = run(profile, args)
+        print(
+            f"{profile:<10}"
+            f"{len(results['read']) / args.seconds:>10.0f}"
+            f"{len(results['write']) / args.seconds:>10.0f}"
+            f"{p95(results['read']):>10.1f}ms"
+            f"{p95(results['write']):>10.1f}ms"
+            f"{results['locked']:>8}"
+        )
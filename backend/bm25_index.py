@@ -0,0 +1,114 @@
+"""
+BM25 Index - Inverted-index keyword retrieval for Quran verses
+
+Built once at startup. A query only touches the posting lists of its own terms,
+so scoring takes microseconds and needs neither numpy nor the embedding model.
+English text is lower-cased with light plural stemming. Arabic text is
+normalized: diacritics and tatweel are stripped, and alef/yaa/taa-marbuta
+variants are unified, so "الصَّبْر" matches "الصبر".
+
+reciprocal_rank_fusion() merges the BM25 ranking with the dense ranking.
+"""
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_ARABIC_DIACRITICS_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+_ARABIC_LETTER_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي",
+    "ؤ": "و",
+    "ة": "ه",
+})
+
+ENGLISH_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "for", "from", "has", "have",
+    "he", "her", "him", "his", "i", "if", "in", "is", "it", "its", "me", "my", "not", "of", "on",
+    "or", "so", "that", "the", "their", "them", "they", "this", "to", "was", "we", "were", "what",
+    "when", "which", "who", "will", "with", "you", "your", "am", "about", "how", "very", "feel",
+    "feeling", "im", "been", "being", "can", "would", "should", "there", "then", "than", "o",
+}
+
+
+def normalize_arabic(text: str) -> str:
+    """Strip diacritics/tatweel and unify common Arabic letter variants"""
+    return _ARABIC_DIACRITICS_RE.sub("", text).translate(_ARABIC_LETTER_MAP)
+
+
+def _stem(token: str) -> str:
+    """Very light English plural stemming (duas -> dua, worries -> worry)"""
+    if not token.isascii() or len(token) <= 3:
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens used for both indexing and querying"""
+    text = normalize_arabic(text.lower())
+    return [_stem(t) for t in _TOKEN_RE.findall(text) if t not in ENGLISH_STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents"""
+
+    def __init__(self, documents: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths = []
+
+        for doc_id, document in enumerate(documents):
+            counts = defaultdict(int)
+            tokens = tokenize(document)
+            for token in tokens:
+                counts[token] += 1
+            for token, tf in counts.items():
+                self.postings[token].append((doc_id, tf))
+            self.doc_lengths.append(len(tokens))
+
+        self.doc_count = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / self.doc_count) if self.doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (self.doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Return [(doc_id, score)] for the best matching documents, best first (ties: lowest doc_id)"""
+        scores = defaultdict(float)
+        # Query order, not set order: float sums (and so ties) must not depend on PYTHONHASHSEED
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_doc_length or 1)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Fuse several rankings (lists of doc ids, best first) by summing 1 / (k + rank).
+    Rank-based, so BM25 and cosine scores never need to be on the same scale.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
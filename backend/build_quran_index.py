@@ -0,0 +1,37 @@
+"""
+Build the full-Quran vector index used when QURAN_INDEX_MODE=full
+
+Streams all verses from the quran_english/quran_arabic tables (populated by
+scripts/import_quran_csv.py), encodes them in batches and writes the versioned
+index files to backend/quran_index/.
+
+Usage:
+    python build_quran_index.py [--database-url URL] [--batch-size N] [--ann flat|ivf|hnsw]
+
+With --ann ivf/hnsw the approximate index is built too and its recall@10
+against exact search is reported.
+"""
+import argparse
+import time
+
+from embedding_store import EmbeddingStore
+from services_quran_search import build_full_index, _full_index_paths, QURAN_DATABASE_URL
+from vector_index import load_or_build_index, ANN_BACKEND, RECALL_K
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the full-Quran vector index")
+    parser.add_argument("--database-url", default=QURAN_DATABASE_URL, help="Database holding the quran_english/quran_arabic tables")
+    parser.add_argument("--batch-size", type=int, default=256, help="Verses encoded per batch")
+    parser.add_argument("--ann", default=ANN_BACKEND, choices=["flat", "ivf", "hnsw"], help="Nearest-neighbour backend to prepare")
+    args = parser.parse_args()
+
+    print(f"Building full Quran index from {args.database_url}...")
+    started = time.perf_counter()
+    count = build_full_index(args.database_url, batch_size=args.batch_size)
+    print(f"✅ Indexed {count} verses in {time.perf_counter() - started:.1f}s")
+
+    if args.ann != "flat":
+        store = EmbeddingStore.open(_full_index_paths()[0])
+        index = load_or_build_index(store, kind=args.ann)
+        print(f"✅ {index.kind} index ready, recall@{RECALL_K} vs exact: {index.recall:.3f}")
@@ -0,0 +1,226 @@
+"""
+Circuit Breaker - Fail fast to the local fallbacks when an LLM provider is unhealthy
+
+Every Groq/Deepseek call runs inside get_breaker(provider).track(). The
+breaker keeps the outcome and latency of recent calls in a sliding window
+(CIRCUIT_WINDOW_SECONDS, at most CIRCUIT_WINDOW_SIZE calls) and opens when,
+over at least CIRCUIT_MIN_CALLS calls, either
+
+    - the error rate reaches CIRCUIT_ERROR_RATE, or
+    - the p95 latency reaches CIRCUIT_P95_SECONDS.
+
+While open, track() raises CircuitOpenError immediately, so callers drop
+straight into the except branch that serves their local fallback instead of
+waiting out a 15-30s timeout. After CIRCUIT_OPEN_SECONDS the breaker goes
+half-open and lets CIRCUIT_HALF_OPEN_CALLS trial requests through: a fast
+success closes it again, a failure (or a slow success) re-opens it.
+
+State for every provider is reported by /api/health.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_WINDOW_SIZE = int(os.getenv("CIRCUIT_WINDOW_SIZE", "100"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_P95_SECONDS = float(os.getenv("CIRCUIT_P95_SECONDS", "12"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised by track() when the provider's circuit is open"""
+
+
+class _Call:
+    """Handle yielded by CircuitBreaker.track(); call fail() for bad responses"""
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+def _p95(latencies) -> Optional[float]:
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Sliding-window circuit breaker for one upstream provider"""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        window_size: int = CIRCUIT_WINDOW_SIZE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        error_rate: float = CIRCUIT_ERROR_RATE,
+        p95_seconds: float = CIRCUIT_P95_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.p95_seconds = p95_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+
+        self.state = CLOSED
+        self._calls = deque(maxlen=window_size)  # (finished_at, ok, latency)
+        self._opened_at = 0.0
+        self._trials_in_flight = 0
+        self._lock = threading.Lock()
+
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    # ---- state machine ----
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider right now"""
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    self.stats["rejected"] += 1
+                    return False
+                self.state = HALF_OPEN
+                self._trials_in_flight = 0
+            if self.state == HALF_OPEN:
+                if self._trials_in_flight >= self.half_open_calls:
+                    self.stats["rejected"] += 1
+                    return False
+                self._trials_in_flight += 1
+            return True
+
+    def check(self):
+        """
+        Raise CircuitOpenError if allow() would refuse a call now, without
+        admitting one: lets callers fail fast before queueing for a call slot
+        """
+        with self._lock:
+            rejecting = (
+                (self.state == OPEN and self.clock() - self._opened_at < self.open_seconds)
+                or (self.state == HALF_OPEN and self._trials_in_flight >= self.half_open_calls)
+            )
+            if rejecting:
+                self.stats["rejected"] += 1
+        if rejecting:
+            raise CircuitOpenError(f"{self.name} circuit is open, using fallback")
+
+    def record(self, ok: bool, latency: float):
+        """Record the outcome of a call admitted by allow()"""
+        now = self.clock()
+        with self._lock:
+            self.stats["calls"] += 1
+            if not ok:
+                self.stats["failures"] += 1
+
+            if self.state == HALF_OPEN:
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+                if ok and latency < self.p95_seconds:
+                    self.state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok, latency))
+            self._prune(now)
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                if errors / len(self._calls) >= self.error_rate or _p95([c[2] for c in self._calls]) >= self.p95_seconds:
+                    self._open(now)
+
+    def _release(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trials_in_flight = max(0, self._trials_in_flight - 1)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self.stats["opened"] += 1
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    @contextmanager
+    def track(self):
+        """
+        Guard one provider call.
+
+            with get_breaker("groq").track() as call:
+                response = await client.post(...)
+                if response.status_code != 200:
+                    call.fail()
+
+        Raises CircuitOpenError without calling the provider while the
+        circuit is open. Exceptions raised inside the block count as failures;
+        cancellation does not.
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open, using fallback")
+        call = _Call()
+        started = self.clock()
+        try:
+            yield call
+        except Exception:
+            self.record(False, self.clock() - started)
+            raise
+        except BaseException:
+            # Cancelled (e.g. the client went away): not the provider's fault
+            self._release()
+            raise
+        self.record(not call.failed, self.clock() - started)
+
+    def get_state(self) -> dict:
+        with self._lock:
+            self._prune(self.clock())
+            calls = list(self._calls)
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (self.clock() - self._opened_at)), 1)
+        errors = sum(1 for _, ok, _ in calls if not ok)
+        p95 = _p95([c[2] for c in calls])
+        return {
+            "state": self.state,
+            "window_calls": len(calls),
+            "error_rate": round(errors / len(calls), 3) if calls else 0.0,
+            "p95_latency": round(p95, 3) if p95 is not None else None,
+            "retry_in_seconds": retry_in,
+            **self.stats,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Shared breaker for a provider ("groq", "deepseek", ...)"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_breaker_states() -> Dict[str, dict]:
+    return {name: breaker.get_state() for name, breaker in sorted(_breakers.items())}
@@ -1,15 +1,30 @@
-﻿from sqlalchemy import create_engine
+﻿import os
+
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from sqlite_tuning import RoutingSession, create_sqlite_engines
+
 # Use SQLite - No database server needed!
 DATABASE_URL = "sqlite:///./ramadan_app.db"
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+# "default": one plain engine with SQLite's default journaling;
+# "tuned": WAL, pragmas and a single writer connection (see sqlite_tuning.py).
+# Opt in after comparing the two on your workload with benchmark_sqlite.py
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+
+if SQLITE_PROFILE == "tuned":
+    engine, write_engine = create_sqlite_engines(DATABASE_URL)
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, write_bind=write_engine
+    )
+else:
+    engine = write_engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
@@ -0,0 +1,213 @@
+"""
+Dua Pool - Pre-generated duas for requests without detailed context
+
+DuaService.generate_dua already randomizes style and opening, so a user who
+only picks a category ("Health Issues", context "sick") gets nothing from a
+dua written token-by-token for them. For those requests POST /api/dua/generate
+takes a pre-generated bilingual dua from the dua_pool table instead of
+waiting on Groq.
+
+- The pool keeps DUA_POOL_SIZE duas per (DUA_CATEGORIES x DUA_STYLES) entry.
+- A request is served from the pool when its category is a known one and its
+  context has at most DUA_POOL_MAX_CONTEXT_WORDS words. Each pooled dua is
+  served once: it is deleted when taken, so users keep getting fresh duas.
+- A background refiller tops the pools up every DUA_POOL_REFILL_INTERVAL
+  seconds, at most DUA_POOL_REFILL_BATCH duas per pass, only during
+  DUA_POOL_REFILL_HOURS (e.g. "1-6", empty = any hour) and only while the Groq
+  circuit is closed. Its calls run at background priority, so the rate
+  limiter keeps budget free for interactive requests; the pass stops at the
+  first fallback dua (budget exhausted or provider failing).
+"""
+import asyncio
+import os
+import random
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, func
+
+from circuit_breaker import CLOSED, get_breaker
+from database import SessionLocal
+from llm_cache import CACHE_OFF
+from llm_rate_limiter import BACKGROUND, llm_priority
+from models_extended import PooledDua
+from services_dua import GROQ_API_KEY, DuaService
+
+DUA_POOL_ENABLED = os.getenv("DUA_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+DUA_POOL_SIZE = int(os.getenv("DUA_POOL_SIZE", "3"))
+DUA_POOL_MAX_CONTEXT_WORDS = int(os.getenv("DUA_POOL_MAX_CONTEXT_WORDS", "3"))
+DUA_POOL_REFILL_INTERVAL = float(os.getenv("DUA_POOL_REFILL_INTERVAL", "600"))
+DUA_POOL_REFILL_BATCH = int(os.getenv("DUA_POOL_REFILL_BATCH", "10"))
+DUA_POOL_REFILL_HOURS = os.getenv("DUA_POOL_REFILL_HOURS", "")
+
+# Context sent to the model for pooled duas
+POOL_CONTEXT = "no further details shared"
+TAKE_ATTEMPTS = 3
+
+
+def in_refill_hours(hours: str, hour: int) -> bool:
+    """True if hour falls in a "start-end" range (end exclusive, may wrap midnight); empty means always"""
+    if not hours.strip():
+        return True
+    start, end = (int(part) for part in hours.split("-", 1))
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class DuaPool:
+    """Pooled duas per category and style, with a background refiller"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        generate: Callable[..., Awaitable[dict]] = DuaService.generate_dua,
+        size: int = DUA_POOL_SIZE,
+        max_context_words: int = DUA_POOL_MAX_CONTEXT_WORDS,
+        enabled: bool = DUA_POOL_ENABLED,
+    ):
+        self.session_factory = session_factory
+        self.generate = generate
+        self.size = size
+        self.max_context_words = max_context_words
+        self.enabled = enabled
+        self._task = None
+
+        self.stats = {"served": 0, "misses": 0, "generated": 0, "rejected": 0, "refill_passes": 0}
+
+    def eligible(self, category: str, context: str) -> bool:
+        """Whether a request is generic enough to be answered from the pool"""
+        return (
+            self.enabled
+            and category in DuaService.DUA_CATEGORIES
+            and len((context or "").split()) <= self.max_context_words
+        )
+
+    def take(self, category: str, context: str) -> Optional[dict]:
+        """Remove and return a pooled dua for category, or None when the pool is empty"""
+        db = self.session_factory()
+        try:
+            for _ in range(TAKE_ATTEMPTS):
+                dua = (
+                    db.query(PooledDua)
+                    .filter(PooledDua.category == category)
+                    .order_by(func.random())
+                    .first()
+                )
+                if dua is None:
+                    break
+                # Conditional delete: if another request took it first, pick again
+                if db.execute(delete(PooledDua).where(PooledDua.id == dua.id)).rowcount:
+                    db.commit()
+                    self.stats["served"] += 1
+                    return {
+                        "category": category,
+                        "context": context,
+                        "dua_text_en": dua.dua_text_en,
+                        "dua_text_ar": dua.dua_text_ar,
+                        "how_to_use_en": dua.how_to_use_en,
+                        "how_to_use_ar": dua.how_to_use_ar,
+                        "ai_generated": True,
+                        "style_used": dua.style,
+                        "pooled": True,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                db.rollback()
+        finally:
+            db.close()
+        self.stats["misses"] += 1
+        return None
+
+    def counts(self) -> dict:
+        """{category: {style: pooled duas}} for every category and style"""
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(PooledDua.category, PooledDua.style, func.count(PooledDua.id))
+                .group_by(PooledDua.category, PooledDua.style)
+                .all()
+            )
+        finally:
+            db.close()
+        counts = {category: {style: 0 for style in DuaService.DUA_STYLES} for category in DuaService.DUA_CATEGORIES}
+        for category, style, count in rows:
+            if category in counts and style in counts[category]:
+                counts[category][style] = count
+        return counts
+
+    def deficits(self) -> List[Tuple[str, str, int]]:
+        """(category, style, missing) for every entry below the target size, emptiest first"""
+        missing = [
+            (category, style, self.size - count)
+            for category, styles in self.counts().items()
+            for style, count in styles.items()
+            if count < self.size
+        ]
+        random.shuffle(missing)  # spread a partial pass across categories
+        return sorted(missing, key=lambda entry: -entry[2])
+
+    async def refill(self, max_new: int = DUA_POOL_REFILL_BATCH) -> int:
+        """Generate up to max_new duas for the emptiest entries; returns how many were stored"""
+        self.stats["refill_passes"] += 1
+        stored = 0
+        # Round-robin over the entries so one pass raises every pool a little
+        plan = []
+        deficits = self.deficits()
+        for round_no in range(self.size):
+            plan.extend((category, style) for category, style, missing in deficits if missing > round_no)
+
+        with llm_priority(BACKGROUND):
+            for category, style in plan[:max_new]:
+                result = await self.generate(category, POOL_CONTEXT, style=style, cache=CACHE_OFF)
+                if not result.get("ai_generated"):
+                    # Template fallback: out of budget or Groq is failing, try again next pass
+                    break
+                if not result.get("dua_text_en") or not result.get("dua_text_ar"):
+                    self.stats["rejected"] += 1
+                    continue
+                self._store(category, style, result)
+                stored += 1
+        self.stats["generated"] += stored
+        return stored
+
+    def _store(self, category: str, style: str, result: dict):
+        db = self.session_factory()
+        try:
+            db.add(PooledDua(
+                category=category,
+                style=style,
+                dua_text_en=result["dua_text_en"],
+                dua_text_ar=result["dua_text_ar"],
+                how_to_use_en=result.get("how_to_use_en", ""),
+                how_to_use_ar=result.get("how_to_use_ar", "")
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def start(self):
+        """Start the refiller on the running loop (no-op when disabled or without a Groq key)"""
+        if not self.enabled or not GROQ_API_KEY or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _refill_loop(self):
+        while True:
+            try:
+                if in_refill_hours(DUA_POOL_REFILL_HOURS, datetime.now().hour) and get_breaker("groq").state == CLOSED:
+                    await self.refill()
+            except Exception as e:
+                print(f"Dua pool refill failed: {e}")
+            await asyncio.sleep(DUA_POOL_REFILL_INTERVAL)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "enabled": self.enabled, "size": self.size, "pooled": self.counts()}
+
+
+# Shared pool used by routes/dua.py and started in main.py
+dua_pool = DuaPool()
@@ -0,0 +1,169 @@
+"""
+Embedding Store - Memory-mapped, pre-normalized sentence embeddings
+
+Embeddings are L2-normalized once at build time and written as a plain .npy
+matrix next to a small JSON header. The matrix is opened with np.memmap, so
+forked uvicorn/gunicorn workers share the same page-cache pages instead of each
+unpickling a private copy, and cosine similarity is a single matrix-vector product.
+
+The header records the model name, dimension, dtype and a checksum of the corpus
+text. open() returns None when any of them no longer match, so callers rebuild
+instead of silently searching a stale index.
+"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+STORE_FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+# int8 stores round(v * INT8_SCALE); unit vectors have components in [-1, 1]
+INT8_SCALE = 127.0
+
+# Rows converted to float32 at a time when scoring float16/int8 stores
+_SCORE_CHUNK_ROWS = 4096
+
+
+def corpus_checksum(texts: List[str], model_name: str) -> str:
+    """Checksum of the exact texts (and model) an index was built from"""
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\x00")
+        digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _header_path(path: Path) -> Path:
+    return path.with_suffix(".meta.json")
+
+
+def unique_temp_path(path: Path) -> Path:
+    """Private temporary name next to path, so concurrent builds never share one"""
+    return path.parent / f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+class EmbeddingStore:
+    """Read-only view over a normalized embedding matrix on disk"""
+
+    def __init__(self, path: Path, matrix, header: dict):
+        self.path = path
+        self.matrix = matrix
+        self.header = header
+        self.dtype = header["dtype"]
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    @staticmethod
+    def build(path, embeddings, model_name: str, checksum: str, dtype: str = "float32") -> "EmbeddingStore":
+        """
+        Normalize embeddings, write them to path (.npy) plus header and return the opened store.
+
+        Files are written under temporary names and renamed into place so a
+        concurrently starting worker never maps a half-written matrix.
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        if dtype == "int8":
+            stored = np.clip(np.rint(matrix * INT8_SCALE), -127, 127).astype(np.int8)
+        else:
+            stored = matrix.astype(dtype)
+
+        header = {
+            "format_version": STORE_FORMAT_VERSION,
+            "model": model_name,
+            "dimension": int(matrix.shape[1]),
+            "count": int(matrix.shape[0]),
+            "dtype": dtype,
+            "checksum": checksum,
+        }
+
+        tmp_matrix, tmp_header = unique_temp_path(path), unique_temp_path(_header_path(path))
+        try:
+            with open(tmp_matrix, "wb") as f:
+                np.save(f, stored)
+            with open(tmp_header, "w", encoding="utf-8") as f:
+                json.dump(header, f)
+            os.replace(tmp_matrix, path)
+            os.replace(tmp_header, _header_path(path))
+        finally:
+            for tmp in (tmp_matrix, tmp_header):
+                tmp.unlink(missing_ok=True)
+
+        return EmbeddingStore.open(path, model_name=model_name, checksum=checksum)
+
+    @staticmethod
+    def open(path, model_name: str = None, checksum: str = None) -> Optional["EmbeddingStore"]:
+        """
+        Memory-map a store. Returns None if it is missing, unreadable or stale
+        (different model, checksum, format version or a matrix that does not
+        match its header).
+        """
+        path = Path(path)
+        header_path = _header_path(path)
+        if not path.exists() or not header_path.exists():
+            return None
+
+        try:
+            with open(header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            matrix = np.load(path, mmap_mode="r")
+        except Exception as e:
+            print(f"Error opening embedding store {path}: {e}")
+            return None
+
+        if header.get("format_version") != STORE_FORMAT_VERSION:
+            return None
+        if model_name is not None and header.get("model") != model_name:
+            print(f"Embedding store {path.name} was built with {header.get('model')}, not {model_name}")
+            return None
+        if checksum is not None and header.get("checksum") != checksum:
+            print(f"Embedding store {path.name} is stale (corpus checksum changed)")
+            return None
+        if matrix.ndim != 2 or matrix.shape != (header.get("count"), header.get("dimension")) \
+                or str(matrix.dtype) != header.get("dtype"):
+            print(f"Embedding store {path.name} does not match its header")
+            return None
+
+        return EmbeddingStore(path, matrix, header)
+
+    def scores(self, query_embedding) -> np.ndarray:
+        """Cosine similarity of every stored vector with a (normalized) query vector"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if self.dtype == "float32":
+            return np.dot(self.matrix, query)
+
+        # No BLAS kernels for float16/int8: convert in bounded chunks
+        out = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), _SCORE_CHUNK_ROWS):
+            chunk = self.matrix[start:start + _SCORE_CHUNK_ROWS].astype(np.float32)
+            out[start:start + len(chunk)] = np.dot(chunk, query)
+        if self.dtype == "int8":
+            out /= INT8_SCALE
+        return out
+
+    def row_scores(self, rows, query_embedding) -> np.ndarray:
+        """Cosine similarity of selected rows only (e.g. keyword hits missing from the dense top-k)"""
+        rows = np.asarray(rows, dtype=np.int64)
+        chunk = np.asarray(self.matrix[rows], dtype=np.float32)
+        out = np.dot(chunk, np.asarray(query_embedding, dtype=np.float32))
+        if self.dtype == "int8":
+            out /= INT8_SCALE
+        return out
@@ -0,0 +1,122 @@
+"""
+Query Encoder Pool - Sentence-transformer encoding off the asyncio event loop
+
+SentenceTransformer.encode is a blocking forward pass. Calling it directly from
+an async route freezes the whole uvicorn worker. QueryEncoder runs it on a
+dedicated thread pool (torch releases the GIL during inference) and micro-batches
+queries that arrive within a few milliseconds of each other into a single
+encode() call, which costs little more than encoding one query.
+
+The submit queue is bounded: when it is full, callers wait up to
+ENCODER_SUBMIT_TIMEOUT seconds and then get EncoderBusyError, so overload turns
+into fast fallbacks instead of an unbounded backlog.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+ENCODER_WORKERS = int(os.getenv("ENCODER_WORKERS", str(os.cpu_count() or 1)))
+ENCODER_QUEUE_SIZE = int(os.getenv("ENCODER_QUEUE_SIZE", "256"))
+ENCODER_BATCH_WINDOW_MS = float(os.getenv("ENCODER_BATCH_WINDOW_MS", "5"))
+ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", "32"))
+ENCODER_SUBMIT_TIMEOUT = float(os.getenv("ENCODER_SUBMIT_TIMEOUT", "2.0"))
+
+
+class EncoderBusyError(Exception):
+    """Raised when the encoder queue stays full for longer than the submit timeout"""
+
+
+class QueryEncoder:
+    """Bounded, micro-batching async front-end for a blocking batch encode function"""
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], list],
+        workers: int = ENCODER_WORKERS,
+        queue_size: int = ENCODER_QUEUE_SIZE,
+        batch_window_ms: float = ENCODER_BATCH_WINDOW_MS,
+        max_batch: int = ENCODER_MAX_BATCH,
+        submit_timeout: float = ENCODER_SUBMIT_TIMEOUT,
+    ):
+        self.encode_batch = encode_batch
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.submit_timeout = submit_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="query-encoder")
+        self._queue = None
+        self._loop = None
+        self._dispatchers = []
+
+        self.stats = {"requests": 0, "batches": 0, "rejected": 0, "max_batch_seen": 0}
+
+    def _ensure_started(self):
+        """Start dispatcher tasks on the running loop (restarts if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._dispatchers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._dispatchers = [loop.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def encode(self, text: str):
+        """Encode one query; concurrent calls are batched together"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        try:
+            await asyncio.wait_for(self._queue.put((text, future)), timeout=self.submit_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise EncoderBusyError(f"Encoder queue full ({self.queue_size} pending)")
+        self.stats["requests"] += 1
+        return await future
+
+    async def _dispatch(self):
+        """Collect a micro-batch, run it on the thread pool and resolve its futures"""
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Drop callers that gave up while waiting in the queue
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            try:
+                vectors = await self._loop.run_in_executor(
+                    self._executor, self.encode_batch, [text for text, _ in batch]
+                )
+                for (_, future), vector in zip(batch, vectors):
+                    if not future.done():
+                        future.set_result(vector)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def get_stats(self) -> dict:
+        """Counters plus the current queue depth"""
+        pending = self._queue.qsize() if self._queue is not None else 0
+        return {**self.stats, "pending": pending, "workers": self.workers}
+
+    async def close(self):
+        """Stop dispatchers and shut the thread pool down"""
+        for task in self._dispatchers:
+            task.cancel()
+        self._dispatchers = []
+        self._executor.shutdown(wait=False)
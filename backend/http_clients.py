@@ -0,0 +1,71 @@
+"""
+HTTP Clients - One pooled httpx.AsyncClient per upstream service
+
+Opening an httpx.AsyncClient per request pays a fresh TCP + TLS handshake
+every time. The registry below keeps one client per upstream ("groq",
+"youtube", "deepseek", ...) for the lifetime of the application, with
+keep-alive, a per-upstream connection limit and HTTP/2 when the optional h2
+package is installed (pip install httpx[http2]).
+
+Services call get_http_client(name) at request time; main.py closes every
+client on shutdown. Per-call timeouts are still passed on each request.
+"""
+import asyncio
+import os
+from typing import Dict, Tuple
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_DEFAULT_TIMEOUT = float(os.getenv("HTTP_DEFAULT_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# name -> (client, event loop it belongs to)
+_clients: Dict[str, Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_DEFAULT_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def get_http_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Shared client for an upstream. Must be called from a running event loop;
+    a client created on another (finished) loop is replaced, since httpx
+    connections cannot be reused across loops.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(name)
+    if entry is None or entry[1] is not loop or entry[0].is_closed:
+        _clients[name] = (_new_client(), loop)
+    return _clients[name][0]
+
+
+async def close_http_clients():
+    """Close every client that belongs to the running loop (application shutdown)"""
+    loop = asyncio.get_running_loop()
+    for name, (client, client_loop) in list(_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+        del _clients[name]
+
+
+def get_http_client_stats() -> dict:
+    """Open clients and whether HTTP/2 is in use"""
+    return {"http2": HTTP2_AVAILABLE, "clients": sorted(_clients)}
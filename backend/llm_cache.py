@@ -0,0 +1,208 @@
+"""
+LLM Cache - Persistent cache of chat-completion results
+
+Completions are stored in a SQLite file (LLM_CACHE_PATH, backend/data/ by
+default) so they survive restarts and are shared by every worker process.
+The file is created owner-only (0600) and a file owned by another user is
+refused, since its contents are served to clients as model output. The key
+is a SHA-256 fingerprint of (model, messages, temperature, max_tokens), so
+any change to the prompt or the sampling settings is a different entry.
+
+Modes (chosen per call site):
+    deterministic  one stored completion per key, reused until it expires
+                   (explanations, keyword extraction, matching)
+    pool           up to LLM_CACHE_POOL_SIZE completions per key; until the
+                   pool is full every call goes to the LLM and adds a
+                   sample, then a random sample is served - repeated
+                   identical requests still get some variety (dua generation)
+    off            no caching
+
+Entries expire after LLM_CACHE_TTL seconds; when more than LLM_CACHE_SIZE
+are stored the least recently used ones are evicted.
+
+get()/put() block on SQLite; async callers use aget()/aput(), which run
+them in the default executor.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.db"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "5000"))
+LLM_CACHE_POOL_SIZE = int(os.getenv("LLM_CACHE_POOL_SIZE", "5"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+CACHE_DETERMINISTIC = "deterministic"
+CACHE_POOL = "pool"
+CACHE_OFF = "off"
+
+
+def fingerprint(payload: dict) -> str:
+    """Cache key for a chat-completions request body"""
+    material = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def open_private_db(path: str, **connect_args) -> sqlite3.Connection:
+    """
+    Connect to a SQLite file readable and writable by this user only.
+    Creates the file (and its directory) with owner-only permissions, refuses
+    a file owned by another user and tightens the mode of an existing one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    if hasattr(os, "getuid"):
+        info = os.stat(path)
+        if info.st_uid != os.getuid():
+            raise sqlite3.DatabaseError(f"{path} is owned by another user")
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o600)
+    return sqlite3.connect(path, **{"timeout": 5.0, "check_same_thread": False, **connect_args})
+
+
+class CompletionCache:
+    """SQLite-backed completion cache with TTL, LRU size limit and sample pools"""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl: float = LLM_CACHE_TTL,
+        max_entries: int = LLM_CACHE_SIZE,
+        pool_size: int = LLM_CACHE_POOL_SIZE,
+        enabled: bool = LLM_CACHE_ENABLED,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pool_size = max(1, pool_size)
+        self.enabled = enabled
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = open_private_db(self.path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_completions ("
+                "key TEXT NOT NULL, slot INTEGER NOT NULL, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (key, slot))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_completions_last_used ON llm_completions (last_used)")
+            self._db.commit()
+        return self._db
+
+    def get(self, payload: dict, mode: str = CACHE_DETERMINISTIC) -> Optional[str]:
+        """Cached completion for this request, or None if the LLM should be called"""
+        if not self.enabled or mode == CACHE_OFF:
+            return None
+        key = fingerprint(payload)
+        now = self.clock()
+        try:
+            with self._lock:
+                db = self._connect()
+                rows = db.execute(
+                    "SELECT slot, content FROM llm_completions WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl)
+                ).fetchall()
+                needed = self.pool_size if mode == CACHE_POOL else 1
+                if len(rows) < needed:
+                    self.stats["misses"] += 1
+                    return None
+                slot, content = random.choice(rows)
+                db.execute("UPDATE llm_completions SET last_used = ? WHERE key = ? AND slot = ?", (now, key, slot))
+                db.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+        self.stats["hits"] += 1
+        return content
+
+    async def aget(self, payload: dict, mode: str = CACHE_DETERMINISTIC) -> Optional[str]:
+        """get() off the event loop"""
+        if not self.enabled or mode == CACHE_OFF:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, payload, mode)
+
+    async def aput(self, payload: dict, content: str, mode: str = CACHE_DETERMINISTIC):
+        """put() off the event loop"""
+        if not self.enabled or mode == CACHE_OFF or not content:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.put, payload, content, mode)
+
+    def put(self, payload: dict, content: str, mode: str = CACHE_DETERMINISTIC):
+        """Store a completion (as the single entry, or as a new pool sample)"""
+        if not self.enabled or mode == CACHE_OFF or not content:
+            return
+        key = fingerprint(payload)
+        now = self.clock()
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("DELETE FROM llm_completions WHERE key = ? AND created_at <= ?", (key, now - self.ttl))
+                if mode == CACHE_POOL:
+                    used = [row[0] for row in db.execute("SELECT slot FROM llm_completions WHERE key = ?", (key,))]
+                    free = [slot for slot in range(self.pool_size) if slot not in used]
+                    slot = free[0] if free else random.randrange(self.pool_size)
+                else:
+                    slot = 0
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_completions (key, slot, content, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, slot, content, now, now)
+                )
+                db.commit()
+                self.stats["stores"] += 1
+                self._writes += 1
+                # Checking the size on every write would cost a COUNT(*) each time
+                if self._writes % 50 == 0:
+                    self._evict(db, now)
+        except (sqlite3.Error, OSError) as e:
+            print(f"LLM cache write failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        removed = db.execute("DELETE FROM llm_completions WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        excess = db.execute("SELECT COUNT(*) FROM llm_completions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            removed += db.execute(
+                "DELETE FROM llm_completions WHERE rowid IN "
+                "(SELECT rowid FROM llm_completions ORDER BY last_used LIMIT ?)",
+                (excess,)
+            ).rowcount
+        db.commit()
+        self.stats["evictions"] += removed
+
+    def evict(self):
+        """Drop expired entries and trim to max_entries (normally done every 50 writes)"""
+        with self._lock:
+            self._evict(self._connect(), self.clock())
+
+    def get_stats(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            "enabled": self.enabled,
+            "path": self.path,
+        }
+
+
+llm_cache = CompletionCache()
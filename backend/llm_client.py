@@ -0,0 +1,58 @@
+"""
+LLM Client - One code path for non-streaming chat-completion calls
+
+chat_completion() applies, in order:
+    1. the persistent completion cache (llm_cache.py) - a hit returns at once
+    2. the outbound rate limiter (llm_rate_limiter.py)
+    3. the provider's circuit breaker (circuit_breaker.py)
+    4. the POST on the shared pooled client (http_clients.py)
+
+It returns the completion text, or None when the provider answered with an
+error status. Network errors, CircuitOpenError and RateLimitTimeout are
+raised, so callers keep their existing except/fallback branches.
+"""
+from typing import Optional
+
+from circuit_breaker import get_breaker
+from http_clients import get_http_client
+from llm_cache import CACHE_DETERMINISTIC, llm_cache
+from llm_rate_limiter import llm_slot
+
+
+async def chat_completion(
+    provider: str,
+    url: str,
+    api_key: str,
+    payload: dict,
+    timeout: float,
+    cache: str = CACHE_DETERMINISTIC,
+) -> Optional[str]:
+    """POST a chat-completions request body; returns choices[0].message.content"""
+    cached = await llm_cache.aget(payload, cache)
+    if cached is not None:
+        return cached
+
+    prompt_text = "".join(message.get("content", "") for message in payload.get("messages", []))
+    client = get_http_client(provider)
+    async with llm_slot(provider, prompt_text, max_tokens=payload.get("max_tokens", 1000)) as slot:
+        with get_breaker(provider).track() as call:
+            response = await client.post(
+                url,
+                timeout=timeout,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {api_key}"
+                },
+                json=payload
+            )
+            if response.status_code != 200:
+                call.fail()
+        await slot.settle(response)
+
+    if response.status_code != 200:
+        print(f"{provider} API error: {response.status_code} - {response.text[:200]}")
+        return None
+
+    content = response.json()["choices"][0]["message"]["content"]
+    await llm_cache.aput(payload, content, cache)
+    return content
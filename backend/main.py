@@ -10,10 +10,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from database import Base, engine
 from models_extended import *  # Import all models
 from routes import api_router  # New modular routes
+from migrations import run_migrations
+import asyncio
 import json
 
-# Create all database tables
+# Create all database tables, then bring existing ones up to date
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -51,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # keyset cursor of list endpoints
 )
 
 # ============= INCLUDE ROUTES =============
@@ -86,11 +90,13 @@ def read_root():
 
 @app.get("/api/health")
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (includes LLM provider circuit breaker state)"""
+    from circuit_breaker import get_breaker_states
     return {
         "status": "healthy",
         "service": "myRamadan API",
-        "version": "3.0"
+        "version": "3.0",
+        "circuit_breakers": get_breaker_states()
     }
 
 
@@ -110,6 +116,18 @@ async def startup():
         db.commit()
     db.close()
     
+    # Load the Quran search model off the event loop so requests never wait on it
+    from services_quran_search import get_quran_search
+    await asyncio.get_running_loop().run_in_executor(None, get_quran_search)
+    
+    # Start dua job workers (re-queues jobs left over from a previous run)
+    from dua_jobs import dua_job_queue
+    await dua_job_queue.start()
+    
+    # Keep the pre-generated dua pool topped up
+    from dua_pool import dua_pool
+    dua_pool.start()
+    
     print("✅ myRamadan Backend started successfully!")
     print("📚 Services available:")
     print("   - 🔐 JWT Authentication")
@@ -121,6 +139,20 @@ async def startup():
     print("   - 🎪 Events (Tunisia - 24 cities)")
     print("🔗 API Docs: http://localhost:8000/docs")
 
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background workers and close pooled HTTP connections"""
+    import services_quran_search
+    from http_clients import close_http_clients
+    from dua_jobs import dua_job_queue
+    from dua_pool import dua_pool
+    await dua_job_queue.stop()
+    await dua_pool.stop()
+    if services_quran_search._query_encoder is not None:
+        await services_quran_search._query_encoder.close()
+    await close_http_clients()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
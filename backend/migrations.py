@@ -0,0 +1,187 @@
+"""
+Migrations - Versioned schema changes for existing databases
+
+Base.metadata.create_all() creates missing tables (with their indexes) but
+never alters a table that already exists. Columns and indexes added to the
+models later are applied here instead: MIGRATIONS is an ordered list of
+(version, description, apply) steps, and the versions already applied are
+recorded in the schema_migrations table.
+
+Every step is idempotent (columns are added only when missing, indexes are
+created with CREATE INDEX IF NOT EXISTS) and skips tables that do not exist
+yet (create_all() creates those complete), so it is safe on databases that
+were created fresh from the current models, on SQLite and Postgres alike.
+main.py runs pending migrations at startup, right after create_all().
+
+Add a step by appending to MIGRATIONS; never edit one that has shipped.
+
+Several workers may start at once. Each step runs under a migration lock
+(BEGIN IMMEDIATE on SQLite, a transaction-level advisory lock on Postgres)
+and is skipped if another process recorded it while this one waited.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list migrations and whether they are applied
+"""
+import sys
+from typing import Callable, List, Sequence, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Integer, MetaData, String, Table, column, false, func, inspect, select, table, text, true
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", String(64), primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, server_default=func.now()),
+)
+
+# pg_advisory_xact_lock key shared by every process migrating this database
+MIGRATION_LOCK_KEY = 726_100_001
+
+
+def add_column(conn: Connection, table: str, column: Column):
+    """ALTER TABLE ADD COLUMN unless the table already has it"""
+    if not inspect(conn).has_table(table):
+        return
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table)}:
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Sequence[str]):
+    """CREATE INDEX IF NOT EXISTS (SQLite, Postgres 9.5+)"""
+    if not inspect(conn).has_table(table):
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+# ============= MIGRATIONS =============
+
+def _users_account_columns(conn: Connection):
+    # Formerly migrate_db.py and fix_users_table.py
+    add_column(conn, "users", Column("user_type", String, server_default="user"))
+    add_column(conn, "users", Column("updated_at", DateTime))
+    add_column(conn, "users", Column("is_active", Boolean, server_default=true()))
+    add_column(conn, "users", Column("last_login", DateTime))
+    add_column(conn, "users", Column("login_attempts", Integer, server_default="0"))
+    add_column(conn, "users", Column("locked_until", DateTime))
+
+
+def _conversation_counters(conn: Connection):
+    # Maintained by ChatService.record_message; reconcile_chat_counters.py repairs drift
+    add_column(conn, "conversations", Column("unread_for_user", Integer, server_default="0"))
+    add_column(conn, "conversations", Column("unread_for_imam", Integer, server_default="0"))
+    add_column(conn, "conversations", Column("last_message_preview", String(100)))
+    add_column(conn, "conversations", Column("last_message_at", DateTime))
+    if not (inspect(conn).has_table("conversations") and inspect(conn).has_table("messages")):
+        return
+
+    # Backfill from the existing messages (ChatService.reconcile_counters in one UPDATE)
+    conversations = table(
+        "conversations", column("id"), column("unread_for_user"), column("unread_for_imam"),
+        column("last_message_preview"), column("last_message_at"),
+    )
+    messages = table(
+        "messages", column("id"), column("conversation_id"), column("sender_type"),
+        column("message_text"), column("is_read"), column("created_at"),
+    )
+    of_conversation = messages.c.conversation_id == conversations.c.id
+
+    def unread_from(sender_type):
+        return select(func.count()).where(
+            of_conversation, messages.c.sender_type == sender_type, messages.c.is_read == false()
+        ).scalar_subquery()
+
+    latest = select(func.substr(messages.c.message_text, 1, 100)).where(of_conversation).order_by(
+        messages.c.created_at.desc(), messages.c.id.desc()
+    ).limit(1).scalar_subquery()
+    conn.execute(conversations.update().values(
+        unread_for_user=unread_from("imam"),
+        unread_for_imam=unread_from("user"),
+        last_message_preview=latest,
+        last_message_at=select(func.max(messages.c.created_at)).where(of_conversation).scalar_subquery(),
+    ))
+
+
+def _hot_path_indexes(conn: Connection):
+    # Inbox listings (ChatService.get_inbox)
+    create_index(conn, "ix_conversations_user_email_updated_at", "conversations", ["user_email", "updated_at", "id"])
+    create_index(conn, "ix_conversations_imam_id_updated_at", "conversations", ["imam_id", "updated_at", "id"])
+    create_index(conn, "ix_conversations_updated_at_id", "conversations", ["updated_at", "id"])
+    # Conversation history pages, and unread counts / mark_read per sender
+    create_index(conn, "ix_messages_conversation_id_created_at_id", "messages", ["conversation_id", "created_at", "id"])
+    create_index(conn, "ix_messages_conversation_id_sender_type_is_read", "messages", ["conversation_id", "sender_type", "is_read"])
+    # Event listings, by date and filtered by city / city and category; admin listing
+    create_index(conn, "ix_events_event_date_id", "events", ["event_date", "id"])
+    create_index(conn, "ix_events_city_event_date_id", "events", ["city", "event_date", "id"])
+    create_index(conn, "ix_events_city_category_event_date_id", "events", ["city", "category", "event_date", "id"])
+    create_index(conn, "ix_events_created_at_id", "events", ["created_at", "id"])
+    # Dua history and admin user listing
+    create_index(conn, "ix_dua_history_email_created_at_id", "dua_history", ["email", "created_at", "id"])
+    create_index(conn, "ix_users_created_at_id", "users", ["created_at", "id"])
+
+
+MIGRATIONS: List[Tuple[str, str, Callable[[Connection], None]]] = [
+    ("0001_users_account_columns", "users: role, activation and lockout columns", _users_account_columns),
+    ("0002_conversation_counters", "conversations: unread counters and last-message snapshot", _conversation_counters),
+    ("0003_hot_path_indexes", "composite indexes for inbox, message, event and history listings", _hot_path_indexes),
+]
+
+
+# ============= RUNNER =============
+
+def applied_versions(engine: Engine) -> set:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(schema_migrations.select())}
+
+
+def lock_migrations(conn: Connection):
+    """Hold the migration lock until this transaction ends"""
+    if conn.dialect.name == "sqlite":
+        # Write-lock the database now rather than on the first write
+        if not conn.connection.dbapi_connection.in_transaction:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def run_migrations(engine: Engine, migrations=MIGRATIONS) -> List[str]:
+    """Apply pending migrations in order, each in its own transaction; returns the versions applied"""
+    done = applied_versions(engine)
+    applied = []
+    for version, description, apply in migrations:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                lock_migrations(conn)
+                if conn.execute(schema_migrations.select().where(schema_migrations.c.version == version)).first():
+                    continue  # another process applied it while we waited for the lock
+                apply(conn)
+                conn.execute(schema_migrations.insert().values(version=version, description=description))
+        except IntegrityError:
+            continue  # another process applied it at the same time
+        applied.append(version)
+        print(f"Applied migration {version}: {description}")
+    return applied
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+    import models_extended  # noqa: F401 - registers the models on Base
+
+    Base.metadata.create_all(bind=engine)
+    if "--status" in sys.argv:
+        done = applied_versions(engine)
+        for version, description, _ in MIGRATIONS:
+            print(f"{'✓' if version in done else ' '} {version}  {description}")
+    else:
+        applied = run_migrations(engine)
+        print(f"✅ Database is up to date ({len(applied)} migrations applied)")
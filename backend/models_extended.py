@@ -1,5 +1,5 @@
 from database import Base
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy.sql import func
@@ -7,6 +7,10 @@ from sqlalchemy.sql import func
 # ============= USER MODELS =============
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Admin user listing: keyset pages on (created_at, id)
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
@@ -64,6 +68,10 @@ class EmailVerificationToken(Base):
 # ============= DUA MODELS =============
 class DuaHistory(Base):
     __tablename__ = "dua_history"
+    __table_args__ = (
+        # History listing: keyset pages per email on (created_at, id)
+        Index("ix_dua_history_email_created_at_id", "email", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -80,6 +88,38 @@ class DuaHistory(Base):
     
     user = relationship("User", back_populates="duas")
 
+
+# ============= DUA JOBS (asynchronous generation) =============
+class DuaJob(Base):
+    __tablename__ = "dua_jobs"
+    
+    id = Column(String(36), primary_key=True)  # uuid4 hex, returned to the client
+    status = Column(String, default="pending", index=True)  # "pending", "running", "succeeded", "failed"
+    email = Column(String, index=True)
+    category = Column(String)
+    context = Column(Text)
+    callback_url = Column(String, nullable=True)  # POSTed the job once it finishes
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    history_id = Column(Integer, ForeignKey("dua_history.id"), nullable=True)
+    attempts = Column(Integer, default=0)
+    callback_status = Column(String, nullable=True)  # "delivered" or "failed"
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class PooledDua(Base):
+    __tablename__ = "dua_pool"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String, index=True)  # one of DuaService.DUA_CATEGORIES
+    style = Column(String)  # one of DuaService.DUA_STYLES
+    dua_text_en = Column(Text)
+    dua_text_ar = Column(Text)
+    how_to_use_en = Column(Text)
+    how_to_use_ar = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+
 # ============= CHAT MODELS =============
 class Imam(Base):
     __tablename__ = "imams"
@@ -98,6 +138,12 @@ class Imam(Base):
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Inbox listings: one range scan per user / imam, newest first, keyset pages on (updated_at, id)
+        Index("ix_conversations_user_email_updated_at", "user_email", "updated_at", "id"),
+        Index("ix_conversations_imam_id_updated_at", "imam_id", "updated_at", "id"),
+        Index("ix_conversations_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -107,12 +153,24 @@ class Conversation(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
+    # Maintained by ChatService.record_message / mark_read; repaired by reconcile_chat_counters.py
+    unread_for_user = Column(Integer, default=0, server_default="0")  # unread messages from the imam
+    unread_for_imam = Column(Integer, default=0, server_default="0")  # unread messages from the user
+    last_message_preview = Column(String(100), nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    
     user = relationship("User", back_populates="conversations")
     imam = relationship("Imam", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Conversation history: keyset pages per conversation on (created_at, id)
+        Index("ix_messages_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+        # Unread counts and mark_read: the other side's (unread) messages in one conversation
+        Index("ix_messages_conversation_id_sender_type_is_read", "conversation_id", "sender_type", "is_read"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -139,6 +197,24 @@ class Video(Base):
     thumbnail_url = Column(String, nullable=True)
     created_at = Column(DateTime, server_default=func.now())
 
+class CachedVideoSearch(Base):
+    __tablename__ = "youtube_search_cache"
+    __table_args__ = (UniqueConstraint("namespace", "query_key", "max_results"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    namespace = Column(String)  # which search produced the results (result shapes differ)
+    query_key = Column(String)  # normalized query text
+    max_results = Column(Integer)
+    results = Column(JSON)
+    fetched_at = Column(Float)  # unix time of the YouTube API call
+
+class YouTubeQuotaUsage(Base):
+    __tablename__ = "youtube_quota"
+    
+    day = Column(String, primary_key=True)  # quota day (Pacific time), YYYY-MM-DD
+    units = Column(Integer, default=0)
+    calls = Column(Integer, default=0)
+
 # ============= AI ANALYZER MODELS =============
 class AIAnalysis(Base):
     __tablename__ = "ai_analyses"
@@ -165,6 +241,14 @@ class UserHistory(Base):
 # ============= EVENTS MODELS (Tunisia) =============
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Event listings: keyset pages on (event_date, id), optionally per city
+        # or city and category; the admin listing pages on (created_at, id)
+        Index("ix_events_event_date_id", "event_date", "id"),
+        Index("ix_events_city_event_date_id", "city", "event_date", "id"),
+        Index("ix_events_city_category_event_date_id", "city", "category", "event_date", "id"),
+        Index("ix_events_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -0,0 +1,164 @@
+"""
+Pagination - Keyset (cursor) pagination for list endpoints
+
+OFFSET pagination re-reads every skipped row and shifts when rows are
+inserted between requests. List endpoints instead order on a unique key,
+e.g. (created_at, id) or (event_date, id), newest first, and the next page
+starts strictly after the last row seen:
+
+    WHERE (created_at, id) < (:last_created_at, :last_id)
+    ORDER BY created_at DESC, id DESC LIMIT :limit + 1
+
+With a composite index on the key (after any equality filter columns) each
+page is one index range scan, however deep. The last row's key is handed to
+clients as an opaque cursor (base64url JSON): next_cursor in dict responses,
+the X-Next-Cursor header on endpoints that return a bare list. There is none
+on the last page.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, literal, or_, tuple_
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "100"))
+
+# Response header carrying the cursor on endpoints that return a bare list
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursorError(ValueError):
+    """Raised for cursors that were not produced by encode_cursor (routes answer 400)"""
+
+
+def page_size(limit: Optional[int] = None) -> int:
+    """limit clamped to 1..PAGE_SIZE_MAX (PAGE_SIZE_DEFAULT when not given)"""
+    if limit is None:
+        return PAGE_SIZE_DEFAULT
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque cursor for a row's key values"""
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            encoded.append({"dt": value.isoformat()})
+        elif isinstance(value, date):
+            encoded.append({"d": value.isoformat()})
+        else:
+            encoded.append(value)
+    raw = json.dumps(encoded, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _matches_column(value: Any, column) -> bool:
+    """Whether a decoded cursor value has the Python type column binds"""
+    try:
+        expected = column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return True
+    if expected is datetime:
+        return isinstance(value, datetime)
+    if expected is date:
+        return isinstance(value, date) and not isinstance(value, datetime)
+    if isinstance(value, bool) or expected is bool:
+        return isinstance(value, bool) and expected is bool
+    if expected is int:
+        return isinstance(value, int)
+    if expected in (float, Decimal):
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """
+    Key values from a cursor for the keyset columns. Anything encode_cursor
+    could not have produced for them (wrong arity, unparsable dates, a value
+    of the wrong type for its column) raises InvalidCursorError.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        encoded = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    if not isinstance(encoded, list) or len(encoded) != len(columns):
+        raise InvalidCursorError("Malformed cursor")
+
+    values = []
+    try:
+        for value, column in zip(encoded, columns):
+            if isinstance(value, dict) and set(value) == {"dt"}:
+                value = datetime.fromisoformat(value["dt"])
+            elif isinstance(value, dict) and set(value) == {"d"}:
+                value = date.fromisoformat(value["d"])
+            if value is None or isinstance(value, (dict, list)) or not _matches_column(value, column):
+                raise InvalidCursorError("Malformed cursor")
+            values.append(value)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    return values
+
+
+def _stored_forms(query, column, value) -> list:
+    """Bind parameters for value as the column may store it, smallest first"""
+    bound = literal(value, type_=column.type)
+    if query.session.get_bind().dialect.name == "sqlite" and isinstance(value, datetime) and not value.microsecond:
+        # SQLite keeps DATETIME as text: rows stamped by server_default=func.now()
+        # hold "YYYY-MM-DD HH:MM:SS", rows written by SQLAlchemy the same instant
+        # with a ".000000" suffix (which sorts after it)
+        return [literal(value.strftime("%Y-%m-%d %H:%M:%S")), bound]
+    return [bound]
+
+
+def _after(query, columns: Sequence, values: Sequence[Any]):
+    """Condition for the rows after values in descending order of columns"""
+    forms = [_stored_forms(query, column, value) for column, value in zip(columns, values)]
+    if all(len(column_forms) == 1 for column_forms in forms):
+        return tuple_(*columns) < tuple_(*[column_forms[0] for column_forms in forms])
+
+    # Spelled out, so that each textual form of an instant counts as equal
+    condition = columns[-1] < forms[-1][0]
+    for column, column_forms in zip(reversed(columns[:-1]), reversed(forms[:-1])):
+        condition = or_(column < column_forms[0], and_(column.in_(column_forms), condition))
+    return condition
+
+
+def paginate(
+    query,
+    columns: Sequence,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    key: Optional[Callable[[Any], Sequence[Any]]] = None,
+    offset: int = 0,
+) -> Tuple[list, Optional[str]]:
+    """
+    One page of query, ordered on columns descending (newest first); returns
+    (rows, next_cursor).
+
+    columns is the keyset, most significant first, ending with a unique
+    column (usually id); none may be NULL. query must not be ordered yet.
+    key(row) gives a row's values for columns; by default they are read as
+    attributes of the row, which suits queries for a single model. offset
+    keeps old skip-based callers working; it only applies without a cursor.
+    """
+    limit = page_size(limit)
+    if cursor:
+        query = query.filter(_after(query, columns, decode_cursor(cursor, columns)))
+
+    query = query.order_by(*[column.desc() for column in columns])
+    if offset and not cursor:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    values = key(last) if key else [getattr(last, column.key) for column in columns]
+    return rows, encode_cursor(values)
@@ -0,0 +1,187 @@
+"""
+Query Cache - Bounded LRU + TTL cache for Quran search queries
+
+Keys are normalized query text (lower-case, punctuation and extra whitespace
+removed), so "I am struggling with money!" and "i am struggling  with money"
+share one entry. An entry holds the query embedding and the result lists per
+top_k, so a hot query skips both the encoder and the index.
+
+With QUERY_CACHE_PATH set, entries are also written to a small SQLite file and
+reloaded at startup. Persisted rows carry a namespace (index mode + corpus
+checksum), so results computed against a different index are never served.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", str(24 * 3600)))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query"""
+    return " ".join(_PUNCTUATION_RE.sub(" ", query.lower()).split())
+
+
+class CacheEntry:
+    """Embedding and per-top_k results for one normalized query"""
+
+    __slots__ = ("embedding", "results", "expires_at")
+
+    def __init__(self, embedding=None, results: Dict[int, List[Dict]] = None, expires_at: float = 0.0):
+        self.embedding = embedding
+        self.results = results or {}
+        self.expires_at = expires_at
+
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL and optional SQLite persistence"""
+
+    def __init__(
+        self,
+        max_size: int = QUERY_CACHE_SIZE,
+        ttl: float = QUERY_CACHE_TTL,
+        persist_path: str = QUERY_CACHE_PATH,
+        namespace: str = "default",
+    ):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self.namespace = namespace
+        self.persist_path = persist_path or None
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.stats = {"hits": 0, "misses": 0, "embedding_hits": 0, "evictions": 0, "expired": 0}
+
+        if self.persist_path:
+            self._open_db()
+
+    def get(self, query: str) -> Optional[CacheEntry]:
+        """Return the live entry for query (refreshing its LRU position) or None"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def count_embedding_hit(self):
+        """Record that a cached embedding saved an encoder call"""
+        with self._lock:
+            self.stats["embedding_hits"] += 1
+
+    def put(self, query: str, top_k: int = None, results: List[Dict] = None, embedding=None):
+        """Store an embedding and/or a top_k result list for query"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.time():
+                entry = CacheEntry(expires_at=time.time() + self.ttl)
+                self._entries[key] = entry
+            if embedding is not None:
+                entry.embedding = embedding
+            if results is not None and top_k is not None:
+                entry.results[top_k] = results
+            self._entries.move_to_end(key)
+
+            evicted = []
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self.stats["evictions"] += 1
+
+            if self._db is not None:
+                self._persist(key, entry, evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_cache WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        """Counters plus size and hit rate"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    # ---- SQLite persistence ----
+
+    def _open_db(self):
+        try:
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    embedding TEXT,
+                    results TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            now = time.time()
+            self._db.execute("DELETE FROM query_cache WHERE expires_at <= ?", (now,))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, embedding, results, expires_at FROM query_cache "
+                "WHERE namespace = ? ORDER BY expires_at DESC LIMIT ?",
+                (self.namespace, self.max_size),
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Query cache persistence disabled ({self.persist_path}): {e}")
+            self._db = None
+            return
+
+        # Oldest first so the freshest rows end up most recently used
+        for key, embedding, results, expires_at in reversed(rows):
+            self._entries[key] = CacheEntry(
+                embedding=json.loads(embedding) if embedding else None,
+                results={int(k): v for k, v in json.loads(results).items()},
+                expires_at=expires_at,
+            )
+        if rows:
+            print(f"Loaded {len(rows)} cached Quran queries from {self.persist_path}")
+
+    def _persist(self, key: str, entry: CacheEntry, evicted: List[str]):
+        embedding = entry.embedding
+        if embedding is not None and hasattr(embedding, "tolist"):
+            embedding = embedding.tolist()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_cache (namespace, key, embedding, results, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(embedding) if embedding is not None else None,
+                 json.dumps(entry.results, ensure_ascii=False), entry.expires_at),
+            )
+            if evicted:
+                self._db.executemany(
+                    "DELETE FROM query_cache WHERE namespace = ? AND key = ?",
+                    [(self.namespace, k) for k in evicted],
+                )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Query cache write failed: {e}")
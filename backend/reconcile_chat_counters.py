@@ -0,0 +1,28 @@
+"""
+Recompute the conversations' unread counters and last-message snapshot
+
+Conversation.unread_for_user / unread_for_imam / last_message_preview /
+last_message_at are maintained by the message endpoints. This command
+recomputes them from the messages table (one windowed query, see
+ChatService.get_conversation_summaries) to repair drift, e.g. after messages
+were edited by hand or written by an older version. Pending migrations
+(which add these columns to older databases) are applied first.
+
+Usage:
+    python reconcile_chat_counters.py
+"""
+from database import Base, SessionLocal, engine
+from migrations import run_migrations
+from services_chat import ChatService
+import models_extended  # noqa: F401 - registers the models on Base
+
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        repaired = ChatService.reconcile_counters(db)
+    finally:
+        db.close()
+    print(f"✅ Reconciled chat counters: {repaired} conversations repaired")
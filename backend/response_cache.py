@@ -0,0 +1,134 @@
+"""
+Semantic Response Cache - Reuse analyzer answers for paraphrased questions
+
+AIAnalyzerService.analyze spends most of its time (and Groq budget) on the
+explanation call. Questions arrive as paraphrases of the same few topics, so
+the full response is cached together with the question embedding. A new
+question whose embedding has cosine similarity >= ANALYZER_CACHE_THRESHOLD
+with a cached one reuses that answer. Identical questions (after
+normalization) match even when no embedding is available.
+
+Entries expire after ANALYZER_CACHE_TTL seconds, and the least recently used
+entry is evicted beyond ANALYZER_CACHE_SIZE.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from query_cache import normalize_query
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ANALYZER_CACHE_THRESHOLD = float(os.getenv("ANALYZER_CACHE_THRESHOLD", "0.92"))
+ANALYZER_CACHE_TTL = float(os.getenv("ANALYZER_CACHE_TTL", str(6 * 3600)))
+ANALYZER_CACHE_SIZE = int(os.getenv("ANALYZER_CACHE_SIZE", "1000"))
+
+
+class SemanticResponseCache:
+    """LRU + TTL cache of responses, matched by exact key or embedding similarity"""
+
+    def __init__(
+        self,
+        threshold: float = ANALYZER_CACHE_THRESHOLD,
+        ttl: float = ANALYZER_CACHE_TTL,
+        max_size: int = ANALYZER_CACHE_SIZE,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        # key -> (unit embedding or None, response, expires_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Stacked embeddings of all entries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys = []
+
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "bypassed": 0}
+
+    @staticmethod
+    def _unit(embedding):
+        if embedding is None or np is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question: str, embedding=None) -> Optional[dict]:
+        """Return a copy of the cached response for question (or a close paraphrase), else None"""
+        key = normalize_query(question)
+        now = time.time()
+        with self._lock:
+            self._drop_expired(now)
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return copy.deepcopy(self._entries[key][1])
+
+            query = self._unit(embedding)
+            if query is not None:
+                self._ensure_matrix()
+                if self._matrix is not None:
+                    similarities = self._matrix @ query
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        match = self._matrix_keys[best]
+                        self._entries.move_to_end(match)
+                        self.stats["semantic_hits"] += 1
+                        return copy.deepcopy(self._entries[match][1])
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, question: str, response: dict, embedding=None):
+        """Cache response for question"""
+        key = normalize_query(question)
+        with self._lock:
+            self._entries[key] = (self._unit(embedding), copy.deepcopy(response), time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _drop_expired(self, now: float):
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self.stats["expired"] += len(expired)
+            self._matrix = None
+
+    def _ensure_matrix(self):
+        if self._matrix is not None:
+            return
+        keys = [key for key, (vector, _, _) in self._entries.items() if vector is not None]
+        self._matrix_keys = keys
+        self._matrix = np.vstack([self._entries[key][0] for key in keys]) if keys else None
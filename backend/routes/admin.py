@@ -9,6 +9,7 @@ from datetime import datetime
 
 from database import SessionLocal
 from models_extended import User, Event, Imam, Conversation, Message, DuaHistory
+from pagination import paginate, InvalidCursorError, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from .auth import get_current_admin, get_password_hash
 
 router = APIRouter()
@@ -22,26 +23,39 @@ def get_db():
         db.close()
 
 
+def _page(query, columns, cursor: Optional[str], skip: int, limit: int):
+    """
+    Keyset page of an admin listing, newest first. skip is the deprecated
+    offset pagination, honoured only when no cursor is given.
+    """
+    try:
+        return paginate(query, columns, cursor=cursor, limit=limit, offset=skip)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # ============= USER MANAGEMENT =============
 
 @router.get("/users")
 async def list_users(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     user_type: Optional[str] = None,
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
-    """List all users (Admin only)"""
+    """List all users, newest first (Admin only). Pass next_cursor back as `cursor` for the next page."""
     query = db.query(User)
     if user_type:
         query = query.filter(User.user_type == user_type)
     
     total = query.count()
-    users = query.offset(skip).limit(limit).all()
+    users, next_cursor = _page(query, (User.created_at, User.id), cursor, skip, limit)
     
     return {
         "total": total,
+        "next_cursor": next_cursor,
         "users": [
             {
                 "id": u.id,
@@ -298,22 +312,24 @@ async def delete_imam(
 
 @router.get("/events")
 async def list_all_events(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     verified_only: bool = False,
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
-    """List all events including unverified (Admin only)"""
+    """List all events including unverified, newest first (Admin only). Pass next_cursor back as `cursor` for the next page."""
     query = db.query(Event)
     if verified_only:
         query = query.filter(Event.is_verified == True)
     
     total = query.count()
-    events = query.order_by(Event.created_at.desc()).offset(skip).limit(limit).all()
+    events, next_cursor = _page(query, (Event.created_at, Event.id), cursor, skip, limit)
     
     return {
         "total": total,
+        "next_cursor": next_cursor,
         "events": [
             {
                 "id": e.id,
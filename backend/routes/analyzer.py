@@ -21,7 +21,7 @@ async def analyze_text(
 ):
     """Analyze text using AI (requires authentication)"""
     try:
-        result = await analyzer_service.analyze(request.question)
+        result = await analyzer_service.analyze(request.question, bypass_cache=request.bypass_cache)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -39,3 +39,21 @@ async def semantic_search(
         return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search-stats")
+async def search_stats(current_user: User = Depends(get_current_user)):
+    """Quran search cache, analyzer response cache, LLM cache, single-flight and encoder pool counters (requires authentication)"""
+    import services_quran_search
+    from llm_cache import llm_cache
+    from single_flight import get_single_flight_stats
+    search = services_quran_search.get_quran_search()
+    encoder = services_quran_search._query_encoder
+    return {
+        "semantic_enabled": search.semantic_enabled,
+        "query_cache": search.cache.get_stats(),
+        "response_cache": analyzer_service.response_cache.get_stats(),
+        "llm_cache": llm_cache.get_stats(),
+        "single_flight": get_single_flight_stats(),
+        "encoder": encoder.get_stats() if encoder is not None else None
+    }
@@ -1,13 +1,14 @@
 """
 Chat with Imam Routes - Protected endpoints requiring authentication
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from database import SessionLocal
 from models_extended import Imam, Conversation, Message, User
+from services_chat import ChatService
+from pagination import paginate, InvalidCursorError, NEXT_CURSOR_HEADER, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from schemas.chat import (
     ImamResponse, ConversationCreateRequest, MessageSendRequest, MessageResponse
 )
@@ -97,47 +98,48 @@ async def create_conversation(
 @router.get("/conversations/{user_email}")
 async def get_user_conversations(
     user_email: str, 
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get conversations for a user by email (requires authentication, users can only access their own)"""
+    """
+    Get conversations for a user by email (requires authentication, users can only access their own).
+    One page, most recently updated first; the next page's cursor is in the X-Next-Cursor header.
+    """
     # Users can only access their own conversations, admins/imams can access any
     if current_user.user_type not in ["admin", "imam"] and current_user.email != user_email:
         raise HTTPException(status_code=403, detail="Access denied. You can only view your own conversations.")
     
-    conversations = db.query(Conversation).filter(
-        Conversation.user_email == user_email
-    ).order_by(Conversation.updated_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        imam = db.query(Imam).filter(Imam.id == conv.imam_id).first()
-        # Get unread count
-        unread_count = db.query(Message).filter(
-            Message.conversation_id == conv.id,
-            Message.sender_type == "imam",
-            Message.is_read == False
-        ).count()
-        result.append({
+    inbox = _inbox_page(db, response, cursor, limit, user_email=user_email)
+    return [
+        {
             "id": conv.id,
             "imam_id": conv.imam_id,
-            "imam_name": imam.name if imam else "Unknown",
+            "imam_name": imam_name or "Unknown",
             "topic": conv.topic,
-            "unread_count": unread_count,
+            "unread_count": conv.unread_for_user or 0,
             "created_at": str(conv.created_at),
             "updated_at": str(conv.updated_at)
-        })
-    
-    return result
+        }
+        for conv, imam_name in inbox
+    ]
 
 
 @router.get("/imam-conversations/{imam_email}")
 async def get_imam_conversations(
     imam_email: str, 
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get conversations for a specific imam by email (requires imam or admin)"""
+    """
+    Get conversations for a specific imam by email (requires imam or admin).
+    One page, most recently updated first; the next page's cursor is in the X-Next-Cursor header.
+    """
     # Only imams can access their own conversations, admins can access any
     if current_user.user_type == "imam" and current_user.email != imam_email:
         raise HTTPException(status_code=403, detail="Access denied. You can only view your own conversations.")
@@ -148,76 +150,53 @@ async def get_imam_conversations(
     if not imam:
         return []
     
-    conversations = db.query(Conversation).filter(
-        Conversation.imam_id == imam.id
-    ).order_by(Conversation.updated_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        last_message = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Count unread messages from users
-        unread_count = db.query(Message).filter(
-            Message.conversation_id == conv.id,
-            Message.sender_type == "user",
-            Message.is_read == False
-        ).count()
-        
-        result.append({
-            "id": conv.id,
-            "user_email": conv.user_email,
-            "imam_id": conv.imam_id,
-            "imam_name": imam.name,
-            "topic": conv.topic,
-            "last_message": last_message.message_text[:50] if last_message else None,
-            "unread_count": unread_count,
-            "created_at": str(conv.created_at),
-            "updated_at": str(conv.updated_at)
-        })
-    
-    return result
+    inbox = _inbox_page(db, response, cursor, limit, imam_id=imam.id)
+    return [_conversation_for_imam(conv, imam_name) for conv, imam_name in inbox]
 
 
 @router.get("/all-conversations")
 async def get_all_conversations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all conversations (requires imam or admin role)"""
+    """
+    Get all conversations (requires imam or admin role).
+    One page, most recently updated first; the next page's cursor is in the X-Next-Cursor header.
+    """
     if current_user.user_type not in ["admin", "imam"]:
         raise HTTPException(status_code=403, detail="Access denied. Imam or admin role required.")
     
-    conversations = db.query(Conversation).order_by(Conversation.updated_at.desc()).all()
-    
-    result = []
-    for conv in conversations:
-        imam = db.query(Imam).filter(Imam.id == conv.imam_id).first()
-        last_message = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Count unread messages from users
-        unread_count = db.query(Message).filter(
-            Message.conversation_id == conv.id,
-            Message.sender_type == "user",
-            Message.is_read == False
-        ).count()
-        
-        result.append({
-            "id": conv.id,
-            "user_email": conv.user_email,
-            "imam_id": conv.imam_id,
-            "imam_name": imam.name if imam else "Unknown",
-            "topic": conv.topic,
-            "last_message": last_message.message_text[:50] if last_message else None,
-            "unread_count": unread_count,
-            "created_at": str(conv.created_at),
-            "updated_at": str(conv.updated_at)
-        })
-    
-    return result
+    inbox = _inbox_page(db, response, cursor, limit)
+    return [_conversation_for_imam(conv, imam_name) for conv, imam_name in inbox]
+
+
+def _inbox_page(db: Session, response: Response, cursor: Optional[str], limit: int, **filters) -> list:
+    """One ChatService.get_inbox() page; the next page's cursor goes in the X-Next-Cursor header"""
+    try:
+        inbox, next_cursor = ChatService.get_inbox(db, cursor=cursor, limit=limit, **filters)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return inbox
+
+
+def _conversation_for_imam(conv: Conversation, imam_name: str) -> dict:
+    """Conversation list item for imams/admins: unread counts messages from the user"""
+    return {
+        "id": conv.id,
+        "user_email": conv.user_email,
+        "imam_id": conv.imam_id,
+        "imam_name": imam_name or "Unknown",
+        "topic": conv.topic,
+        "last_message": conv.last_message_preview[:50] if conv.last_message_preview is not None else None,
+        "unread_count": conv.unread_for_imam or 0,
+        "created_at": str(conv.created_at),
+        "updated_at": str(conv.updated_at)
+    }
 
 
 @router.post("/messages")
@@ -252,8 +231,8 @@ async def send_message(
     )
     db.add(message)
     
-    # Update conversation timestamp
-    conversation.updated_at = datetime.utcnow()
+    # Update conversation timestamp, unread counter and last-message snapshot
+    ChatService.record_message(db, message)
     
     db.commit()
     db.refresh(message)
@@ -270,10 +249,16 @@ async def send_message(
 @router.get("/messages/{conversation_id}")
 async def get_messages(
     conversation_id: int, 
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get messages in a conversation (requires authentication)"""
+    """
+    Get messages in a conversation (requires authentication).
+    Returns the latest `limit` messages in chronological order; pass next_cursor
+    back as `cursor` for the page of older messages (None once there are none).
+    """
     conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -286,9 +271,15 @@ async def get_messages(
     if not is_participant:
         raise HTTPException(status_code=403, detail="Access denied. Not a participant in this conversation.")
     
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at).all()
+    try:
+        messages, next_cursor = paginate(
+            db.query(Message).filter(Message.conversation_id == conversation_id),
+            (Message.created_at, Message.id),
+            cursor=cursor,
+            limit=limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "messages": [
@@ -300,8 +291,9 @@ async def get_messages(
                 "is_read": m.is_read,
                 "created_at": str(m.created_at)
             }
-            for m in messages
-        ]
+            for m in reversed(messages)
+        ],
+        "next_cursor": next_cursor
     }
 
 
@@ -326,10 +318,6 @@ async def mark_messages_read(
         raise HTTPException(status_code=403, detail="Access denied. Not a participant in this conversation.")
     
     # Mark messages from the other party as read
-    other_type = "imam" if reader_type == "user" else "user"
-    db.query(Message).filter(
-        Message.conversation_id == conversation_id,
-        Message.sender_type == other_type
-    ).update({"is_read": True})
+    ChatService.mark_read(db, conversation_id, reader_type)
     db.commit()
     return {"success": True}
@@ -1,14 +1,21 @@
 """
 Dua Generator Routes - Protected endpoints requiring authentication
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Optional
+import json
 
 from database import SessionLocal
 from models_extended import DuaHistory, User
-from schemas.dua import DuaGenerateRequest, DuaHistoryResponse
+from schemas.dua import DuaGenerateRequest, DuaJobRequest, DuaHistoryResponse
 from services_dua import DuaService
+from callback_urls import UnsafeCallbackURLError
+from dua_jobs import dua_job_queue, job_to_dict, JobQueueFullError
+from dua_pool import dua_pool
+from pagination import paginate, InvalidCursorError, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from .auth import get_current_user, get_current_user_optional
 
 router = APIRouter()
@@ -34,9 +41,18 @@ async def generate_dua(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Generate a personalized dua (requires authentication)"""
+    """
+    Generate a personalized dua (requires authentication).
+    
+    Requests with little or no context are answered from the pre-generated
+    dua pool when it has a dua for the category.
+    """
     try:
-        result = await DuaService.generate_dua(request.category, request.context)
+        result = None
+        if dua_pool.eligible(request.category, request.context):
+            result = dua_pool.take(request.category, request.context)
+        if result is None:
+            result = await DuaService.generate_dua(request.category, request.context)
         
         # Save to history using authenticated user's email
         user_email = request.email or current_user.email
@@ -57,20 +73,108 @@ async def generate_dua(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/pool")
+async def get_dua_pool_stats(current_user: User = Depends(get_current_user)):
+    """Pooled duas per category and style, plus pool counters (requires authentication)"""
+    return dua_pool.get_stats()
+
+
+@router.post("/generate/stream")
+async def generate_dua_stream(
+    request: DuaGenerateRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generate a personalized dua as server-sent events (requires authentication).
+    
+    Events: start, delta ({"field", "text"}) as the English and Arabic text
+    arrive, optionally error, then complete with the final dua and its
+    history_id. The history row is written once the stream completes.
+    """
+    # Only admins may write into another user's history
+    user_email = request.email if request.email and current_user.user_type == "admin" else current_user.email
+    
+    async def event_stream():
+        async for event, data in DuaService.stream_dua(request.category, request.context):
+            if event == "complete":
+                # The request's DB session may already be gone; use a fresh one
+                db = SessionLocal()
+                try:
+                    record = DuaService.save_dua_to_history(db, user_email, data)
+                    data = {**data, "history_id": record.id}
+                except Exception as e:
+                    print(f"Error saving streamed dua: {e}")
+                finally:
+                    db.close()
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def submit_dua_job(
+    request: DuaJobRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Queue a dua for generation and return its job id immediately (requires authentication).
+    
+    Poll GET /jobs/{job_id} for the result, or pass callback_url to receive
+    the finished job as a POST.
+    """
+    # Only admins may file a job under another user's email
+    user_email = request.email if request.email and current_user.user_type == "admin" else current_user.email
+    try:
+        return await dua_job_queue.submit(user_email, request.category, request.context, request.callback_url)
+    except UnsafeCallbackURLError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+async def get_dua_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the status (and result once finished) of a dua job"""
+    job = dua_job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if current_user.user_type != "admin" and current_user.email != job.email:
+        raise HTTPException(status_code=403, detail="Access denied. You can only view your own jobs.")
+    return job_to_dict(job)
+
+
 @router.get("/history/{email}")
 async def get_dua_history(
     email: str, 
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get dua history for a user (requires authentication, users can only access their own history)"""
+    """
+    Get dua history for a user (requires authentication, users can only access their own history).
+    Newest first, one page at a time: pass next_cursor back as `cursor`.
+    """
     # Users can only access their own history, admins can access any
     if current_user.user_type != "admin" and current_user.email != email:
         raise HTTPException(status_code=403, detail="Access denied. You can only view your own history.")
     
-    history = db.query(DuaHistory).filter(
-        DuaHistory.email == email
-    ).order_by(DuaHistory.created_at.desc()).limit(50).all()
+    try:
+        history, next_cursor = paginate(
+            db.query(DuaHistory).filter(DuaHistory.email == email),
+            (DuaHistory.created_at, DuaHistory.id),
+            cursor=cursor,
+            limit=limit
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "history": [
@@ -83,7 +187,8 @@ async def get_dua_history(
                 "created_at": str(h.created_at)
             }
             for h in history
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 
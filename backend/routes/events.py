@@ -1,13 +1,14 @@
 """
 Events Routes (Tunisia Local Events) - Protected endpoints requiring authentication
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 from typing import List, Optional
 
 from database import SessionLocal
 from models_extended import Event, User
+from pagination import paginate, InvalidCursorError, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
 from schemas.events import EventCreateRequest, EventResponse, TUNISIA_CITIES, EVENT_CATEGORIES
 from .auth import get_current_user, get_current_user_optional
 
@@ -100,9 +101,11 @@ async def create_event(
 async def get_events(
     city: Optional[str] = None,
     category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
     db: Session = Depends(get_db)
 ):
-    """Get events with optional filters"""
+    """Get events with optional filters, one page at a time (pass next_cursor back as `cursor`)"""
     query = db.query(Event)
     
     if city:
@@ -111,7 +114,10 @@ async def get_events(
         query = query.filter(Event.category == category)
     
     # Show all events, ordered by date (newest first)
-    events = query.order_by(Event.event_date.desc()).all()
+    try:
+        events, next_cursor = paginate(query, (Event.event_date, Event.id), cursor=cursor, limit=limit)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "events": [
@@ -131,7 +137,8 @@ async def get_events(
                 "is_featured": getattr(e, 'is_featured', False)
             }
             for e in events
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 
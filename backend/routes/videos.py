@@ -2,9 +2,15 @@
 Videos Routes (YouTube Search) - Protected endpoints requiring authentication
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import json
 import os
-import httpx
+from http_clients import get_http_client
+from query_cache import normalize_query
+from single_flight import single_flight
+from youtube_cache import QuotaExhaustedError, youtube_search_cache
+from services_youtube_ai import YouTubeAIService
 
 from schemas.videos import VideoSearchRequest, VideoResponse
 from .auth import get_current_user
@@ -31,33 +37,11 @@ async def search_videos(
             query = f"Islamic {query}"
         
         if YOUTUBE_API_KEY:
-            # Use YouTube Data API
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://www.googleapis.com/youtube/v3/search",
-                    params={
-                        "part": "snippet",
-                        "q": query,
-                        "type": "video",
-                        "maxResults": max_results,
-                        "key": YOUTUBE_API_KEY,
-                        "safeSearch": "strict"
-                    }
-                )
-                data = response.json()
-                
-                videos = []
-                for item in data.get("items", []):
-                    videos.append({
-                        "video_id": item["id"]["videoId"],
-                        "title": item["snippet"]["title"],
-                        "description": item["snippet"]["description"],
-                        "thumbnail": item["snippet"]["thumbnails"]["medium"]["url"],
-                        "channel": item["snippet"]["channelTitle"],
-                        "published_at": item["snippet"]["publishedAt"]
-                    })
-                
-                return {"videos": videos, "search_query": query}
+            try:
+                videos = await youtube_search_cache.search("videos", query, max_results, search_youtube_api)
+            except QuotaExhaustedError:
+                videos = get_curated_videos(query)
+            return {"videos": videos, "search_query": query}
         else:
             # Return curated list if no API key
             return {
@@ -68,6 +52,74 @@ async def search_videos(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@single_flight("videos_search", key=lambda query, max_results: (normalize_query(query), max_results), timeout=10.0)
+async def search_youtube_api(query: str, max_results: int) -> list:
+    """Search the YouTube Data API; identical concurrent searches share one request"""
+    client = get_http_client("youtube")
+    response = await client.get(
+        "https://www.googleapis.com/youtube/v3/search",
+        timeout=5.0,
+        params={
+            "part": "snippet",
+            "q": query,
+            "type": "video",
+            "maxResults": max_results,
+            "key": YOUTUBE_API_KEY,
+            "safeSearch": "strict"
+        }
+    )
+    data = response.json()
+    
+    videos = []
+    for item in data.get("items", []):
+        videos.append({
+            "video_id": item["id"]["videoId"],
+            "title": item["snippet"]["title"],
+            "description": item["snippet"]["description"],
+            "thumbnail": item["snippet"]["thumbnails"]["medium"]["url"],
+            "channel": item["snippet"]["channelTitle"],
+            "published_at": item["snippet"]["publishedAt"]
+        })
+    return videos
+
+
+@router.post("/personalized")
+async def search_personalized(
+    request: VideoSearchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Personalized video search (requires authentication).
+    
+    A search for locally derived keywords runs alongside the AI keyword
+    extraction and its search; the two result lists are merged, AI results first.
+    """
+    return await YouTubeAIService.search_personalized_videos_pipelined(request.prompt, request.max_results or 6)
+
+
+@router.post("/personalized/stream")
+async def search_personalized_stream(
+    request: VideoSearchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Personalized video search as server-sent events (requires authentication).
+    
+    Events: local and ai ({"main_topic", "keywords", "search_query", "videos"})
+    in whichever order they finish - usually local first - then complete with
+    the merged result.
+    """
+    async def event_stream():
+        async for event, data in YouTubeAIService.stream_personalized_videos(request.prompt, request.max_results or 6):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/curated")
 async def get_curated_list(
     category: Optional[str] = None,
@@ -78,6 +130,12 @@ async def get_curated_list(
     return {"videos": videos}
 
 
+@router.get("/cache-stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """YouTube search cache hits and today's API quota usage (requires authentication)"""
+    return youtube_search_cache.get_stats()
+
+
 def get_curated_videos(topic: str) -> list:
     """Return curated video list for common topics"""
     curated = {
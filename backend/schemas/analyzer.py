@@ -9,6 +9,7 @@ class AnalyzeRequest(BaseModel):
     """Request for AI analysis"""
     question: str
     email: Optional[str] = None
+    bypass_cache: bool = False  # Skip the semantic response cache and ask the AI again
 
 
 class AnalyzeResponse(BaseModel):
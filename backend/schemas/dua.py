@@ -1,9 +1,11 @@
 """
 Dua Generator Schemas
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import Optional
 
+from callback_urls import check_callback_url
+
 
 class DuaGenerateRequest(BaseModel):
     """Request to generate a dua"""
@@ -12,6 +14,18 @@ class DuaGenerateRequest(BaseModel):
     email: Optional[str] = None
 
 
+class DuaJobRequest(DuaGenerateRequest):
+    """Request to generate a dua asynchronously"""
+    callback_url: Optional[str] = None  # Receives a POST with the job once it finishes
+    
+    @validator('callback_url')
+    def validate_callback_url(cls, v):
+        # Form, allowlist and literal IPs only; the host is resolved on submit
+        if v is not None:
+            check_callback_url(v, resolve=False)
+        return v
+
+
 class DuaHistoryResponse(BaseModel):
     """Dua history item response"""
     id: int
@@ -2,12 +2,16 @@
 AI Analyzer Service - Personalized Islamic Guidance using AI
 """
 import json
-import httpx
+from llm_client import chat_completion
+from llm_cache import CACHE_DETERMINISTIC
 import os
 from typing import Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
+from response_cache import SemanticResponseCache
+from bm25_index import BM25Index
+
 # Load environment variables
 env_path = Path(__file__).parent / ".env"
 load_dotenv(env_path)
@@ -15,9 +19,14 @@ load_dotenv(env_path)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "").strip()
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 
+# Catalog entries per type offered to the LLM in analyze_prompt_with_ai
+ANALYZER_PROMPT_CANDIDATES = int(os.getenv("ANALYZER_PROMPT_CANDIDATES", "8"))
+# Keywords shown per entry as its topic tags
+CATALOG_TAGS = 5
+
 # Import Quran Semantic Search
 try:
-    from services_quran_search import search_quran_by_topic, get_quran_search
+    from services_quran_search import search_quran_by_topic, get_quran_search, encode_query
     SEMANTIC_SEARCH_AVAILABLE = True
 except ImportError:
     SEMANTIC_SEARCH_AVAILABLE = False
@@ -422,155 +431,112 @@ class AIAnalyzerService:
         }
     ]
     
+    def __init__(self):
+        # Answers to earlier questions, reused for close paraphrases
+        self.response_cache = SemanticResponseCache()
+    
     @staticmethod
     async def analyze_prompt_with_ai(user_prompt: str) -> dict:
         """
-        Use Groq AI to analyze the user's prompt and find relevant Quran verses and hadiths
+        Use Groq AI to analyze the user's prompt and find relevant Quran verses and hadiths.
+        Only the best local candidates are sent (see build_catalog_message).
         """
-        
-        # Build a formatted list of available ayahs and hadiths for the AI with keywords
-        ayahs_list = "\n".join([
-            f"{i+1}. Quran {ayah['reference']}: {ayah['translation']} [Keywords: {', '.join(ayah['keywords'])}]"
-            for i, ayah in enumerate(AIAnalyzerService.QURAN_AYAHS)
-        ])
-        
-        hadiths_list = "\n".join([
-            f"{i+1}. {hadith['narrator']}: {hadith['text_en']} [Keywords: {', '.join(hadith['keywords'])}]"
-            for i, hadith in enumerate(AIAnalyzerService.HADITHS)
-        ])
-        
-        system_prompt = f"""You are an Islamic scholar AI. When given a user's problem or question, you will:
-
-1. Understand their specific situation and concerns
-2. Match the user's problem to the MOST relevant Quran verse and Hadith from the available options
-3. Only select a verse/hadith if it's GENUINELY RELEVANT to their problem
-4. If NO suitable match exists, respond with "NO_MATCH" and explain what topics are available
-
-AVAILABLE QURAN VERSES:
-{ayahs_list}
-
-AVAILABLE HADITHS:
-{hadiths_list}
-
-IMPORTANT: 
-- ONLY choose verses/hadiths that are GENUINELY relevant to the user's specific problem
-- Do NOT force a match if it's not related
-- If you cannot find a good match, return {{"response": "NO_MATCH", "explanation": "Your question is about [specific topic]. We currently have guidance available on: marriage relationships, dealing with anger, family relations, neighbors/community, patience, hardship, forgiveness, wealth/charity, knowledge, grief/loss, and compassion. Would you like guidance on one of these topics instead?"}}
-- Otherwise, return JSON in this format:
-{{
-    "ayah_id": <number from list>,
-    "hadith_id": <number from list>,
-    "ai_explanation": "A personalized explanation that mentions the specific verse and hadith you selected, showing how they apply to the user's situation",
-    "response": "MATCH"
-}}
-
-Your explanation must specifically reference the Quran verse and Hadith you selected."""
-        
-        user_message = f"""The user is asking about this issue:
-
-"{user_prompt}"
-
-Match this to the most relevant Quran verse and Hadith from the available options ONLY IF they are genuinely related. 
-If they don't match any available topics, respond with NO_MATCH."""
+        system_prompt = ANALYZER_SYSTEM_PROMPT
+        user_message = build_catalog_message(user_prompt)
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    GROQ_API_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {GROQ_API_KEY}"
-                    },
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 800
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result["choices"][0]["message"]["content"]
+            ai_response = await chat_completion(
+                "groq",
+                GROQ_API_URL,
+                GROQ_API_KEY,
+                {
+                    "model": "llama-3.3-70b-versatile",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 800
+                },
+                timeout=30.0,
+                cache=CACHE_DETERMINISTIC
+            )
+            
+            if ai_response is not None:
+                try:
+                    # Clean response
+                    cleaned = ai_response.strip()
+                    if cleaned.startswith("```json"):
+                        cleaned = cleaned[7:]
+                    if cleaned.startswith("```"):
+                        cleaned = cleaned[3:]
+                    if cleaned.endswith("```"):
+                        cleaned = cleaned[:-3]
+                    cleaned = cleaned.strip()
                     
+                    # Try to parse JSON
                     try:
-                        # Clean response
-                        cleaned = ai_response.strip()
-                        if cleaned.startswith("```json"):
-                            cleaned = cleaned[7:]
-                        if cleaned.startswith("```"):
-                            cleaned = cleaned[3:]
-                        if cleaned.endswith("```"):
-                            cleaned = cleaned[:-3]
-                        cleaned = cleaned.strip()
-                        
-                        # Try to parse JSON
-                        try:
-                            data = json.loads(cleaned)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, extract values using regex
-                            import re
-                            # Check for NO_MATCH response
-                            if "NO_MATCH" in cleaned or "no_match" in cleaned.lower():
-                                return {
-                                    "response": "NO_MATCH",
-                                    "message": "We don't have specific Islamic guidance available for this topic. Our available guidance covers: marriage relationships, dealing with anger, family relations, neighbors/community, patience, hardship, forgiveness, wealth/charity, knowledge, grief/loss, and compassion. Would you like guidance on one of these topics instead?",
-                                    "available_topics": ["Marriage relationships", "Anger management", "Family relations", "Neighbors/Community", "Patience", "Hardship & difficulty", "Forgiveness & hope", "Wealth & charity", "Knowledge & learning", "Grief & loss", "Compassion & mercy"],
-                                    "ai_generated": False
-                                }
-                            
-                            ayah_match = re.search(r'"ayah_id"\s*:\s*(\d+)', cleaned)
-                            hadith_match = re.search(r'"hadith_id"\s*:\s*(\d+)', cleaned)
-                            explain_match = re.search(r'"ai_explanation"\s*:\s*"(.*?)"(?:,|\})', cleaned, re.DOTALL)
-                            
-                            if ayah_match and hadith_match and explain_match:
-                                data = {
-                                    "ayah_id": int(ayah_match.group(1)),
-                                    "hadith_id": int(hadith_match.group(1)),
-                                    "ai_explanation": explain_match.group(1),
-                                    "response": "MATCH"
-                                }
-                            else:
-                                # If we can't extract, use default
-                                raise json.JSONDecodeError("Could not parse AI response", cleaned, 0)
-                        
-                        # Check if NO_MATCH was returned
-                        if data.get("response") == "NO_MATCH":
+                        data = json.loads(cleaned)
+                    except json.JSONDecodeError:
+                        # If JSON parsing fails, extract values using regex
+                        import re
+                        # Check for NO_MATCH response
+                        if "NO_MATCH" in cleaned or "no_match" in cleaned.lower():
                             return {
                                 "response": "NO_MATCH",
-                                "message": data.get("explanation", "We don't have specific guidance on this topic. Please try asking about: marriage, family, neighbors, anger management, patience, or forgiveness."),
+                                "message": "We don't have specific Islamic guidance available for this topic. Our available guidance covers: marriage relationships, dealing with anger, family relations, neighbors/community, patience, hardship, forgiveness, wealth/charity, knowledge, grief/loss, and compassion. Would you like guidance on one of these topics instead?",
                                 "available_topics": ["Marriage relationships", "Anger management", "Family relations", "Neighbors/Community", "Patience", "Hardship & difficulty", "Forgiveness & hope", "Wealth & charity", "Knowledge & learning", "Grief & loss", "Compassion & mercy"],
                                 "ai_generated": False
                             }
                         
-                        # Get the selected ayah and hadith
-                        ayah_id = int(data.get("ayah_id", 1)) - 1
-                        hadith_id = int(data.get("hadith_id", 1)) - 1
-                        
-                        # Ensure indices are valid
-                        ayah_id = max(0, min(ayah_id, len(AIAnalyzerService.QURAN_AYAHS) - 1))
-                        hadith_id = max(0, min(hadith_id, len(AIAnalyzerService.HADITHS) - 1))
-                        
-                        selected_ayah = AIAnalyzerService.QURAN_AYAHS[ayah_id]
-                        selected_hadith = AIAnalyzerService.HADITHS[hadith_id]
+                        ayah_match = re.search(r'"ayah_id"\s*:\s*(\d+)', cleaned)
+                        hadith_match = re.search(r'"hadith_id"\s*:\s*(\d+)', cleaned)
+                        explain_match = re.search(r'"ai_explanation"\s*:\s*"(.*?)"(?:,|\})', cleaned, re.DOTALL)
                         
+                        if ayah_match and hadith_match and explain_match:
+                            data = {
+                                "ayah_id": int(ayah_match.group(1)),
+                                "hadith_id": int(hadith_match.group(1)),
+                                "ai_explanation": explain_match.group(1),
+                                "response": "MATCH"
+                            }
+                        else:
+                            # If we can't extract, use default
+                            raise json.JSONDecodeError("Could not parse AI response", cleaned, 0)
+                    
+                    # Check if NO_MATCH was returned
+                    if data.get("response") == "NO_MATCH":
                         return {
-                            "ai_explanation": data.get("ai_explanation", ""),
-                            "ayah": selected_ayah,
-                            "hadith": selected_hadith,
-                            "ai_generated": True
+                            "response": "NO_MATCH",
+                            "message": data.get("explanation", "We don't have specific guidance on this topic. Please try asking about: marriage, family, neighbors, anger management, patience, or forgiveness."),
+                            "available_topics": ["Marriage relationships", "Anger management", "Family relations", "Neighbors/Community", "Patience", "Hardship & difficulty", "Forgiveness & hope", "Wealth & charity", "Knowledge & learning", "Grief & loss", "Compassion & mercy"],
+                            "ai_generated": False
                         }
-                    except (json.JSONDecodeError, ValueError, KeyError) as e:
-                        print(f"Error parsing AI response: {str(e)}")
-                        # Return default response
-                        return AIAnalyzerService.get_default_response()
-                else:
-                    print(f"Groq API error: {response.status_code}")
-                    return AIAnalyzerService.get_default_response()
                     
+                    # Get the selected ayah and hadith
+                    ayah_id = int(data.get("ayah_id", 1)) - 1
+                    hadith_id = int(data.get("hadith_id", 1)) - 1
+                    
+                    # Ensure indices are valid
+                    ayah_id = max(0, min(ayah_id, len(AIAnalyzerService.QURAN_AYAHS) - 1))
+                    hadith_id = max(0, min(hadith_id, len(AIAnalyzerService.HADITHS) - 1))
+                    
+                    selected_ayah = AIAnalyzerService.QURAN_AYAHS[ayah_id]
+                    selected_hadith = AIAnalyzerService.HADITHS[hadith_id]
+                    
+                    return {
+                        "ai_explanation": data.get("ai_explanation", ""),
+                        "ayah": selected_ayah,
+                        "hadith": selected_hadith,
+                        "ai_generated": True
+                    }
+                except (json.JSONDecodeError, ValueError, KeyError) as e:
+                    print(f"Error parsing AI response: {str(e)}")
+                    # Return default response
+                    return AIAnalyzerService.get_default_response()
+            else:
+                return AIAnalyzerService.get_default_response()
+                
         except Exception as e:
             print(f"Error calling Groq API: {str(e)}")
             return AIAnalyzerService.get_default_response()
@@ -585,11 +551,29 @@ If they don't match any available topics, respond with NO_MATCH."""
             "ai_generated": False
         }
     
-    async def analyze(self, question: str) -> dict:
+    async def analyze(self, question: str, bypass_cache: bool = False) -> dict:
         """
         Main analyze method - uses semantic search to find relevant Quran verses
-        and AI to generate explanations
+        and AI to generate explanations.
+        
+        Matched answers whose explanation came from the AI are cached and reused
+        for paraphrased questions; bypass_cache=True always computes a fresh answer.
         """
+        question_embedding = None
+        if SEMANTIC_SEARCH_AVAILABLE:
+            try:
+                # Cached by the search service, so the search below does not encode again
+                question_embedding = await encode_query(question)
+            except Exception as e:
+                print(f"Question encoding error: {e}")
+        
+        if bypass_cache:
+            self.response_cache.record_bypass()
+        else:
+            cached = self.response_cache.lookup(question, question_embedding)
+            if cached is not None:
+                return cached
+        
         # Available topics for user guidance
         available_topics = [
             "money/provision/wealth", "marriage/spouse", "family/parents", 
@@ -612,12 +596,15 @@ If they don't match any available topics, respond with NO_MATCH."""
         
         if quran_result and quran_result.get("score", 0) >= MIN_MATCH_SCORE:
             # Good match found - generate full response
-            ai_explanation = await self._generate_explanation(question, quran_result)
+            ai_explanation = await self._request_explanation(question, quran_result)
+            cacheable = ai_explanation is not None
+            if ai_explanation is None:
+                ai_explanation = self._fallback_explanation(question, quran_result)
             
             # Get a relevant hadith
             hadith = self._find_best_hadith_by_keywords(question)
             
-            return {
+            response = {
                 "match_found": True,
                 "ai_explanation": ai_explanation,
                 "ayah": {
@@ -634,6 +621,10 @@ If they don't match any available topics, respond with NO_MATCH."""
                 "ai_generated": True,
                 "search_score": quran_result.get("score", 0)
             }
+            # Fallback explanations are not cached so the next paraphrase retries the AI
+            if cacheable:
+                self.response_cache.store(question, response, question_embedding)
+            return response
         
         # No good match found - return guidance message without verse/hadith
         return {
@@ -646,10 +637,17 @@ If they don't match any available topics, respond with NO_MATCH."""
             "search_score": quran_result.get("score", 0) if quran_result else 0
         }
     
-    async def _generate_explanation(self, question: str, quran_result: dict) -> str:
-        """Generate an AI explanation for the found Quran verse"""
+    @staticmethod
+    def _fallback_explanation(question: str, quran_result: dict) -> str:
+        """Static explanation used when the AI is unavailable"""
         if not GROQ_API_KEY:
             return f"Based on your concern about '{question[:50]}...', Allah guides us in {quran_result.get('reference', 'the Quran')}: '{quran_result.get('translation', '')}'. This verse reminds us to trust in Allah's wisdom and mercy."
+        return f"This verse from {quran_result.get('reference', 'the Quran')} directly addresses your concern. Allah's words provide comfort and guidance for exactly this situation."
+    
+    async def _request_explanation(self, question: str, quran_result: dict) -> Optional[str]:
+        """Ask Groq to explain the verse; None if it is unavailable or fails"""
+        if not GROQ_API_KEY:
+            return None
         
         try:
             prompt = f"""The user asked: "{question}"
@@ -659,31 +657,29 @@ I found this relevant Quran verse:
 
 Please write a brief, compassionate 2-3 sentence explanation of how this verse addresses the user's concern. Be warm and supportive. Do not repeat the verse translation, just explain its relevance."""
 
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(
-                    GROQ_API_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {GROQ_API_KEY}"
-                    },
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": "You are a compassionate Islamic scholar providing brief, supportive guidance."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 200
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"].strip()
+            ai_response = await chat_completion(
+                "groq",
+                GROQ_API_URL,
+                GROQ_API_KEY,
+                {
+                    "model": "llama-3.3-70b-versatile",
+                    "messages": [
+                        {"role": "system", "content": "You are a compassionate Islamic scholar providing brief, supportive guidance."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 200
+                },
+                timeout=15.0,
+                cache=CACHE_DETERMINISTIC
+            )
+            
+            if ai_response is not None:
+                return ai_response.strip()
         except Exception as e:
             print(f"Error generating explanation: {e}")
         
-        return f"This verse from {quran_result.get('reference', 'the Quran')} directly addresses your concern. Allah's words provide comfort and guidance for exactly this situation."
+        return None
     
     def _find_best_hadith_by_keywords(self, question: str) -> dict:
         """Find the best matching hadith using keywords"""
@@ -740,3 +736,71 @@ Please write a brief, compassionate 2-3 sentence explanation of how this verse a
             "ai_explanation": f"Based on your question about '{question[:50]}...', here is guidance from the Quran and Sunnah.",
             "ai_generated": False
         }
+
+
+# ============= COMPACT CATALOG PROMPT (built once at import) =============
+# analyze_prompt_with_ai used to send every verse and hadith with its full
+# translation and keyword list on each call. The system prompt is now static
+# and the user message lists only the best local (BM25) candidates, one
+# "number | reference | topic tags" line each.
+
+ANALYZER_SYSTEM_PROMPT = """You are an Islamic scholar AI. Match the user's problem to the MOST relevant Quran verse and Hadith from the candidates listed with it. Each candidate is "number | reference | topic tags".
+
+- ONLY choose a verse/hadith that is GENUINELY relevant to the user's specific problem; do NOT force a match.
+- If nothing fits, return {"response": "NO_MATCH", "explanation": "Your question is about [specific topic]. We currently have guidance available on: marriage relationships, dealing with anger, family relations, neighbors/community, patience, hardship, forgiveness, wealth/charity, knowledge, grief/loss, and compassion. Would you like guidance on one of these topics instead?"}
+- Otherwise return JSON in this format:
+{
+    "ayah_id": <number of the chosen verse>,
+    "hadith_id": <number of the chosen hadith>,
+    "ai_explanation": "A personalized explanation that mentions the specific verse and hadith you selected, showing how they apply to the user's situation",
+    "response": "MATCH"
+}
+
+Your explanation must specifically reference the Quran verse and Hadith you selected."""
+
+
+def _catalog_line(number: int, reference: str, keywords: list) -> str:
+    return f"{number} | {reference} | {', '.join(keywords[:CATALOG_TAGS])}"
+
+
+_AYAH_LINES = [
+    _catalog_line(i + 1, ayah["reference"], ayah["keywords"])
+    for i, ayah in enumerate(AIAnalyzerService.QURAN_AYAHS)
+]
+_HADITH_LINES = [
+    _catalog_line(i + 1, hadith["narrator"], hadith["keywords"])
+    for i, hadith in enumerate(AIAnalyzerService.HADITHS)
+]
+_AYAH_INDEX = BM25Index([
+    " ".join(ayah["keywords"]) + " " + ayah["translation"] + " " + ayah.get("explanation", "")
+    for ayah in AIAnalyzerService.QURAN_AYAHS
+])
+_HADITH_INDEX = BM25Index([
+    " ".join(hadith["keywords"]) + " " + hadith["text_en"] + " " + hadith.get("explanation", "")
+    for hadith in AIAnalyzerService.HADITHS
+])
+
+
+def _candidate_lines(index: BM25Index, lines: list, query: str, top_n: int) -> list:
+    """Lines of the top_n BM25 matches in catalog order; the whole catalog if nothing matches"""
+    hits = index.search(query, top_k=top_n)
+    if not hits:
+        return lines
+    return [lines[doc_id] for doc_id in sorted(doc_id for doc_id, _ in hits)]
+
+
+def build_catalog_message(user_prompt: str, top_n: int = ANALYZER_PROMPT_CANDIDATES) -> str:
+    """User message for analyze_prompt_with_ai: the question plus its candidate verses and hadiths"""
+    ayahs = "\n".join(_candidate_lines(_AYAH_INDEX, _AYAH_LINES, user_prompt, top_n))
+    hadiths = "\n".join(_candidate_lines(_HADITH_INDEX, _HADITH_LINES, user_prompt, top_n))
+    return f"""The user is asking about this issue:
+
+"{user_prompt}"
+
+CANDIDATE QURAN VERSES:
+{ayahs}
+
+CANDIDATE HADITHS:
+{hadiths}
+
+Pick the most relevant verse and hadith ONLY IF they are genuinely related; otherwise respond with NO_MATCH."""
@@ -1,11 +1,18 @@
 """
 Chat Service - Handles imam chat and conversation management
 """
+from sqlalchemy import and_, case, func, select
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import List, Optional
+
+from pagination import paginate
 
 class ChatService:
     
+    # Characters of the last message kept on the conversation
+    PREVIEW_LENGTH = 100
+    
     # Default imams in system
     DEFAULT_IMAMS = [
         {
@@ -99,17 +106,12 @@ class ChatService:
         )
         db.add(message)
         
-        # Update conversation timestamp
-        conversation.updated_at = datetime.now()
+        # Update conversation timestamp, counters and last-message snapshot
+        ChatService.record_message(db, message)
         
         # If user sent message, mark imam's previous messages as read
         if sender_type == "user":
-            prev_messages = db.query(Message).filter(
-                Message.conversation_id == conversation_id,
-                Message.sender_type == "imam"
-            ).all()
-            for msg in prev_messages:
-                msg.is_read = True
+            ChatService.mark_read(db, conversation_id, "user")
         
         db.commit()
         return message
@@ -134,6 +136,171 @@ class ChatService:
         ).order_by(Conversation.updated_at.desc()).all()
         return conversations
     
+    @staticmethod
+    def record_message(db: Session, message):
+        """
+        Count a new (not yet committed) message on its conversation: bump the
+        other side's unread counter and refresh last_message_preview and
+        last_message_at. Runs as one UPDATE in the caller's transaction (the
+        caller commits).
+        """
+        from models_extended import Conversation
+        
+        # Stamp the message ourselves so last_message_at matches it exactly
+        message.created_at = message.created_at or datetime.utcnow()
+        counter = Conversation.unread_for_imam if message.sender_type == "user" else Conversation.unread_for_user
+        db.query(Conversation).filter(Conversation.id == message.conversation_id).update({
+            counter: func.coalesce(counter, 0) + 1,
+            Conversation.last_message_preview: (message.message_text or "")[:ChatService.PREVIEW_LENGTH],
+            Conversation.last_message_at: message.created_at,
+            Conversation.updated_at: message.created_at,
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def mark_read(db: Session, conversation_id: int, reader_type: str):
+        """Mark the other party's messages read and take them off the reader's unread counter (the caller commits)"""
+        from models_extended import Conversation, Message
+        
+        other_type = "imam" if reader_type == "user" else "user"
+        # Decrement by what this UPDATE flipped rather than resetting to 0: a
+        # message recorded after it (and its +1) must stay unread
+        flipped = db.query(Message).filter(
+            Message.conversation_id == conversation_id,
+            Message.sender_type == other_type,
+            Message.is_read == False
+        ).update({"is_read": True}, synchronize_session=False)
+        if not flipped:
+            return
+        counter = Conversation.unread_for_user if reader_type == "user" else Conversation.unread_for_imam
+        # Reading must not move the conversation up the inbox: keep updated_at
+        db.query(Conversation).filter(Conversation.id == conversation_id).update({
+            counter: case((counter > flipped, counter - flipped), else_=0),
+            Conversation.updated_at: Conversation.updated_at,
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def get_inbox(
+        db: Session,
+        user_email: Optional[str] = None,
+        imam_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ):
+        """
+        One page of [(conversation, imam_name)] newest first, and the cursor
+        of the next page (None on the last one). Read straight from the
+        maintained counter and snapshot columns: an index range scan on
+        (user_email | imam_id, updated_at, id), no per-conversation aggregation.
+        """
+        from models_extended import Conversation, Imam
+        
+        query = db.query(Conversation, Imam.name).outerjoin(Imam, Imam.id == Conversation.imam_id)
+        if user_email is not None:
+            query = query.filter(Conversation.user_email == user_email)
+        if imam_id is not None:
+            query = query.filter(Conversation.imam_id == imam_id)
+        return paginate(
+            query,
+            (Conversation.updated_at, Conversation.id),
+            cursor=cursor,
+            limit=limit,
+            key=lambda row: (row[0].updated_at, row[0].id)
+        )
+    
+    @staticmethod
+    def reconcile_counters(db: Session) -> int:
+        """
+        Recompute every conversation's unread counters and last-message
+        snapshot from the messages table; returns how many conversations
+        had drifted (and were fixed)
+        """
+        from models_extended import Conversation
+        
+        repaired = 0
+        for summary in ChatService.get_conversation_summaries(db):
+            conv = summary["conversation"]
+            expected = {
+                "unread_for_user": summary["unread_from_imam"],
+                "unread_for_imam": summary["unread_from_user"],
+                "last_message_preview": summary["last_message"][:ChatService.PREVIEW_LENGTH] if summary["last_message"] is not None else None,
+                "last_message_at": summary["last_message_at"],
+            }
+            if any(getattr(conv, field) != value for field, value in expected.items()):
+                db.query(Conversation).filter(Conversation.id == conv.id).update(
+                    {**expected, "updated_at": Conversation.updated_at}, synchronize_session=False
+                )
+                repaired += 1
+        db.commit()
+        return repaired
+    
+    @staticmethod
+    def get_conversation_summaries(db: Session, user_email: Optional[str] = None, imam_id: Optional[int] = None) -> List[dict]:
+        """
+        Conversations (newest first) with their imam's name, last message and
+        unread counts per side, in one SQL statement.
+        
+        A window over messages gives each conversation's latest message
+        (row_number) and its unread counts (sums partitioned by conversation);
+        it is joined to conversations and imams on the latest row only.
+        Works on SQLite (3.25+) and Postgres.
+        
+        Each dict has: conversation, imam_name, last_message, last_message_at,
+        unread_from_user, unread_from_imam.
+        """
+        from models_extended import Conversation, Imam, Message
+        
+        filters = []
+        if user_email is not None:
+            filters.append(Conversation.user_email == user_email)
+        if imam_id is not None:
+            filters.append(Conversation.imam_id == imam_id)
+        
+        # Only the listed conversations' messages go through the window
+        partition = Message.conversation_id
+        messages = select(
+            Message.conversation_id,
+            Message.message_text,
+            Message.created_at,
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(Message.created_at.desc(), Message.id.desc())
+            ).label("position"),
+            func.sum(case((and_(Message.sender_type == "user", Message.is_read == False), 1), else_=0)).over(
+                partition_by=partition
+            ).label("unread_from_user"),
+            func.sum(case((and_(Message.sender_type == "imam", Message.is_read == False), 1), else_=0)).over(
+                partition_by=partition
+            ).label("unread_from_imam"),
+        ).where(
+            Message.conversation_id.in_(select(Conversation.id).where(*filters))
+        ).subquery()
+        
+        rows = db.query(
+            Conversation,
+            Imam.name,
+            messages.c.message_text,
+            messages.c.created_at,
+            messages.c.unread_from_user,
+            messages.c.unread_from_imam,
+        ).outerjoin(
+            Imam, Imam.id == Conversation.imam_id
+        ).outerjoin(
+            messages, and_(messages.c.conversation_id == Conversation.id, messages.c.position == 1)
+        ).filter(*filters).order_by(Conversation.updated_at.desc()).all()
+        
+        return [
+            {
+                "conversation": conversation,
+                "imam_name": imam_name,
+                "last_message": last_message,
+                "last_message_at": last_message_at,
+                "unread_from_user": unread_from_user or 0,
+                "unread_from_imam": unread_from_imam or 0,
+            }
+            for conversation, imam_name, last_message, last_message_at, unread_from_user, unread_from_imam
+            in rows
+        ]
+    
     @staticmethod
     def get_unread_message_count(db: Session, conversation_id: int, viewer_type: str):
         """Get count of unread messages"""
@@ -4,10 +4,15 @@ Dua Generator Service - AI-Powered Personalized Dua Generation using Groq
 from sqlalchemy.orm import Session
 from datetime import datetime
 import json
-import httpx
+from http_clients import get_http_client
+from circuit_breaker import get_breaker
+from llm_rate_limiter import llm_slot
+from llm_client import chat_completion
+from llm_cache import CACHE_POOL
 import os
 import random
-from typing import Optional
+import re
+from typing import AsyncIterator, List, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -25,6 +30,77 @@ if not GROQ_API_KEY:
 else:
     print(f"[OK] Groq API key loaded: {GROQ_API_KEY[:20]}...")
 
+_JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _decode_partial_json_string(buffer: str, start: int) -> Tuple[str, bool]:
+    """
+    Decode the JSON string body beginning at buffer[start] (just after the
+    opening quote). Returns (text decoded so far, whether the closing quote
+    was reached). Stops before an escape sequence that is still incomplete.
+    """
+    out = []
+    i = start
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            return "".join(out), True
+        if char != "\\":
+            out.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(buffer):
+            break
+        escape = buffer[i + 1]
+        if escape == "u":
+            if i + 6 > len(buffer):
+                break
+            try:
+                out.append(chr(int(buffer[i + 2:i + 6], 16)))
+            except ValueError:
+                pass
+            i += 6
+        else:
+            out.append(_JSON_ESCAPES.get(escape, escape))
+            i += 2
+    return "".join(out), False
+
+
+class JsonFieldStreamer:
+    """
+    Incrementally extracts string fields from a JSON object that arrives in
+    chunks, so each field's text can be forwarded while the model is still
+    writing it.
+    """
+    
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.buffer = ""
+        self._starts = {}
+        self._emitted = {field: 0 for field in self.fields}
+        self._done = set()
+    
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Add a chunk and return the new (field, text) fragments it completes"""
+        self.buffer += chunk
+        fragments = []
+        for field in self.fields:
+            if field in self._done:
+                continue
+            if field not in self._starts:
+                match = re.search(r'"%s"\s*:\s*"' % re.escape(field), self.buffer)
+                if not match:
+                    continue
+                self._starts[field] = match.end()
+            text, complete = _decode_partial_json_string(self.buffer, self._starts[field])
+            if len(text) > self._emitted[field]:
+                fragments.append((field, text[self._emitted[field]:]))
+                self._emitted[field] = len(text)
+            if complete:
+                self._done.add(field)
+        return fragments
+
+
 class DuaService:
     
     # Dua categories for reference
@@ -77,14 +153,10 @@ class DuaService:
         return DuaService.DUA_CATEGORIES
     
     @staticmethod
-    async def generate_dua(category: str, context: str) -> dict:
-        """
-        Generate a truly personalized dua using Groq AI.
-        Each call generates a unique dua based on the user's specific situation.
-        """
-        
+    def _build_prompts(category: str, context: str, style: Optional[str] = None):
+        """Return (system_prompt, user_prompt, style) with a random style (unless given) and opening for variety"""
         # Select random style and opening for variety
-        style = random.choice(DuaService.DUA_STYLES)
+        style = style or random.choice(DuaService.DUA_STYLES)
         opening_idx = random.randint(0, len(DuaService.OPENINGS) - 1)
         opening_en = DuaService.OPENINGS[opening_idx]
         opening_ar = DuaService.OPENINGS_AR[opening_idx]
@@ -135,75 +207,175 @@ IMPORTANT:
 
 Generate the JSON now:"""
 
+        return system_prompt, user_prompt, style
+    
+    @staticmethod
+    def _parse_ai_response(ai_response: str, category: str, context: str, style: str) -> dict:
+        """Turn the model's JSON reply into a dua result dict"""
+        # Parse the JSON response from AI
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    GROQ_API_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {GROQ_API_KEY}"
-                    },
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        "temperature": 0.8,
-                        "max_tokens": 800
-                    }
-                )
+            # Clean the response - sometimes AI adds markdown code blocks
+            cleaned_response = ai_response.strip()
+            if cleaned_response.startswith("```json"):
+                cleaned_response = cleaned_response[7:]
+            if cleaned_response.startswith("```"):
+                cleaned_response = cleaned_response[3:]
+            if cleaned_response.endswith("```"):
+                cleaned_response = cleaned_response[:-3]
+            cleaned_response = cleaned_response.strip()
+            
+            dua_data = json.loads(cleaned_response)
+            
+            return {
+                "category": category,
+                "context": context,
+                "dua_text_en": dua_data.get("dua_text_en", ""),
+                "dua_text_ar": dua_data.get("dua_text_ar", ""),
+                "how_to_use_en": dua_data.get("how_to_use_en", "Recite with sincere intention after prayers."),
+                "how_to_use_ar": dua_data.get("how_to_use_ar", "اقرأ بنية صادقة بعد الصلاة."),
+                "ai_generated": True,
+                "style_used": style,
+                "timestamp": datetime.now().isoformat()
+            }
+        except json.JSONDecodeError:
+            # If AI didn't return valid JSON, use the response as-is
+            return {
+                "category": category,
+                "context": context,
+                "dua_text_en": ai_response,
+                "dua_text_ar": "",
+                "how_to_use_en": "Recite with sincere intention.",
+                "how_to_use_ar": "اقرأ بنية صادقة.",
+                "ai_generated": True,
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    @staticmethod
+    async def generate_dua(category: str, context: str, style: Optional[str] = None, cache: str = CACHE_POOL) -> dict:
+        """
+        Generate a truly personalized dua using Groq AI.
+        Each call generates a unique dua based on the user's specific situation.
+        style picks one of DUA_STYLES instead of a random one; the dua pool
+        passes cache=CACHE_OFF so every pooled dua is a fresh completion.
+        """
+        system_prompt, user_prompt, style = DuaService._build_prompts(category, context, style)
+
+        try:
+            ai_response = await chat_completion(
+                "groq",
+                GROQ_API_URL,
+                GROQ_API_KEY,
+                {
+                    "model": "llama-3.3-70b-versatile",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    "temperature": 0.8,
+                    "max_tokens": 800
+                },
+                timeout=30.0,
+                cache=cache
+            )
+            
+            if ai_response is not None:
+                return DuaService._parse_ai_response(ai_response, category, context, style)
+            else:
+                # API error - fall back to intelligent template
+                return DuaService._generate_intelligent_fallback(category, context)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result["choices"][0]["message"]["content"]
-                    
-                    # Parse the JSON response from AI
-                    try:
-                        # Clean the response - sometimes AI adds markdown code blocks
-                        cleaned_response = ai_response.strip()
-                        if cleaned_response.startswith("```json"):
-                            cleaned_response = cleaned_response[7:]
-                        if cleaned_response.startswith("```"):
-                            cleaned_response = cleaned_response[3:]
-                        if cleaned_response.endswith("```"):
-                            cleaned_response = cleaned_response[:-3]
-                        cleaned_response = cleaned_response.strip()
-                        
-                        dua_data = json.loads(cleaned_response)
-                        
-                        return {
-                            "category": category,
-                            "context": context,
-                            "dua_text_en": dua_data.get("dua_text_en", ""),
-                            "dua_text_ar": dua_data.get("dua_text_ar", ""),
-                            "how_to_use_en": dua_data.get("how_to_use_en", "Recite with sincere intention after prayers."),
-                            "how_to_use_ar": dua_data.get("how_to_use_ar", "اقرأ بنية صادقة بعد الصلاة."),
-                            "ai_generated": True,
-                            "style_used": style,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    except json.JSONDecodeError:
-                        # If AI didn't return valid JSON, use the response as-is
-                        return {
-                            "category": category,
-                            "context": context,
-                            "dua_text_en": ai_response,
-                            "dua_text_ar": "",
-                            "how_to_use_en": "Recite with sincere intention.",
-                            "how_to_use_ar": "اقرأ بنية صادقة.",
-                            "ai_generated": True,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                else:
-                    # API error - fall back to intelligent template
-                    print(f"Groq API error: {response.status_code} - {response.text}")
-                    return DuaService._generate_intelligent_fallback(category, context)
-                    
         except Exception as e:
             print(f"Error calling Groq API: {str(e)}")
             return DuaService._generate_intelligent_fallback(category, context)
     
+    # Fields forwarded as incremental "delta" events by stream_dua
+    STREAM_FIELDS = ("dua_text_en", "dua_text_ar", "how_to_use_en", "how_to_use_ar")
+    
+    @staticmethod
+    async def stream_dua(category: str, context: str) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Generate a dua with Groq's streaming API.
+        
+        Yields (event, data) pairs:
+            start     {"category", "style"} - sent before the model is called
+            delta     {"field", "text"} - new text for one of STREAM_FIELDS
+            error     {"message"} - the stream broke off; a fallback dua follows
+            complete  the final dua dict, same shape as generate_dua()
+        The complete event is authoritative: clients should replace whatever
+        they assembled from deltas with it.
+        """
+        system_prompt, user_prompt, style = DuaService._build_prompts(category, context)
+        yield "start", {"category": category, "style": style}
+        
+        if not GROQ_API_KEY:
+            async for event in DuaService._stream_complete_dua(DuaService._generate_intelligent_fallback(category, context)):
+                yield event
+            return
+        
+        streamer = JsonFieldStreamer(DuaService.STREAM_FIELDS)
+        try:
+            client = get_http_client("groq")
+            async with llm_slot("groq", system_prompt + user_prompt, max_tokens=800) as slot:
+                # The whole stream counts as one call for the breaker
+                with get_breaker("groq").track():
+                    async with client.stream(
+                        "POST",
+                        GROQ_API_URL,
+                        timeout=30.0,
+                        headers={
+                            "Content-Type": "application/json",
+                            "Authorization": f"Bearer {GROQ_API_KEY}"
+                        },
+                        json={
+                            "model": "llama-3.3-70b-versatile",
+                            "messages": [
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_prompt}
+                            ],
+                            "temperature": 0.8,
+                            "max_tokens": 800,
+                            "stream": True
+                        }
+                    ) as response:
+                        if response.status_code != 200:
+                            await slot.settle(response)  # a 429 pauses Groq for every process
+                            body = await response.aread()
+                            raise RuntimeError(f"Groq API error: {response.status_code} - {body[:200]!r}")
+                    
+                        usage = {}
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            payload = line[len("data:"):].strip()
+                            if payload == "[DONE]":
+                                break
+                            chunk = json.loads(payload)
+                            # Groq reports usage in the last chunk, under x_groq
+                            usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or usage
+                            choices = chunk.get("choices") or [{}]
+                            content = (choices[0].get("delta") or {}).get("content")
+                            if not content:
+                                continue
+                            for field, text in streamer.feed(content):
+                                yield "delta", {"field": field, "text": text}
+                        await slot.settle(response, usage=usage)
+        except Exception as e:
+            print(f"Error streaming from Groq API: {str(e)}")
+            yield "error", {"message": "AI stream interrupted, using a prepared dua"}
+            async for event in DuaService._stream_complete_dua(DuaService._generate_intelligent_fallback(category, context)):
+                yield event
+            return
+        
+        yield "complete", DuaService._parse_ai_response(streamer.buffer, category, context, style)
+    
+    @staticmethod
+    async def _stream_complete_dua(result: dict):
+        """Emit an already complete dua as one delta per field plus the complete event"""
+        for field in DuaService.STREAM_FIELDS:
+            if result.get(field):
+                yield "delta", {"field": field, "text": result[field]}
+        yield "complete", result
+    
     @staticmethod
     def _generate_intelligent_fallback(category: str, context: str) -> dict:
         """
@@ -4,7 +4,8 @@ Dua Generator Service - AI-Powered Personalized Dua Generation using DeepSeek
 from sqlalchemy.orm import Session
 from datetime import datetime
 import json
-import httpx
+from llm_client import chat_completion
+from llm_cache import CACHE_POOL
 import os
 from typing import Optional
 from pathlib import Path
@@ -83,69 +84,64 @@ Remember: The dua must DIRECTLY address their specific situation "{context}" - n
 Generate a sincere, heartfelt dua that speaks directly to what they described."""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    DEEPSEEK_API_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-                    },
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 1000
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result["choices"][0]["message"]["content"]
+            ai_response = await chat_completion(
+                "deepseek",
+                DEEPSEEK_API_URL,
+                DEEPSEEK_API_KEY,
+                {
+                    "model": "deepseek-chat",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 1000
+                },
+                timeout=30.0,
+                cache=CACHE_POOL
+            )
+            
+            if ai_response is not None:
+                # Parse the JSON response from AI
+                try:
+                    # Clean the response - sometimes AI adds markdown code blocks
+                    cleaned_response = ai_response.strip()
+                    if cleaned_response.startswith("```json"):
+                        cleaned_response = cleaned_response[7:]
+                    if cleaned_response.startswith("```"):
+                        cleaned_response = cleaned_response[3:]
+                    if cleaned_response.endswith("```"):
+                        cleaned_response = cleaned_response[:-3]
+                    cleaned_response = cleaned_response.strip()
                     
-                    # Parse the JSON response from AI
-                    try:
-                        # Clean the response - sometimes AI adds markdown code blocks
-                        cleaned_response = ai_response.strip()
-                        if cleaned_response.startswith("```json"):
-                            cleaned_response = cleaned_response[7:]
-                        if cleaned_response.startswith("```"):
-                            cleaned_response = cleaned_response[3:]
-                        if cleaned_response.endswith("```"):
-                            cleaned_response = cleaned_response[:-3]
-                        cleaned_response = cleaned_response.strip()
-                        
-                        dua_data = json.loads(cleaned_response)
-                        
-                        return {
-                            "category": category,
-                            "context": context,
-                            "dua_text_en": dua_data.get("dua_text_en", ""),
-                            "dua_text_ar": dua_data.get("dua_text_ar", ""),
-                            "how_to_use_en": dua_data.get("how_to_use_en", "Recite with sincere intention after prayers."),
-                            "how_to_use_ar": dua_data.get("how_to_use_ar", "اقرأ بنية صادقة بعد الصلاة."),
-                            "ai_generated": True,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    except json.JSONDecodeError:
-                        # If AI didn't return valid JSON, use the response as-is
-                        return {
-                            "category": category,
-                            "context": context,
-                            "dua_text_en": ai_response,
-                            "dua_text_ar": "",
-                            "how_to_use_en": "Recite with sincere intention.",
-                            "how_to_use_ar": "اقرأ بنية صادقة.",
-                            "ai_generated": True,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                else:
-                    # API error - fall back to intelligent template
-                    print(f"DeepSeek API error: {response.status_code} - {response.text}")
-                    return DuaService._generate_intelligent_fallback(category, context)
+                    dua_data = json.loads(cleaned_response)
                     
+                    return {
+                        "category": category,
+                        "context": context,
+                        "dua_text_en": dua_data.get("dua_text_en", ""),
+                        "dua_text_ar": dua_data.get("dua_text_ar", ""),
+                        "how_to_use_en": dua_data.get("how_to_use_en", "Recite with sincere intention after prayers."),
+                        "how_to_use_ar": dua_data.get("how_to_use_ar", "اقرأ بنية صادقة بعد الصلاة."),
+                        "ai_generated": True,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                except json.JSONDecodeError:
+                    # If AI didn't return valid JSON, use the response as-is
+                    return {
+                        "category": category,
+                        "context": context,
+                        "dua_text_en": ai_response,
+                        "dua_text_ar": "",
+                        "how_to_use_en": "Recite with sincere intention.",
+                        "how_to_use_ar": "اقرأ بنية صادقة.",
+                        "ai_generated": True,
+                        "timestamp": datetime.now().isoformat()
+                    }
+            else:
+                # API error - fall back to intelligent template
+                return DuaService._generate_intelligent_fallback(category, context)
+                
         except Exception as e:
             print(f"Error calling DeepSeek API: {str(e)}")
             return DuaService._generate_intelligent_fallback(category, context)
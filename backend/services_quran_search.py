@@ -4,14 +4,21 @@ Uses sentence-transformers to find the most relevant Quran verses based on user'
 """
 import json
 import os
-import pickle
+import threading
 from pathlib import Path
 from typing import List, Dict, Optional
 
+from bm25_index import BM25Index, normalize_arabic, reciprocal_rank_fusion
+from encoder_pool import QueryEncoder, EncoderBusyError
+from query_cache import QueryCache, normalize_query
+from single_flight import single_flight
+
 # Try to import numpy and sentence-transformers, fallback if not available
 try:
     import numpy as np
     from sentence_transformers import SentenceTransformer
+    from embedding_store import EmbeddingStore, corpus_checksum, unique_temp_path
+    from vector_index import load_or_build_index
     SENTENCE_TRANSFORMERS_AVAILABLE = True
 except ImportError:
     np = None
@@ -340,63 +347,256 @@ QURAN_DATABASE = [
 ]
 
 
+# Index configuration
+# "curated" embeds only QURAN_DATABASE above; "full" serves the on-disk index
+# built from the quran_english/quran_arabic tables (see build_quran_index.py).
+# A missing or stale full index is rebuilt in the background while curated
+# verses are served; get_quran_search() switches over once it is ready
+QURAN_INDEX_MODE = os.getenv("QURAN_INDEX_MODE", "curated").strip().lower()
+QURAN_DATABASE_URL = os.getenv("QURAN_DATABASE_URL", os.getenv("DATABASE_URL", "sqlite:///./ramadan_app.db"))
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Storage precision of the embedding matrix: float32, float16 or int8
+EMBEDDING_DTYPE = os.getenv("QURAN_EMBEDDING_DTYPE", "float32").strip().lower()
+
+# Bump FULL_INDEX_VERSION whenever the verse text layout changes so old
+# artifacts are ignored instead of being searched with the wrong layout
+FULL_INDEX_VERSION = 2
+INDEX_DIR = Path(__file__).parent / "quran_index"
+
+# Fuse BM25 keyword ranking with the dense ranking (reciprocal-rank fusion)
+HYBRID_SEARCH = os.getenv("QURAN_HYBRID_SEARCH", "true").strip().lower() in ("1", "true", "yes")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = 50
+# Keyword-only results map BM25 score s to s / (s + BM25_SCORE_SCALE) in [0, 1),
+# so one solid term match clears the analyzer's 0.25 threshold like before
+BM25_SCORE_SCALE = 4.0
+
+
+def _curated_store_path() -> Path:
+    return INDEX_DIR / "quran_curated.npy"
+
+
+def _full_index_paths(version: int = FULL_INDEX_VERSION):
+    """Return (embeddings_path, verses_path) for a full-index version"""
+    return (
+        INDEX_DIR / f"quran_full_v{version}.npy",
+        INDEX_DIR / f"quran_full_v{version}.verses.json",
+    )
+
+
+def _verse_search_text(verse: Dict) -> str:
+    """Text that gets embedded for a verse (translation + topics)"""
+    return f"{verse['translation']} {' '.join(verse['topics'])}"
+
+
+def _verse_keyword_text(verse: Dict) -> str:
+    """Text indexed by BM25 for a verse (translation + topics + normalized Arabic)"""
+    return f"{_verse_search_text(verse)} {normalize_arabic(verse.get('arabic') or '')}"
+
+
+def stream_quran_verses(database_url: str = None, batch_size: int = 500):
+    """
+    Stream every verse from the quran_english table joined with quran_arabic.
+    
+    Rows are fetched with a server-side cursor where the driver supports it, so
+    the 6,236 verses are never all held as ORM objects at once. Verses that also
+    appear in QURAN_DATABASE inherit its hand-written topics.
+    """
+    from sqlalchemy import create_engine, text
+    
+    database_url = database_url or QURAN_DATABASE_URL
+    curated_topics = {(v["surah"], v["ayah"]): v["topics"] for v in QURAN_DATABASE}
+    
+    engine = create_engine(database_url)
+    query = text("""
+        SELECT e.surah_number, e.ayah_number, e.surah_name, e.ayah_text, e.topic,
+               a.ayah_text AS arabic_text
+        FROM quran_english e
+        LEFT JOIN quran_arabic a
+               ON a.surah_number = e.surah_number AND a.ayah_number = e.ayah_number
+        ORDER BY e.surah_number, e.ayah_number
+    """)
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+            for row in result:
+                topics = list(curated_topics.get((row.surah_number, row.ayah_number), []))
+                if not topics and row.topic and row.topic != "general":
+                    topics = [row.topic]
+                yield {
+                    "surah": row.surah_number,
+                    "ayah": row.ayah_number,
+                    "surah_name": row.surah_name,
+                    "arabic": row.arabic_text or "",
+                    "translation": row.ayah_text,
+                    "topics": topics
+                }
+    finally:
+        engine.dispose()
+
+
+def build_full_index(database_url: str = None, batch_size: int = 256, model=None, dtype: str = None) -> int:
+    """
+    Build the full-Quran index from the database and write it to INDEX_DIR.
+    
+    Verses are encoded batch by batch as they stream out of the database and
+    stored in an EmbeddingStore (normalized, memory-mapped), with the verse
+    metadata alongside. The store header carries the corpus checksum, so a
+    verses file that no longer matches its embeddings is detected on load.
+    
+    Returns:
+        Number of verses indexed
+    """
+    if not SENTENCE_TRANSFORMERS_AVAILABLE:
+        raise RuntimeError("sentence-transformers and numpy are required to build the index")
+    
+    model = model or SentenceTransformer(EMBEDDING_MODEL_NAME)
+    verses = []
+    chunks = []
+    batch = []
+    
+    def encode_batch():
+        vectors = model.encode([_verse_search_text(v) for v in batch], convert_to_numpy=True, batch_size=batch_size)
+        chunks.append(vectors.astype(np.float32))
+        verses.extend(batch)
+        print(f"  Encoded {len(verses)} verses...")
+    
+    for verse in stream_quran_verses(database_url, batch_size=batch_size):
+        batch.append(verse)
+        if len(batch) >= batch_size:
+            encode_batch()
+            batch = []
+    if batch:
+        encode_batch()
+    
+    if not verses:
+        raise RuntimeError("No verses found - run scripts/import_quran_csv.py first")
+    
+    embeddings_path, verses_path = _full_index_paths()
+    checksum = corpus_checksum([_verse_search_text(v) for v in verses], EMBEDDING_MODEL_NAME)
+    
+    # Verses first: a reader only trusts them once the store checksum matches
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_verses = unique_temp_path(verses_path)
+    try:
+        with open(tmp_verses, "w", encoding="utf-8") as f:
+            json.dump({"version": FULL_INDEX_VERSION, "verses": verses}, f, ensure_ascii=False)
+        os.replace(tmp_verses, verses_path)
+    finally:
+        tmp_verses.unlink(missing_ok=True)
+    EmbeddingStore.build(embeddings_path, np.vstack(chunks), EMBEDDING_MODEL_NAME, checksum, dtype=dtype or EMBEDDING_DTYPE)
+    
+    print(f"Saved full Quran index ({len(verses)} verses) to {embeddings_path}")
+    return len(verses)
+
+
 class QuranSemanticSearch:
     """Semantic search for Quran verses using sentence embeddings"""
     
-    def __init__(self):
+    def __init__(self, mode: str = None, model=None):
         self.model = None
-        self.embeddings = None
-        self.embeddings_path = Path(__file__).parent / "quran_embeddings.pkl"
+        self.store = None
+        self.index = None
+        self.keyword_index = None
         self.database = QURAN_DATABASE
+        self.mode = (mode or QURAN_INDEX_MODE)
         
         if SENTENCE_TRANSFORMERS_AVAILABLE:
-            self._initialize_model()
+            self._initialize_model(model)
+        
+        # Built after the model so it covers whichever verse set was loaded
+        self.keyword_index = BM25Index([_verse_keyword_text(verse) for verse in self.database])
+        self.cache = QueryCache(namespace=self._cache_namespace())
     
-    def _initialize_model(self):
-        """Initialize the sentence transformer model"""
+    def _initialize_model(self, model=None):
+        """Initialize the sentence transformer model (or reuse an already loaded one)"""
         try:
             # Use a multilingual model that works well with both English and Arabic concepts
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            self._load_or_create_embeddings()
+            self.model = model or SentenceTransformer(EMBEDDING_MODEL_NAME)
+            if not (self.mode == "full" and self._load_full_index()):
+                if self.mode == "full":
+                    print(f"Full Quran index v{FULL_INDEX_VERSION} missing or stale - using curated verses")
+                self._load_or_create_embeddings()
+            if self.store is not None:
+                self.index = load_or_build_index(self.store)
         except Exception as e:
             print(f"Error initializing model: {e}")
             self.model = None
     
-    def _load_or_create_embeddings(self):
-        """Load existing embeddings or create new ones"""
-        if self.embeddings_path.exists():
+    def _load_full_index(self) -> bool:
+        """Load the full-Quran index; False (missing or stale) means use curated"""
+        embeddings_path, verses_path = _full_index_paths()
+        
+        if verses_path.exists():
             try:
-                with open(self.embeddings_path, 'rb') as f:
-                    self.embeddings = pickle.load(f)
-                print(f"Loaded {len(self.embeddings)} Quran verse embeddings")
-                return
+                with open(verses_path, "r", encoding="utf-8") as f:
+                    verses = json.load(f)["verses"]
+                checksum = corpus_checksum([_verse_search_text(v) for v in verses], EMBEDDING_MODEL_NAME)
+                store = EmbeddingStore.open(embeddings_path, model_name=EMBEDDING_MODEL_NAME, checksum=checksum)
+                if store is not None and store.dtype == EMBEDDING_DTYPE:
+                    self.store = store
+                    self.database = verses
+                    print(f"Loaded full Quran index with {len(verses)} verses ({store.dtype})")
+                    return True
             except Exception as e:
-                print(f"Error loading embeddings: {e}")
+                print(f"Error loading full Quran index: {e}")
+        return False
+    
+    def _load_or_create_embeddings(self):
+        """Open the curated embedding store, rebuilding it if missing or stale"""
+        search_texts = [_verse_search_text(verse) for verse in self.database]
+        checksum = corpus_checksum(search_texts, EMBEDDING_MODEL_NAME)
+        
+        self.store = EmbeddingStore.open(_curated_store_path(), model_name=EMBEDDING_MODEL_NAME, checksum=checksum)
+        if self.store is not None and self.store.dtype == EMBEDDING_DTYPE:
+            print(f"Loaded {len(self.store)} Quran verse embeddings")
+            return
         
-        self._create_embeddings()
+        self._create_embeddings(search_texts, checksum)
     
-    def _create_embeddings(self):
-        """Create embeddings for all Quran verses"""
+    def _create_embeddings(self, search_texts: List[str], checksum: str):
+        """Create embeddings for all curated Quran verses"""
         if not self.model:
             return
         
         print("Creating Quran verse embeddings...")
-        
-        # Create search text for each verse (translation + topics)
-        search_texts = []
-        for verse in self.database:
-            # Combine translation with topics for better semantic matching
-            search_text = f"{verse['translation']} {' '.join(verse['topics'])}"
-            search_texts.append(search_text)
-        
-        # Generate embeddings
-        self.embeddings = self.model.encode(search_texts, convert_to_numpy=True)
-        
-        # Save embeddings
-        with open(self.embeddings_path, 'wb') as f:
-            pickle.dump(self.embeddings, f)
-        
-        print(f"Created and saved {len(self.embeddings)} embeddings")
+        embeddings = self.model.encode(search_texts, convert_to_numpy=True)
+        self.store = EmbeddingStore.build(_curated_store_path(), embeddings, EMBEDDING_MODEL_NAME, checksum, dtype=EMBEDDING_DTYPE)
+        print(f"Created and saved {len(self.store)} embeddings")
+    
+    def _format_result(self, idx: int, score: float) -> Dict:
+        """Build the public result dict for a verse index"""
+        verse = self.database[idx]
+        return {
+            "surah": verse["surah"],
+            "ayah": verse["ayah"],
+            "surah_name": verse["surah_name"],
+            "arabic": verse["arabic"],
+            "translation": verse["translation"],
+            "reference": f"Quran {verse['surah']}:{verse['ayah']} ({verse['surah_name']})",
+            "topics": verse["topics"],
+            "score": score
+        }
+    
+    def _cache_namespace(self) -> str:
+        """Identifies the index results were computed against (for persisted cache rows)"""
+        if not self.semantic_enabled:
+            return f"keyword:{len(self.database)}"
+        return f"{self.mode}:{self.index.kind}:{int(HYBRID_SEARCH)}:{self.store.header['checksum'][:16]}"
+    
+    @property
+    def awaiting_full_index(self) -> bool:
+        """True in full mode while curated verses stand in for a missing or stale full index"""
+        return self.mode == "full" and self.model is not None and self.database is QURAN_DATABASE
+    
+    @property
+    def semantic_enabled(self) -> bool:
+        """True when queries are answered from embeddings rather than keywords"""
+        return SENTENCE_TRANSFORMERS_AVAILABLE and self.model is not None and self.index is not None
+    
+    def encode_queries(self, queries: List[str]):
+        """Blocking batch encode; used by the QueryEncoder thread pool"""
+        return self.model.encode(queries, convert_to_numpy=True, batch_size=len(queries))
     
     def search(self, query: str, top_k: int = 3) -> List[Dict]:
         """
@@ -409,90 +609,198 @@ class QuranSemanticSearch:
         Returns:
             List of matching verses with scores
         """
-        if not SENTENCE_TRANSFORMERS_AVAILABLE or not self.model or self.embeddings is None:
-            # Fallback to keyword-based search
-            return self._keyword_search(query, top_k)
-        
-        # Encode the query
-        query_embedding = self.model.encode(query, convert_to_numpy=True)
-        
-        # Calculate cosine similarity
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
+        results, query_embedding = self._cached_search(query, top_k)
+        if results is not None:
+            return results
+        if query_embedding is None:
+            query_embedding = self.model.encode(query, convert_to_numpy=True)
+        return self._rank_and_cache(query, top_k, query_embedding)
+    
+    def _cached_search(self, query: str, top_k: int):
+        """
+        Cache step shared by search() and search_quran().
         
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        Returns (results, None) when the query is answered without encoding:
+        a cached result list, or keyword search when semantic search is off.
+        Otherwise returns (None, embedding) with the cached embedding, or
+        (None, None) when the caller has to encode the query.
+        """
+        cached = self.cache.get(query)
+        if cached is not None and top_k in cached.results:
+            return _copy_results(cached.results[top_k]), None
         
-        results = []
-        for idx in top_indices:
-            verse = self.database[idx]
-            results.append({
-                "surah": verse["surah"],
-                "ayah": verse["ayah"],
-                "surah_name": verse["surah_name"],
-                "arabic": verse["arabic"],
-                "translation": verse["translation"],
-                "reference": f"Quran {verse['surah']}:{verse['ayah']} ({verse['surah_name']})",
-                "topics": verse["topics"],
-                "score": float(similarities[idx])
-            })
+        if not self.semantic_enabled:
+            # Fallback to keyword-based search
+            results = self._keyword_search(query, top_k)
+            self.cache.put(query, top_k, results)
+            return _copy_results(results), None
         
-        return results
+        if cached is not None and cached.embedding is not None:
+            self.cache.count_embedding_hit()
+            return None, cached.embedding
+        return None, None
     
-    def _keyword_search(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Fallback keyword-based search when semantic search is unavailable"""
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
+    def _rank_and_cache(self, query: str, top_k: int, query_embedding) -> List[Dict]:
+        """Rank against an encoded query and cache both the embedding and the results"""
+        results = self.search_by_embedding(query_embedding, top_k, query=query)
+        self.cache.put(query, top_k, results, embedding=query_embedding)
+        return _copy_results(results)
+    
+    def search_by_embedding(self, query_embedding, top_k: int = 3, query: str = None) -> List[Dict]:
+        """
+        Rank verses against an already-encoded query.
         
-        scores = []
-        for i, verse in enumerate(self.database):
-            # Score based on topic matches
-            topic_score = sum(1 for topic in verse["topics"] if topic.lower() in query_lower)
-            
-            # Score based on word overlap with translation
-            translation_words = set(verse["translation"].lower().split())
-            word_overlap = len(query_words & translation_words)
-            
-            # Combined score
-            score = topic_score * 2 + word_overlap
-            scores.append((i, score))
+        When the query text is given (and QURAN_HYBRID_SEARCH is on) the dense
+        and BM25 rankings are fused with reciprocal-rank fusion. The reported
+        score stays the cosine similarity, so score thresholds keep their meaning.
+        """
+        # Normalize the query; stored verses are already unit length
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embedding = query_embedding / max(float(np.linalg.norm(query_embedding)), 1e-12)
         
-        # Sort by score and get top-k
-        scores.sort(key=lambda x: x[1], reverse=True)
-        top_indices = [idx for idx, _ in scores[:top_k]]
+        if not (HYBRID_SEARCH and query and self.keyword_index is not None):
+            # Exact or approximate top-k depending on QURAN_ANN_BACKEND
+            indices, scores = self.index.search(query_embedding, top_k)
+            return [self._format_result(int(idx), float(score)) for idx, score in zip(indices, scores)]
         
-        results = []
-        for idx in top_indices:
-            verse = self.database[idx]
-            results.append({
-                "surah": verse["surah"],
-                "ayah": verse["ayah"],
-                "surah_name": verse["surah_name"],
-                "arabic": verse["arabic"],
-                "translation": verse["translation"],
-                "reference": f"Quran {verse['surah']}:{verse['ayah']} ({verse['surah_name']})",
-                "topics": verse["topics"],
-                "score": scores[top_indices.index(idx)][1] / 10  # Normalize score
-            })
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        indices, scores = self.index.search(query_embedding, candidates)
+        dense = {int(idx): float(score) for idx, score in zip(indices, scores)}
+        keyword_ranking = [idx for idx, _ in self.keyword_index.search(query, candidates)]
         
-        return results
+        # Keyword hits outside the dense candidates still need a cosine score
+        missing = [idx for idx in keyword_ranking if idx not in dense]
+        if missing:
+            dense.update(zip(missing, self.store.row_scores(missing, query_embedding).tolist()))
+        
+        fused = reciprocal_rank_fusion([[int(idx) for idx in indices], keyword_ranking])
+        return [self._format_result(idx, dense[idx]) for idx, _ in fused[:top_k]]
+    
+    def _keyword_search(self, query: str, top_k: int = 3) -> List[Dict]:
+        """BM25 keyword search, used when semantic search is unavailable or busy"""
+        return [
+            self._format_result(idx, score / (score + BM25_SCORE_SCALE))
+            for idx, score in self.keyword_index.search(query, top_k)
+        ]
+
 
+def _copy_results(results: List[Dict]) -> List[Dict]:
+    """Callers get their own dicts so cached results cannot be mutated"""
+    return [dict(result) for result in results]
 
-# Global instance
+
+# Global instances
 _quran_search = None
+_query_encoder = None
+_full_index_build = None  # background build of the full index, at most one per process
+_full_index_lock = threading.Lock()
 
 def get_quran_search() -> QuranSemanticSearch:
-    """Get or create the global QuranSemanticSearch instance"""
+    """
+    Get or create the global QuranSemanticSearch instance. In full mode with
+    a missing or stale index it serves curated verses and starts one
+    background build; the global instance is replaced once the build is done.
+    """
     global _quran_search
     if _quran_search is None:
-        _quran_search = QuranSemanticSearch()
+        search = QuranSemanticSearch()
+        with _full_index_lock:
+            if _quran_search is None:
+                _quran_search = search
+        if search.awaiting_full_index:
+            start_full_index_build(search.model)
     return _quran_search
 
 
+def start_full_index_build(model=None) -> bool:
+    """Build the full index on a daemon thread; False if this process already started one"""
+    global _full_index_build
+    with _full_index_lock:
+        if _full_index_build is not None:
+            return False
+        _full_index_build = threading.Thread(
+            target=_build_and_switch_to_full_index, args=(model,), name="quran-full-index", daemon=True
+        )
+    _full_index_build.start()
+    return True
+
+
+def _build_and_switch_to_full_index(model=None):
+    global _quran_search
+    print(f"Building full Quran index v{FULL_INDEX_VERSION} from {QURAN_DATABASE_URL} in the background")
+    try:
+        build_full_index(model=model)
+        search = QuranSemanticSearch(mode="full", model=model)
+    except Exception as e:
+        print(f"Could not build full Quran index ({e}). Using curated verses.")
+        return
+    if search.database is QURAN_DATABASE:
+        return  # still not loadable: keep serving curated verses
+    with _full_index_lock:
+        _quran_search = search
+    print(f"Quran search switched to the full index ({len(search.database)} verses)")
+
+
+def get_query_encoder() -> QueryEncoder:
+    """Get or create the shared encoder pool for the global search instance"""
+    global _query_encoder
+    if _query_encoder is None:
+        _query_encoder = QueryEncoder(get_quran_search().encode_queries)
+    return _query_encoder
+
+
+async def encode_query(query: str):
+    """
+    Embedding for query via the query cache or the encoder pool.
+    Returns None when semantic search is disabled or the encoder is saturated.
+    """
+    search = get_quran_search()
+    if not search.semantic_enabled:
+        return None
+    
+    cached = search.cache.get(query)
+    if cached is not None and cached.embedding is not None:
+        search.cache.count_embedding_hit()
+        return cached.embedding
+    try:
+        query_embedding = await get_query_encoder().encode(query)
+    except EncoderBusyError:
+        return None
+    search.cache.put(query, embedding=query_embedding)
+    return query_embedding
+
+
+async def search_quran(query: str, top_k: int = 3) -> List[Dict]:
+    """
+    Async search that never runs the model on the event loop.
+    
+    Query encoding goes through the shared QueryEncoder (thread pool with
+    micro-batching); scoring against the normalized store takes well under a
+    millisecond and stays inline. Repeated queries are answered from the
+    shared QueryCache without touching the encoder. If the encoder is
+    saturated the request degrades to keyword search instead of queueing
+    indefinitely.
+    """
+    search = get_quran_search()
+    results, query_embedding = search._cached_search(query, top_k)
+    if results is not None:
+        return results
+    
+    if query_embedding is None:
+        try:
+            query_embedding = await get_query_encoder().encode(query)
+        except EncoderBusyError as e:
+            # Degraded answer: served but not cached
+            print(f"Semantic search busy, using keyword search: {e}")
+            return search._keyword_search(query, top_k)
+    return search._rank_and_cache(query, top_k, query_embedding)
+
+
+@single_flight("search_quran_by_topic", key=lambda query, top_k=1: (normalize_query(query), top_k), timeout=15.0)
 async def search_quran_by_topic(query: str, top_k: int = 1) -> Dict:
     """
-    Main function to search for relevant Quran verses
+    Main function to search for relevant Quran verses.
+    Identical concurrent queries share one search.
     
     Args:
         query: The user's question or topic
@@ -501,8 +809,7 @@ async def search_quran_by_topic(query: str, top_k: int = 1) -> Dict:
     Returns:
         The most relevant verse(s)
     """
-    search = get_quran_search()
-    results = search.search(query, top_k)
+    results = await search_quran(query, top_k)
     
     if results:
         return results[0]  # Return the top result
@@ -2,10 +2,17 @@
 YouTube AI Service - Personalized Islamic Video Search
 Uses Groq AI to extract keywords from user prompts and search YouTube
 """
+import asyncio
 import json
-import httpx
+from bm25_index import BM25Index
+from http_clients import get_http_client
+from llm_client import chat_completion
+from llm_cache import CACHE_DETERMINISTIC
+from query_cache import normalize_query
+from single_flight import single_flight
+from youtube_cache import youtube_search_cache
 import os
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -24,6 +31,7 @@ class YouTubeAIService:
     """Service for AI-powered personalized YouTube video search"""
 
     @staticmethod
+    @single_flight("youtube_keywords", key=lambda user_prompt: user_prompt.strip())
     async def extract_keywords_from_prompt(user_prompt: str) -> Dict:
         """
         Use Groq AI to extract Islamic topic keywords from user's prompt
@@ -56,57 +64,53 @@ Make sure the search_query includes words like "Islamic", "Quran", "Hadith", "Is
 Provide keywords and a YouTube search query that will find relevant Islamic educational content."""
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    GROQ_API_URL,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {GROQ_API_KEY}"
-                    },
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message}
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 300
+            ai_response = await chat_completion(
+                "groq",
+                GROQ_API_URL,
+                GROQ_API_KEY,
+                {
+                    "model": "llama-3.3-70b-versatile",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    "temperature": 0.7,
+                    "max_tokens": 300
+                },
+                timeout=30.0,
+                cache=CACHE_DETERMINISTIC
+            )
+            
+            if ai_response is not None:
+                # Clean and parse response
+                cleaned = ai_response.strip()
+                if cleaned.startswith("```json"):
+                    cleaned = cleaned[7:]
+                if cleaned.startswith("```"):
+                    cleaned = cleaned[3:]
+                if cleaned.endswith("```"):
+                    cleaned = cleaned[:-3]
+                cleaned = cleaned.strip()
+                
+                try:
+                    data = json.loads(cleaned)
+                    return {
+                        "main_topic": data.get("main_topic", "Islamic Guidance"),
+                        "keywords": data.get("keywords", []),
+                        "search_query": data.get("search_query", "Islamic wisdom Quran Hadith"),
+                        "success": True
+                    }
+                except json.JSONDecodeError:
+                    # Fallback if JSON parsing fails
+                    return {
+                        "main_topic": "Islamic Content",
+                        "keywords": ["Islam", "Quran", "Hadith"],
+                        "search_query": f"{user_prompt} Islamic wisdom",
+                        "success": False
                     }
-                )
+            else:
+                return YouTubeAIService.get_default_keywords()
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    ai_response = result["choices"][0]["message"]["content"]
-                    
-                    # Clean and parse response
-                    cleaned = ai_response.strip()
-                    if cleaned.startswith("```json"):
-                        cleaned = cleaned[7:]
-                    if cleaned.startswith("```"):
-                        cleaned = cleaned[3:]
-                    if cleaned.endswith("```"):
-                        cleaned = cleaned[:-3]
-                    cleaned = cleaned.strip()
-                    
-                    try:
-                        data = json.loads(cleaned)
-                        return {
-                            "main_topic": data.get("main_topic", "Islamic Guidance"),
-                            "keywords": data.get("keywords", []),
-                            "search_query": data.get("search_query", "Islamic wisdom Quran Hadith"),
-                            "success": True
-                        }
-                    except json.JSONDecodeError:
-                        # Fallback if JSON parsing fails
-                        return {
-                            "main_topic": "Islamic Content",
-                            "keywords": ["Islam", "Quran", "Hadith"],
-                            "search_query": f"{user_prompt} Islamic wisdom",
-                            "success": False
-                        }
-                else:
-                    return YouTubeAIService.get_default_keywords()
-                    
         except Exception as e:
             print(f"Error extracting keywords: {str(e)}")
             return YouTubeAIService.get_default_keywords()
@@ -114,7 +118,7 @@ Provide keywords and a YouTube search query that will find relevant Islamic educ
     @staticmethod
     async def search_youtube_videos(search_query: str, max_results: int = 6) -> List[Dict]:
         """
-        Search YouTube for videos using the provided query
+        Search YouTube for videos using the provided query (cached, see youtube_cache.py)
         Returns: List of video data with title, description, thumbnail, video URL
         """
         
@@ -122,44 +126,57 @@ Provide keywords and a YouTube search query that will find relevant Islamic educ
             return []
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(
-                    YOUTUBE_API_URL,
-                    params={
-                        "part": "snippet",
-                        "q": search_query,
-                        "type": "video",
-                        "maxResults": max_results,
-                        "relevanceLanguage": "en",
-                        "order": "relevance",
-                        "key": YOUTUBE_API_KEY
-                    }
-                )
+            return await youtube_search_cache.search(
+                "ai_search", search_query, max_results, YouTubeAIService._fetch_youtube_videos
+            )
+        except Exception as e:
+            print(f"Error searching YouTube: {str(e)}")
+            return []
+
+    @staticmethod
+    @single_flight("youtube_search", key=lambda search_query, max_results=6: (normalize_query(search_query), max_results), timeout=20.0)
+    async def _fetch_youtube_videos(search_query: str, max_results: int = 6) -> List[Dict]:
+        """Call the YouTube Data API search endpoint; [] on errors"""
+        try:
+            client = get_http_client("youtube")
+            response = await client.get(
+                YOUTUBE_API_URL,
+                timeout=30.0,
+                params={
+                    "part": "snippet",
+                    "q": search_query,
+                    "type": "video",
+                    "maxResults": max_results,
+                    "relevanceLanguage": "en",
+                    "order": "relevance",
+                    "key": YOUTUBE_API_KEY
+                }
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                videos = []
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    videos = []
-                    
-                    for item in data.get("items", []):
-                        snippet = item.get("snippet", {})
-                        video_id = item.get("id", {}).get("videoId")
-                        
-                        if video_id:
-                            videos.append({
-                                "video_id": video_id,
-                                "title": snippet.get("title", ""),
-                                "description": snippet.get("description", ""),
-                                "thumbnail": snippet.get("thumbnails", {}).get("medium", {}).get("url", ""),
-                                "channel": snippet.get("channelTitle", ""),
-                                "published_at": snippet.get("publishedAt", ""),
-                                "url": f"https://www.youtube.com/watch?v={video_id}"
-                            })
-                    
-                    return videos
-                else:
-                    print(f"YouTube API error: {response.status_code}")
-                    return []
+                for item in data.get("items", []):
+                    snippet = item.get("snippet", {})
+                    video_id = item.get("id", {}).get("videoId")
                     
+                    if video_id:
+                        videos.append({
+                            "video_id": video_id,
+                            "title": snippet.get("title", ""),
+                            "description": snippet.get("description", ""),
+                            "thumbnail": snippet.get("thumbnails", {}).get("medium", {}).get("url", ""),
+                            "channel": snippet.get("channelTitle", ""),
+                            "published_at": snippet.get("publishedAt", ""),
+                            "url": f"https://www.youtube.com/watch?v={video_id}"
+                        })
+                
+                return videos
+            else:
+                print(f"YouTube API error: {response.status_code}")
+                return []
+                
         except Exception as e:
             print(f"Error searching YouTube: {str(e)}")
             return []
@@ -188,6 +205,92 @@ Provide keywords and a YouTube search query that will find relevant Islamic educ
             "ai_generated": True
         }
 
+    @staticmethod
+    def get_local_keywords(user_prompt: str) -> Dict:
+        """
+        Derive keywords without an LLM call: the best matching entry of
+        LOCAL_TOPICS, or get_default_keywords() when nothing matches
+        """
+        hits = _TOPIC_INDEX.search(user_prompt, top_k=1)
+        if not hits:
+            return YouTubeAIService.get_default_keywords()
+        topic = LOCAL_TOPICS[hits[0][0]]
+        return {
+            "main_topic": topic["main_topic"],
+            "keywords": list(topic["keywords"]),
+            "search_query": topic["search_query"],
+            "success": False
+        }
+
+    @staticmethod
+    async def stream_personalized_videos(user_prompt: str, max_results: int = 6) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Pipelined search: a YouTube search for the locally derived query starts
+        at once, while the Groq keyword extraction and its YouTube search run
+        alongside it.
+        
+        Yields (event, data) pairs:
+            local     {"main_topic", "keywords", "search_query", "videos"} - local query results
+            ai        the same fields for the AI-refined query
+            complete  the merged result, same shape as search_personalized_videos()
+        local and ai arrive in whichever order they finish. When the AI query
+        matches the local one, its search is shared and ai repeats local's videos.
+        """
+        local_keywords = YouTubeAIService.get_local_keywords(user_prompt)
+        local_search = asyncio.ensure_future(
+            YouTubeAIService.search_youtube_videos(local_keywords["search_query"], max_results=max_results)
+        )
+
+        async def ai_search():
+            keywords = await YouTubeAIService.extract_keywords_from_prompt(user_prompt)
+            if normalize_query(keywords["search_query"]) == normalize_query(local_keywords["search_query"]):
+                videos = await asyncio.shield(local_search)
+            else:
+                videos = await YouTubeAIService.search_youtube_videos(keywords["search_query"], max_results=max_results)
+            return keywords, videos
+
+        pending = {local_search: "local", asyncio.ensure_future(ai_search()): "ai"}
+        results = {}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = pending.pop(task)
+                    if stage == "local":
+                        keywords, videos = local_keywords, task.result()
+                    else:
+                        keywords, videos = task.result()
+                    results[stage] = (keywords, videos)
+                    yield stage, {
+                        "main_topic": keywords["main_topic"],
+                        "keywords": keywords["keywords"],
+                        "search_query": keywords["search_query"],
+                        "videos": videos
+                    }
+        finally:
+            for task in pending:
+                task.cancel()
+
+        ai_keywords, ai_videos = results["ai"]
+        _, local_videos = results["local"]
+        videos = merge_video_results(ai_videos, local_videos, max_results)
+        yield "complete", {
+            "main_topic": ai_keywords["main_topic"],
+            "keywords": ai_keywords["keywords"],
+            "search_query": ai_keywords["search_query"],
+            "local_search_query": local_keywords["search_query"],
+            "videos": videos,
+            "video_count": len(videos),
+            "ai_generated": bool(ai_keywords.get("success"))
+        }
+
+    @staticmethod
+    async def search_personalized_videos_pipelined(user_prompt: str, max_results: int = 6) -> Dict:
+        """search_personalized_videos() with the local and AI searches run concurrently"""
+        async for event, data in YouTubeAIService.stream_personalized_videos(user_prompt, max_results):
+            if event == "complete":
+                return data
+
     @staticmethod
     def get_default_keywords() -> Dict:
         """Return default keywords if AI fails"""
@@ -197,3 +300,36 @@ Provide keywords and a YouTube search query that will find relevant Islamic educ
             "search_query": "Islamic wisdom Quran Hadith teachings",
             "success": False
         }
+
+
+def merge_video_results(primary: List[Dict], secondary: List[Dict], max_results: int) -> List[Dict]:
+    """primary's videos first, then secondary's, without duplicate video ids"""
+    merged = []
+    seen = set()
+    for video in primary + secondary:
+        if video["video_id"] in seen:
+            continue
+        seen.add(video["video_id"])
+        merged.append(video)
+    return merged[:max_results]
+
+
+# Topics for get_local_keywords(): searched by their keywords with BM25.
+# Ties go to the earlier entry, so situations (grief, illness) come before relationships
+LOCAL_TOPICS = [
+    {"main_topic": "Patience", "keywords": ["patience", "sabr", "hardship", "trials", "test"], "search_query": "Islamic patience sabr in hardship Quran"},
+    {"main_topic": "Anxiety & Worry", "keywords": ["anxiety", "worry", "stress", "fear", "depression", "sad"], "search_query": "Islamic advice anxiety and worry Quran"},
+    {"main_topic": "Marriage", "keywords": ["marriage", "spouse", "husband", "wife", "nikah", "wedding"], "search_query": "Islamic marriage guidance Quran"},
+    {"main_topic": "Anger Management", "keywords": ["anger", "angry", "temper", "rage", "control"], "search_query": "Islamic anger management hadith"},
+    {"main_topic": "Financial Hardship", "keywords": ["money", "debt", "job", "rizq", "poverty", "finances", "work"], "search_query": "Islamic financial wisdom rizq Quran"},
+    {"main_topic": "Grief & Loss", "keywords": ["death", "grief", "loss", "died", "mourning", "funeral"], "search_query": "Islamic reminder grief and loss of loved ones"},
+    {"main_topic": "Repentance", "keywords": ["sin", "forgiveness", "repentance", "tawbah", "guilt", "mistake"], "search_query": "Islamic repentance tawbah forgiveness Quran"},
+    {"main_topic": "Prayer", "keywords": ["prayer", "salah", "pray", "namaz", "khushu", "mosque"], "search_query": "Islamic lecture salah prayer khushu"},
+    {"main_topic": "Ramadan & Fasting", "keywords": ["ramadan", "fasting", "fast", "suhoor", "iftar", "laylatul", "qadr"], "search_query": "Ramadan fasting Islamic reminder"},
+    {"main_topic": "Health & Illness", "keywords": ["sick", "illness", "health", "disease", "pain", "hospital"], "search_query": "Islamic reminder patience in illness"},
+    {"main_topic": "Parents & Family", "keywords": ["parents", "mother", "father", "family", "children", "siblings"], "search_query": "Islamic rights of parents and family hadith"},
+    {"main_topic": "Gratitude", "keywords": ["gratitude", "thankful", "shukr", "blessings", "grateful"], "search_query": "Islamic gratitude shukr Quran"},
+    {"main_topic": "Faith & Purpose", "keywords": ["faith", "iman", "doubt", "purpose", "meaning", "lost"], "search_query": "Islamic lecture strengthening iman faith"},
+    {"main_topic": "Loneliness", "keywords": ["lonely", "alone", "loneliness", "isolated", "friends"], "search_query": "Islamic advice loneliness Allah is near"},
+]
+_TOPIC_INDEX = BM25Index([" ".join(topic["keywords"]) + " " + topic["main_topic"] for topic in LOCAL_TOPICS])
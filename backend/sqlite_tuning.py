@@ -0,0 +1,97 @@
+"""
+SQLite Tuning - WAL, per-connection pragmas and a single writer connection
+
+With SQLite's default rollback journal a committing writer locks out every
+reader, and concurrent writers queue on the busy timeout for the file lock.
+The tuned profile (opt in with SQLITE_PROFILE=tuned, see database.py):
+
+- runs every connection in WAL mode with synchronous=NORMAL, a busy timeout,
+  a larger page cache, memory-mapped reads and in-memory temp tables
+  (applied on connect through an engine event);
+- gives sessions two engines: a pooled read engine, and a write engine with
+  exactly one connection whose transactions start with BEGIN IMMEDIATE.
+  Writers queue for that connection instead of racing for the file lock,
+  and in WAL mode readers never wait for them.
+
+RoutingSession sends INSERT/UPDATE/DELETE statements and flushes to the
+writer; once a transaction has written, its reads go to the writer too, so
+it sees its own changes. Keep write transactions short: a session holds the
+writer from its first write until commit/rollback, so never await while one
+is open.
+"""
+import os
+from typing import Tuple
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # ms
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "65536"))  # KiB of page cache per connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+
+
+def apply_pragmas(dbapi_connection, connection_record=None):
+    """Tuning pragmas; run on every new connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def _begin_immediate_on_connect(dbapi_connection, connection_record):
+    # Let SQLAlchemy, not the sqlite3 module, decide when transactions begin
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    # Take the write lock up front: waiting on busy_timeout beats failing on lock upgrade
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def create_sqlite_engines(url: str) -> Tuple[Engine, Engine]:
+    """(read engine, write engine) for a SQLite database, both tuned"""
+    connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000}
+    read_engine = create_engine(url, connect_args=connect_args)
+    write_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=max(SQLITE_BUSY_TIMEOUT / 1000, 1),
+    )
+    for engine in (read_engine, write_engine):
+        event.listen(engine, "connect", apply_pragmas)
+    event.listen(write_engine, "connect", _begin_immediate_on_connect)
+    event.listen(write_engine, "begin", _begin_immediate)
+    return read_engine, write_engine
+
+
+class RoutingSession(Session):
+    """Session reading from `bind` and writing through `write_bind`"""
+
+    def __init__(self, *args, write_bind: Engine = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_bind = write_bind
+        self._wrote = False
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self.write_bind is None:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        if self._wrote or self._flushing or getattr(clause, "is_dml", False):
+            self._wrote = True
+            return self.write_bind
+        return self.bind
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    # The next transaction reads from the read engine again
+    if transaction.parent is None:
+        session._wrote = False
@@ -0,0 +1,30 @@
+"""Tests for the compact catalog prompt sent by analyze_prompt_with_ai"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import services_ai_analyzer
+from services_ai_analyzer import AIAnalyzerService, build_catalog_message
+
+
+def test_message_lists_only_matching_candidates():
+    message = build_catalog_message("I am in debt and can't pay my bills", top_n=3)
+    debt_verse = next(i + 1 for i, a in enumerate(AIAnalyzerService.QURAN_AYAHS) if "debt" in a["keywords"])
+    assert f"\n{debt_verse} | " in message
+    candidate_lines = [line for line in message.splitlines() if " | " in line]
+    assert len(candidate_lines) <= 6
+
+
+def test_unmatched_question_falls_back_to_full_catalog():
+    message = build_catalog_message("xyzzy")
+    candidate_lines = [line for line in message.splitlines() if " | " in line]
+    assert len(candidate_lines) == len(AIAnalyzerService.QURAN_AYAHS) + len(AIAnalyzerService.HADITHS)
+
+
+def test_prompt_is_much_smaller_than_the_full_catalog():
+    full_catalog = sum(
+        len(a["translation"]) + len(", ".join(a["keywords"])) for a in AIAnalyzerService.QURAN_AYAHS
+    ) + sum(len(h["text_en"]) + len(", ".join(h["keywords"])) for h in AIAnalyzerService.HADITHS)
+    prompt = services_ai_analyzer.ANALYZER_SYSTEM_PROMPT + build_catalog_message("my wife and I argue about money")
+    assert len(prompt) * 3 < full_catalog
@@ -0,0 +1,76 @@
+"""Tests for the app's chat unread counters (app/services/chat_service.py)"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+
+@pytest.fixture
+def chat(monkeypatch, tmp_path):
+    """(ChatService, Chat, ChatMessage, session factory) on a fresh SQLite file"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    service = importlib.import_module("app.services.chat_service")
+    database = importlib.import_module("app.database")
+    importlib.import_module("app.models.imam")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    database.Base.metadata.create_all(bind=engine)
+    return service.ChatService, service.Chat, service.ChatMessage, sessionmaker(bind=engine)
+
+
+def _chat_with_unread(ChatService, Chat, ChatMessage, db, count=3):
+    chat = Chat(imam_id=1, user_email="u@x.com", title="patience")
+    db.add(chat)
+    db.flush()
+    ids = []
+    for i in range(count):
+        message = ChatMessage(chat_id=chat.id, sender_type="user", sender_id="u@x.com", message=f"m{i}")
+        db.add(message)
+        db.flush()
+        ChatService.record_message(db, message)
+        ids.append(message.id)
+    db.commit()
+    return chat.id, ids
+
+
+def test_mark_read_decrements_once(chat):
+    ChatService, Chat, ChatMessage, Session = chat
+    db = Session()
+    chat_id, ids = _chat_with_unread(ChatService, Chat, ChatMessage, db)
+
+    ChatService.mark_messages_read(db, ids[:2])
+    db.commit()
+    ChatService.mark_messages_read(db, ids[:2])
+    db.commit()
+    assert db.get(Chat, chat_id).unread_for_imam == 1
+
+
+def test_concurrent_mark_read_does_not_double_decrement(chat):
+    """A second caller flips the same messages between our lookup and our UPDATE"""
+    ChatService, Chat, ChatMessage, Session = chat
+    db, other = Session(), Session()
+    chat_id, ids = _chat_with_unread(ChatService, Chat, ChatMessage, db)
+    engine = db.get_bind()
+
+    raced = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE chat_messages") and not raced:
+            raced.append(True)
+            ChatService.mark_messages_read(other, ids[:2])
+            other.commit()
+
+    ChatService.mark_messages_read(db, ids[:2])
+    db.commit()
+    event.remove(engine, "before_cursor_execute", race)
+
+    assert raced
+    db.expire_all()
+    assert db.get(Chat, chat_id).unread_for_imam == 1
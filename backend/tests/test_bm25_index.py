@@ -0,0 +1,108 @@
+"""Tests for the BM25 keyword index and hybrid (BM25 + dense) Quran search"""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import embedding_store
+import services_quran_search as qs
+import vector_index
+from bm25_index import BM25Index, normalize_arabic, reciprocal_rank_fusion, tokenize
+
+
+def test_arabic_normalization_strips_diacritics_and_unifies_letters():
+    assert normalize_arabic("الصَّبْرُ") == "الصبر"
+    assert normalize_arabic("إِنَّ ٱللَّهَ") == "ان الله"
+    assert normalize_arabic("رَحْمَةٌ عَلَىٰ") == "رحمه علي"
+    assert normalize_arabic("صــبر") == "صبر"
+
+
+def test_tokenize_drops_stopwords_and_stems_plurals():
+    assert tokenize("I am feeling the worries of debts") == ["worry", "debt"]
+
+
+def test_bm25_ranks_rarer_terms_higher():
+    index = BM25Index([
+        "patience in hardship",
+        "patience and prayer",
+        "relief from debt and hardship",
+    ])
+    results = index.search("debt patience", top_k=3)
+    assert results[0][0] == 2
+    assert {doc_id for doc_id, _ in results} == {0, 1, 2}
+    assert index.search("unrelated", top_k=3) == []
+
+
+def test_bm25_matches_arabic_with_and_without_diacritics():
+    index = BM25Index(["وَاصْبِرْ إِنَّ ٱللَّهَ مَعَ ٱلصَّابِرِينَ", "فَإِنَّ مَعَ الْعُسْرِ يُسْرًا"])
+    assert index.search("الصابرين", top_k=1)[0][0] == 0
+    assert index.search("العسر", top_k=1)[0][0] == 1
+
+
+def test_bm25_ties_are_broken_by_doc_id_under_any_hash_seed():
+    index = BM25Index(["mother hospital visit", "hospital mother care", "unrelated text"])
+    assert [doc_id for doc_id, _ in index.search("my mother is in hospital")] == [0, 1]
+
+    script = (
+        "from bm25_index import BM25Index;"
+        "docs = ['parents mother father', 'illness hospital sick', 'mother care', 'hospital visit'];"
+        "print(BM25Index(docs).search('my mother is in hospital', 4))"
+    )
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], cwd=Path(__file__).parent.parent, capture_output=True, text=True,
+            env={**os.environ, "PYTHONHASHSEED": str(seed)}, check=True,
+        ).stdout
+        for seed in range(6)
+    }
+    assert len(outputs) == 1
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+    assert [doc_id for doc_id, _ in fused][:2] == [1, 3]
+    assert {doc_id for doc_id, _ in fused} == {1, 2, 3, 4}
+
+
+def test_keyword_fallback_without_model(monkeypatch):
+    monkeypatch.setattr(qs, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+    search = qs.QuranSemanticSearch()
+    assert not search.semantic_enabled
+
+    results = search.search("I have so much debt and bills", top_k=3)
+    assert results[0]["reference"].startswith("Quran 2:280")
+    assert results[0]["score"] >= 0.25
+    assert search.search("xyzzy", top_k=3) == []
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        search._keyword_search("worried about my job and money", top_k=3)
+    assert (time.perf_counter() - started) / 1000 < 0.001
+
+
+def test_hybrid_search_surfaces_keyword_hits(monkeypatch, tmp_path):
+    monkeypatch.setattr(qs, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+    monkeypatch.setattr(qs, "np", np)
+    search = qs.QuranSemanticSearch()
+
+    # Dense vectors that know nothing useful: verse 0 always wins on cosine
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((len(search.database), 16)).astype(np.float32)
+    query = embeddings[0].copy()
+    search.store = embedding_store.EmbeddingStore.build(tmp_path / "e.npy", embeddings, "test-model", "checksum")
+    search.index = vector_index.FlatIndex(search.store)
+
+    dense_only = search.search_by_embedding(query, top_k=1)
+    hybrid = search.search_by_embedding(query, top_k=2, query="debt bills postpone loan")
+
+    assert dense_only[0]["reference"] == hybrid[0]["reference"] or \
+        hybrid[1]["reference"] == dense_only[0]["reference"]
+    assert any(r["reference"].startswith("Quran 2:280") for r in hybrid)
+    # Reported scores stay cosine similarities
+    for result in hybrid:
+        assert -1.0 <= result["score"] <= 1.0
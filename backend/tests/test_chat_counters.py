@@ -0,0 +1,107 @@
+"""Tests for the maintained conversation counters and their reconciliation"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models_extended import Conversation, Imam, Message
+from services_chat import ChatService
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def _conversation(db):
+    imam = Imam(name="Imam Ahmad", email="imam@mosque.local")
+    db.add(imam)
+    db.flush()
+    conv = Conversation(user_email="u@x.com", imam_id=imam.id, topic="patience")
+    db.add(conv)
+    db.commit()
+    return conv
+
+
+def test_send_and_read_maintain_counters(tmp_path):
+    _, db = _session(tmp_path)
+    conv = _conversation(db)
+
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "Assalamu alaikum")
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "I need advice")
+    ChatService.send_message(db, conv.id, "imam@mosque.local", "imam", "Wa alaikum assalam, go ahead " + "x" * 200)
+    db.refresh(conv)
+    assert (conv.unread_for_imam, conv.unread_for_user) == (2, 1)
+    assert conv.last_message_preview.startswith("Wa alaikum") and len(conv.last_message_preview) == ChatService.PREVIEW_LENGTH
+
+    updated_at = conv.updated_at
+    ChatService.mark_read(db, conv.id, "imam")
+    db.commit()
+    db.refresh(conv)
+    assert conv.unread_for_imam == 0
+    assert conv.updated_at == updated_at
+
+    # A user reply marks the imam's messages read
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "Jazakallah")
+    db.refresh(conv)
+    assert (conv.unread_for_imam, conv.unread_for_user) == (1, 0)
+    assert ChatService.reconcile_counters(db) == 0
+
+
+def test_mark_read_keeps_increments_it_did_not_read(tmp_path):
+    """A +1 committed by record_message whose row this UPDATE does not see stays counted"""
+    _, db = _session(tmp_path)
+    conv = _conversation(db)
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "first")
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "second")
+    # As if a third message's counter update landed after mark_read's message UPDATE
+    db.query(Conversation).filter(Conversation.id == conv.id).update({"unread_for_imam": 3})
+    db.commit()
+
+    ChatService.mark_read(db, conv.id, "imam")
+    db.commit()
+    db.refresh(conv)
+    assert conv.unread_for_imam == 1
+
+    ChatService.mark_read(db, conv.id, "imam")
+    db.commit()
+    db.refresh(conv)
+    assert conv.unread_for_imam == 1
+
+
+def test_inbox_is_one_statement(tmp_path):
+    engine, db = _session(tmp_path)
+    conv = _conversation(db)
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "hello")
+    db.expire_all()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    inbox, next_cursor = ChatService.get_inbox(db, user_email="u@x.com")
+    assert len(statements) == 1
+    assert [(c.id, name, c.unread_for_imam) for c, name in inbox] == [(conv.id, "Imam Ahmad", 1)]
+    assert next_cursor is None
+
+
+def test_reconcile_repairs_drift(tmp_path):
+    _, db = _session(tmp_path)
+    conv = _conversation(db)
+    ChatService.send_message(db, conv.id, "u@x.com", "user", "first")
+    # Written without going through ChatService: counters drift
+    db.add(Message(conversation_id=conv.id, sender_type="imam", message_text="reply", is_read=False,
+                   created_at=datetime.utcnow() + timedelta(minutes=1)))
+    conv.unread_for_imam = 7
+    db.commit()
+    updated_at = conv.updated_at
+
+    assert ChatService.reconcile_counters(db) == 1
+    db.refresh(conv)
+    assert (conv.unread_for_imam, conv.unread_for_user, conv.last_message_preview) == (1, 1, "reply")
+    assert conv.updated_at == updated_at
+    assert ChatService.reconcile_counters(db) == 0
@@ -0,0 +1,128 @@
+"""Tests for the LLM provider circuit breaker (fake clock, no network)"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import circuit_breaker
+import llm_client
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from services_dua import DuaService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock, **kwargs):
+    options = dict(window_seconds=60, min_calls=4, error_rate=0.5, p95_seconds=5, open_seconds=30)
+    options.update(kwargs)
+    return CircuitBreaker("test", clock=clock, **options)
+
+
+def _fail(breaker):
+    with pytest.raises(RuntimeError):
+        with breaker.track():
+            raise RuntimeError("upstream down")
+
+
+def test_opens_on_error_rate_and_rejects_fast():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    with breaker.track():
+        pass
+    for _ in range(3):
+        _fail(breaker)
+
+    assert breaker.state == circuit_breaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        with breaker.track():
+            raise AssertionError("provider must not be called while open")
+    assert breaker.get_state()["rejected"] == 1
+
+
+def test_opens_on_p95_latency():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        with breaker.track():
+            clock.now += 8  # slow but successful
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_bad_status_counts_as_failure():
+    breaker = _breaker(FakeClock(), min_calls=2)
+    for _ in range(2):
+        with breaker.track() as call:
+            call.fail()
+    assert breaker.state == circuit_breaker.OPEN
+
+
+def test_old_calls_leave_the_window():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(3):
+        _fail(breaker)
+    clock.now += 120
+    with breaker.track():
+        pass
+    assert breaker.state == circuit_breaker.CLOSED
+    assert breaker.get_state()["window_calls"] == 1
+
+
+def test_half_open_trial_closes_or_reopens():
+    clock = FakeClock()
+    breaker = _breaker(clock, min_calls=1)
+    _fail(breaker)
+    assert breaker.state == circuit_breaker.OPEN
+
+    clock.now += 31
+    assert breaker.allow() is True  # the single trial request
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    assert breaker.allow() is False  # others keep using the fallback
+    breaker.record(False, 0.1)
+    assert breaker.state == circuit_breaker.OPEN
+
+    clock.now += 31
+    with breaker.track():
+        pass
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_check_rejects_like_allow_without_admitting_a_call():
+    clock = FakeClock()
+    breaker = _breaker(clock, min_calls=1)
+    breaker.check()
+    _fail(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    clock.now += 31
+    breaker.check()  # half-open: the trial is still free
+    with breaker.track():
+        with pytest.raises(CircuitOpenError):
+            breaker.check()  # ...until a trial is in flight
+    assert breaker.state == circuit_breaker.CLOSED
+
+
+def test_open_circuit_serves_dua_fallback_without_calling_groq(monkeypatch):
+    class ExplodingClient:
+        async def post(self, *args, **kwargs):
+            raise AssertionError("Groq must not be called while the circuit is open")
+
+    breaker = _breaker(FakeClock(), min_calls=1)
+    _fail(breaker)
+    monkeypatch.setattr(llm_client.llm_cache, "enabled", False)
+    monkeypatch.setattr(llm_client, "get_breaker", lambda name: breaker)
+    monkeypatch.setattr(llm_client, "get_http_client", lambda name: ExplodingClient())
+
+    result = asyncio.run(DuaService.generate_dua("Health Issues", "my mother is sick"))
+    assert result["ai_generated"] is False
+    assert "my mother is sick" in result["dua_text_en"]
@@ -0,0 +1,69 @@
+"""Tests for ChatService.get_conversation_summaries (one statement, no N+1)"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models_extended import Conversation, Imam, Message
+from services_chat import ChatService
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+
+def _seed(db, conversations=20):
+    imam = Imam(name="Imam Ahmad", email="imam@mosque.local")
+    db.add(imam)
+    db.flush()
+    start = datetime(2026, 3, 1)
+    for i in range(conversations):
+        conv = Conversation(user_email="u@x.com" if i % 2 == 0 else "v@x.com", imam_id=imam.id,
+                            topic=f"topic {i}", updated_at=start + timedelta(hours=i))
+        db.add(conv)
+        db.flush()
+        for j in range(3):
+            db.add(Message(conversation_id=conv.id, sender_type="user", message_text=f"q{i}-{j}",
+                           is_read=j == 0, created_at=start + timedelta(hours=i, minutes=j)))
+        db.add(Message(conversation_id=conv.id, sender_type="imam", message_text=f"answer {i}",
+                       is_read=False, created_at=start + timedelta(hours=i, minutes=5)))
+    db.add(Conversation(user_email="u@x.com", imam_id=imam.id, topic="empty", updated_at=start - timedelta(days=1)))
+    db.commit()
+    return imam
+
+
+def test_summaries_use_one_statement(tmp_path):
+    engine, db = _session(tmp_path)
+    _seed(db)
+    db.expire_all()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    summaries = ChatService.get_conversation_summaries(db)
+    assert len(statements) == 1
+    assert len(summaries) == 21
+
+    newest = summaries[0]
+    assert newest["conversation"].topic == "topic 19"
+    assert newest["imam_name"] == "Imam Ahmad"
+    assert newest["last_message"] == "answer 19"
+    assert newest["unread_from_user"] == 2 and newest["unread_from_imam"] == 1
+
+    empty = summaries[-1]
+    assert empty["last_message"] is None and empty["unread_from_user"] == 0
+
+
+def test_filters_by_user_and_imam(tmp_path):
+    _, db = _session(tmp_path)
+    imam = _seed(db)
+    assert len(ChatService.get_conversation_summaries(db, user_email="v@x.com")) == 10
+    assert len(ChatService.get_conversation_summaries(db, user_email="u@x.com")) == 11
+    assert len(ChatService.get_conversation_summaries(db, imam_id=imam.id)) == 21
+    assert ChatService.get_conversation_summaries(db, imam_id=imam.id + 1) == []
@@ -0,0 +1,266 @@
+"""Tests for the asynchronous dua job queue (no network: generation is faked)"""
+import asyncio
+import socket
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import callback_urls
+import dua_jobs
+from database import Base
+from callback_urls import UnsafeCallbackURLError, check_callback_url
+from dua_jobs import DuaJobQueue, JobQueueFullError
+from models_extended import DuaHistory, DuaJob
+
+
+def _session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def dns(monkeypatch):
+    """Fake resolver: host -> address, editable by the test"""
+    records = {"example.com": "93.184.216.34"}
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host not in records:
+            raise socket.gaierror("unknown host")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (records[host], port))]
+
+    monkeypatch.setattr(callback_urls.socket, "getaddrinfo", getaddrinfo)
+    return records
+
+
+async def _fake_generate(category, context):
+    await asyncio.sleep(0)
+    return {"dua_text_en": f"O Allah, help with {context}", "dua_text_ar": "اللهم", "how_to_use_en": "", "how_to_use_ar": ""}
+
+
+async def _wait_finished(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job.status in ("succeeded", "failed"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_runs_and_writes_history(tmp_path):
+    factory = _session_factory(tmp_path)
+    queue = DuaJobQueue(session_factory=factory, generate=_fake_generate, workers=2)
+
+    async def run():
+        submitted = await queue.submit("a@b.com", "Health Issues", "my exam")
+        assert submitted["status"] == "pending"
+        job = await _wait_finished(queue, submitted["job_id"])
+        await queue.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "succeeded"
+    assert job.result["dua_text_en"] == "O Allah, help with my exam"
+
+    db = factory()
+    history = db.query(DuaHistory).filter(DuaHistory.id == job.history_id).one()
+    assert history.email == "a@b.com" and history.context == "my exam"
+    db.close()
+
+
+def test_failed_generation_is_recorded(tmp_path):
+    async def broken(category, context):
+        raise RuntimeError("LLM down")
+
+    queue = DuaJobQueue(session_factory=_session_factory(tmp_path), generate=broken, workers=1)
+
+    async def run():
+        submitted = await queue.submit("a@b.com", "Health Issues", "x")
+        job = await _wait_finished(queue, submitted["job_id"])
+        await queue.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "failed" and job.error == "LLM down" and job.history_id is None
+
+
+def test_job_is_claimed_only_once(tmp_path):
+    calls = []
+
+    async def counting(category, context):
+        calls.append(context)
+        return await _fake_generate(category, context)
+
+    factory = _session_factory(tmp_path)
+    db = factory()
+    db.add(DuaJob(id="job1", status="pending", email="a@b.com", category="c", context="x", attempts=0))
+    db.commit()
+    db.close()
+
+    queue = DuaJobQueue(session_factory=factory, generate=counting)
+
+    async def run():
+        await asyncio.gather(queue.run_job("job1"), queue.run_job("job1"))
+
+    asyncio.run(run())
+    assert calls == ["x"]
+    assert queue.get("job1").attempts == 1
+
+
+def test_start_requeues_pending_jobs(tmp_path):
+    factory = _session_factory(tmp_path)
+    db = factory()
+    db.add(DuaJob(id="left-over", status="pending", email="a@b.com", category="c", context="x", attempts=0))
+    db.commit()
+    db.close()
+
+    queue = DuaJobQueue(session_factory=factory, generate=_fake_generate, workers=1)
+
+    async def run():
+        await queue.start()
+        job = await _wait_finished(queue, "left-over")
+        await queue.stop()
+        return job
+
+    assert asyncio.run(run()).status == "succeeded"
+
+
+def test_submit_rejects_when_full(tmp_path):
+    queue = DuaJobQueue(session_factory=_session_factory(tmp_path), generate=_fake_generate, max_pending=1)
+
+    async def run():
+        await queue.submit("a@b.com", "c", "first")
+        try:
+            await queue.submit("a@b.com", "c", "second")
+        except JobQueueFullError:
+            return True
+        finally:
+            await queue.stop()
+        return False
+
+    assert asyncio.run(run())
+
+
+class FakeClient:
+    def __init__(self, posted):
+        self.posted = posted
+
+    async def post(self, url, json=None, timeout=None, follow_redirects=True):
+        assert follow_redirects is False
+        self.posted.append((url, json))
+        return type("Response", (), {"status_code": 200})()
+
+
+def test_callback_is_delivered(tmp_path, monkeypatch, dns):
+    posted = []
+
+    monkeypatch.setattr(dua_jobs, "get_http_client", lambda name: FakeClient(posted))
+    queue = DuaJobQueue(session_factory=_session_factory(tmp_path), generate=_fake_generate, workers=1)
+
+    async def run():
+        submitted = await queue.submit("a@b.com", "c", "x", callback_url="https://example.com/hook")
+        await _wait_finished(queue, submitted["job_id"])
+        for _ in range(100):
+            if queue.get(submitted["job_id"]).callback_status:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.get(submitted["job_id"])
+
+    job = asyncio.run(run())
+    assert job.callback_status == "delivered"
+    assert posted[0][0] == "https://example.com/hook"
+    assert posted[0][1]["status"] == "succeeded"
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http://localhost/hook",
+    "http://127.0.0.1:8000/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+    "http://no-such-host.invalid/hook",
+])
+def test_callback_url_must_resolve_to_public_addresses(dns, url):
+    dns["localhost"] = "127.0.0.1"
+    with pytest.raises(UnsafeCallbackURLError):
+        check_callback_url(url)
+
+
+def test_callback_url_checks(dns):
+    assert check_callback_url("https://example.com/hook") == "https://example.com/hook"
+    # Names are not resolved in the schema check, literal addresses are
+    assert check_callback_url("http://internal.corp/hook", resolve=False)
+    with pytest.raises(UnsafeCallbackURLError):
+        check_callback_url("http://127.0.0.1/hook", resolve=False)
+    # Allowlist: listed hosts and their subdomains only
+    dns["hooks.example.com"] = "93.184.216.35"
+    assert check_callback_url("https://hooks.example.com/x", allowed_hosts=["example.com"])
+    with pytest.raises(UnsafeCallbackURLError):
+        check_callback_url("https://example.org/x", allowed_hosts=["example.com"])
+    with pytest.raises(UnsafeCallbackURLError):
+        check_callback_url("https://badexample.com/x", allowed_hosts=["example.com"])
+
+
+def test_submit_rejects_private_callback(tmp_path, dns):
+    dns["internal.corp"] = "10.1.2.3"
+    queue = DuaJobQueue(session_factory=_session_factory(tmp_path), generate=_fake_generate, workers=1)
+
+    async def run():
+        try:
+            with pytest.raises(UnsafeCallbackURLError):
+                await queue.submit("a@b.com", "c", "x", callback_url="http://internal.corp/hook")
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+    assert queue.stats["submitted"] == 0
+
+
+def test_callback_is_rechecked_before_delivery(tmp_path, monkeypatch, dns):
+    posted = []
+    monkeypatch.setattr(dua_jobs, "get_http_client", lambda name: FakeClient(posted))
+    queue = DuaJobQueue(session_factory=_session_factory(tmp_path), generate=_fake_generate, workers=1)
+
+    async def run():
+        submitted = await queue.submit("a@b.com", "c", "x", callback_url="https://example.com/hook")
+        dns["example.com"] = "169.254.169.254"  # rebinding after the submit check
+        await _wait_finished(queue, submitted["job_id"])
+        for _ in range(100):
+            if queue.get(submitted["job_id"]).callback_status:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue.get(submitted["job_id"])
+
+    job = asyncio.run(run())
+    assert job.callback_status == "failed"
+    assert posted == []
+
+
+@pytest.mark.parametrize("user_type, expected", [("user", "me@x.com"), ("admin", "other@x.com")])
+def test_only_admins_submit_jobs_for_other_emails(monkeypatch, user_type, expected):
+    from routes import dua as dua_routes
+    from schemas.dua import DuaJobRequest
+
+    submitted = []
+
+    async def submit(email, category, context, callback_url=None):
+        submitted.append(email)
+        return {"job_id": "j"}
+
+    monkeypatch.setattr(dua_routes.dua_job_queue, "submit", submit)
+    request = DuaJobRequest(category="c", context="x", email="other@x.com")
+    user = SimpleNamespace(email="me@x.com", user_type=user_type)
+    asyncio.run(dua_routes.submit_dua_job(request, current_user=user))
+    assert submitted == [expected]
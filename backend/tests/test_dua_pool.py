@@ -0,0 +1,87 @@
+"""Tests for the pre-generated dua pool (no network: generation is faked)"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from dua_pool import DuaPool, in_refill_hours
+from llm_cache import CACHE_OFF
+from services_dua import DuaService
+
+CATEGORY = DuaService.DUA_CATEGORIES[0]
+
+
+def _session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+class FakeGenerator:
+    def __init__(self, fail_after=None):
+        self.calls = []
+        self.fail_after = fail_after
+
+    async def __call__(self, category, context, style=None, cache=None):
+        self.calls.append((category, style, cache))
+        if self.fail_after is not None and len(self.calls) > self.fail_after:
+            return {"dua_text_en": "template", "ai_generated": False}
+        return {
+            "dua_text_en": f"O Allah ({category}, {style})",
+            "dua_text_ar": "اللهم آمين",
+            "how_to_use_en": "After prayer.",
+            "how_to_use_ar": "بعد الصلاة.",
+            "ai_generated": True,
+        }
+
+
+def test_only_generic_requests_are_eligible(tmp_path):
+    pool = DuaPool(session_factory=_session_factory(tmp_path), generate=FakeGenerator(), max_context_words=3)
+    assert pool.eligible(CATEGORY, "")
+    assert pool.eligible(CATEGORY, "feeling anxious")
+    assert not pool.eligible(CATEGORY, "I have a job interview tomorrow and cannot sleep")
+    assert not pool.eligible("Something Else", "")
+
+
+def test_refill_fills_every_category_and_style(tmp_path):
+    generator = FakeGenerator()
+    pool = DuaPool(session_factory=_session_factory(tmp_path), generate=generator, size=2)
+    entries = len(DuaService.DUA_CATEGORIES) * len(DuaService.DUA_STYLES)
+
+    stored = asyncio.run(pool.refill(max_new=entries))
+    # One round-robin pass raises every entry by one before any gets a second dua
+    assert stored == entries
+    assert all(count == 1 for styles in pool.counts().values() for count in styles.values())
+    assert all(cache == CACHE_OFF for _, _, cache in generator.calls)
+
+    asyncio.run(pool.refill(max_new=10 * entries))
+    assert pool.deficits() == []
+
+
+def test_taken_duas_are_served_once(tmp_path):
+    pool = DuaPool(session_factory=_session_factory(tmp_path), generate=FakeGenerator(), size=1)
+    asyncio.run(pool.refill(max_new=100))
+
+    served = [pool.take(CATEGORY, "worried") for _ in range(len(DuaService.DUA_STYLES))]
+    assert all(dua["pooled"] and dua["context"] == "worried" for dua in served)
+    assert {dua["style_used"] for dua in served} == set(DuaService.DUA_STYLES)
+    assert pool.take(CATEGORY, "worried") is None
+    assert pool.stats["served"] == len(DuaService.DUA_STYLES) and pool.stats["misses"] == 1
+
+
+def test_refill_stops_at_first_fallback(tmp_path):
+    generator = FakeGenerator(fail_after=2)
+    pool = DuaPool(session_factory=_session_factory(tmp_path), generate=generator, size=1)
+    assert asyncio.run(pool.refill(max_new=10)) == 2
+    assert len(generator.calls) == 3
+
+
+def test_refill_hours():
+    assert in_refill_hours("", 14)
+    assert in_refill_hours("1-6", 3) and not in_refill_hours("1-6", 6)
+    assert in_refill_hours("22-5", 23) and in_refill_hours("22-5", 2) and not in_refill_hours("22-5", 12)
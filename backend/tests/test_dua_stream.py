@@ -0,0 +1,135 @@
+"""Tests for streaming dua generation (no network: the Groq stream is faked)"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import llm_rate_limiter
+import services_dua
+from services_dua import DuaService, JsonFieldStreamer
+
+
+class FakeStreamResponse:
+    def __init__(self, lines, status_code=200, headers=None):
+        self.lines = lines
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def aread(self):
+        return b"error"
+
+    async def aiter_lines(self):
+        for line in self.lines:
+            yield line
+
+
+class FakeClient:
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def stream(self, method, url, **kwargs):
+        self.requests.append(kwargs["json"])
+        return self.response
+
+
+def _sse_lines(content: str, chunk_size: int = 7):
+    lines = []
+    for i in range(0, len(content), chunk_size):
+        chunk = {"choices": [{"delta": {"content": content[i:i + chunk_size]}}]}
+        lines.extend([f"data: {json.dumps(chunk, ensure_ascii=False)}", ""])
+    lines.append("data: [DONE]")
+    return lines
+
+
+def _collect(category="Health Issues", context="my mother is sick"):
+    async def run():
+        return [event async for event in DuaService.stream_dua(category, context)]
+    return asyncio.run(run())
+
+
+def test_streamer_handles_split_escapes():
+    streamer = JsonFieldStreamer(["a", "b"])
+    fragments = []
+    for chunk in ['{"a": "line\\', 'nnext \\u06', '27", "b"', ': "done"}']:
+        fragments.extend(streamer.feed(chunk))
+    assert "".join(text for field, text in fragments if field == "a") == "line\nnext ا"
+    assert ("b", "done") in fragments
+
+
+def test_stream_emits_deltas_then_complete(monkeypatch):
+    dua = {
+        "dua_text_en": "O Allah, grant my mother shifa. Ameen.",
+        "dua_text_ar": "اللهم اشف أمي شفاء لا يغادر سقما. آمين",
+        "how_to_use_en": "After every prayer.",
+        "how_to_use_ar": "بعد كل صلاة.",
+    }
+    client = FakeClient(FakeStreamResponse(_sse_lines(json.dumps(dua, ensure_ascii=False))))
+    monkeypatch.setattr(services_dua, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(services_dua, "get_http_client", lambda name: client)
+
+    events = _collect()
+    assert events[0][0] == "start"
+    assert client.requests[0]["stream"] is True
+
+    deltas = [data for event, data in events if event == "delta"]
+    assert len(deltas) > 4
+    for field in DuaService.STREAM_FIELDS:
+        assert "".join(d["text"] for d in deltas if d["field"] == field) == dua[field]
+
+    event, result = events[-1]
+    assert event == "complete"
+    assert result["dua_text_ar"] == dua["dua_text_ar"] and result["ai_generated"] is True
+
+
+def test_stream_falls_back_on_api_error(monkeypatch):
+    client = FakeClient(FakeStreamResponse([], status_code=503))
+    monkeypatch.setattr(services_dua, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(services_dua, "get_http_client", lambda name: client)
+
+    events = _collect()
+    assert [event for event, _ in events][:2] == ["start", "error"]
+    event, result = events[-1]
+    assert event == "complete" and result["ai_generated"] is False
+    assert "my mother is sick" in result["dua_text_en"]
+
+
+def _record_limiter(monkeypatch):
+    calls = []
+    limiter = llm_rate_limiter.llm_rate_limiter
+    monkeypatch.setattr(limiter, "block", lambda provider, seconds: calls.append(("block", provider, seconds)))
+    monkeypatch.setattr(limiter, "adjust_tokens", lambda provider, delta: calls.append(("adjust", provider, delta)))
+    return calls
+
+
+def test_stream_429_pauses_the_provider(monkeypatch):
+    client = FakeClient(FakeStreamResponse([], status_code=429, headers={"retry-after": "7"}))
+    monkeypatch.setattr(services_dua, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(services_dua, "get_http_client", lambda name: client)
+    calls = _record_limiter(monkeypatch)
+
+    events = _collect()
+    assert calls == [("block", "groq", 7.0)]
+    assert events[-1][1]["ai_generated"] is False
+
+
+def test_stream_settles_reported_usage(monkeypatch):
+    lines = _sse_lines(json.dumps({"dua_text_en": "O Allah", "dua_text_ar": "اللهم"}))
+    usage_chunk = {"choices": [{"delta": {}}], "x_groq": {"usage": {"total_tokens": 123}}}
+    lines.insert(-1, f"data: {json.dumps(usage_chunk)}")
+    client = FakeClient(FakeStreamResponse(lines))
+    monkeypatch.setattr(services_dua, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(services_dua, "get_http_client", lambda name: client)
+    monkeypatch.setattr(llm_rate_limiter, "estimate_tokens", lambda text, max_tokens: 500)
+    calls = _record_limiter(monkeypatch)
+
+    _collect()
+    assert calls == [("adjust", "groq", 123 - 500)]
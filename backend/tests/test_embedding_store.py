@@ -0,0 +1,66 @@
+"""Tests for the memory-mapped embedding store"""
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from embedding_store import EmbeddingStore, corpus_checksum
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(1).standard_normal((50, 16)).astype(np.float32)
+
+
+def test_build_normalizes_and_memory_maps(tmp_path, embeddings):
+    store = EmbeddingStore.build(tmp_path / "e.npy", embeddings, "model-a", "abc")
+    assert isinstance(store.matrix, np.memmap)
+    assert np.allclose(np.linalg.norm(store.matrix, axis=1), 1.0, atol=1e-5)
+    assert store.header["dimension"] == 16 and store.header["count"] == 50
+
+
+def test_open_rejects_stale_store(tmp_path, embeddings):
+    EmbeddingStore.build(tmp_path / "e.npy", embeddings, "model-a", "abc")
+    assert EmbeddingStore.open(tmp_path / "e.npy", model_name="model-a", checksum="abc") is not None
+    assert EmbeddingStore.open(tmp_path / "e.npy", model_name="model-b", checksum="abc") is None
+    assert EmbeddingStore.open(tmp_path / "e.npy", model_name="model-a", checksum="changed") is None
+    assert EmbeddingStore.open(tmp_path / "missing.npy") is None
+
+
+@pytest.mark.parametrize("dtype,tolerance", [("float16", 1e-2), ("int8", 3e-2)])
+def test_compact_dtypes_score_close_to_float32(tmp_path, embeddings, dtype, tolerance):
+    exact = EmbeddingStore.build(tmp_path / "f32.npy", embeddings, "m", "c")
+    compact = EmbeddingStore.build(tmp_path / f"{dtype}.npy", embeddings, "m", "c", dtype=dtype)
+    query = embeddings[3] / np.linalg.norm(embeddings[3])
+    assert compact.matrix.dtype == np.dtype(dtype)
+    assert np.max(np.abs(exact.scores(query) - compact.scores(query))) < tolerance
+    assert int(np.argmax(compact.scores(query))) == 3
+
+
+def test_concurrent_builds_do_not_share_temp_files(tmp_path, embeddings):
+    errors = []
+
+    def build():
+        try:
+            EmbeddingStore.build(tmp_path / "e.npy", embeddings, "model-a", "abc")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert EmbeddingStore.open(tmp_path / "e.npy", model_name="model-a", checksum="abc") is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["e.meta.json", "e.npy"]
+
+
+def test_checksum_depends_on_text_and_model():
+    assert corpus_checksum(["a", "b"], "m") != corpus_checksum(["ab"], "m")
+    assert corpus_checksum(["a"], "m") != corpus_checksum(["a"], "n")
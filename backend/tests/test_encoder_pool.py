@@ -0,0 +1,69 @@
+"""Tests for the micro-batching query encoder pool"""
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from encoder_pool import QueryEncoder, EncoderBusyError
+
+
+def test_concurrent_queries_are_micro_batched():
+    batches = []
+
+    def encode_batch(texts):
+        batches.append(list(texts))
+        time.sleep(0.01)
+        return [len(t) for t in texts]
+
+    async def run():
+        encoder = QueryEncoder(encode_batch, workers=1, batch_window_ms=20, max_batch=64)
+        texts = [f"question {'x' * i}" for i in range(20)]
+        results = await asyncio.gather(*(encoder.encode(t) for t in texts))
+        await encoder.close()
+        return texts, results
+
+    texts, results = asyncio.run(run())
+    assert results == [len(t) for t in texts]
+    assert len(batches) < len(texts)
+
+
+def test_full_queue_applies_back_pressure():
+    release = threading.Event()
+
+    def encode_batch(texts):
+        release.wait(2)
+        return texts
+
+    async def run():
+        encoder = QueryEncoder(encode_batch, workers=1, queue_size=1, batch_window_ms=0,
+                               max_batch=1, submit_timeout=0.05)
+        first = asyncio.ensure_future(encoder.encode("a"))   # occupies the worker
+        await asyncio.sleep(0.02)
+        second = asyncio.ensure_future(encoder.encode("b"))  # fills the queue
+        await asyncio.sleep(0.02)
+        with pytest.raises(EncoderBusyError):
+            await encoder.encode("c")
+        release.set()
+        assert await first == "a" and await second == "b"
+        assert encoder.get_stats()["rejected"] == 1
+        await encoder.close()
+
+    asyncio.run(run())
+
+
+def test_encode_errors_reach_every_caller():
+    def encode_batch(texts):
+        raise RuntimeError("model crashed")
+
+    async def run():
+        encoder = QueryEncoder(encode_batch, workers=1, batch_window_ms=10)
+        results = await asyncio.gather(encoder.encode("a"), encoder.encode("b"), return_exceptions=True)
+        await encoder.close()
+        return results
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(run()))
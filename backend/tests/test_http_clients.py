@@ -0,0 +1,35 @@
+"""Tests for the shared HTTP client registry"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import http_clients
+
+
+def test_clients_are_shared_per_upstream_and_closed_on_shutdown():
+    async def run():
+        groq = http_clients.get_http_client("groq")
+        assert http_clients.get_http_client("groq") is groq
+        youtube = http_clients.get_http_client("youtube")
+        assert youtube is not groq
+        assert http_clients.get_http_client_stats()["clients"] == ["groq", "youtube"]
+
+        await http_clients.close_http_clients()
+        return groq, youtube
+
+    groq, youtube = asyncio.run(run())
+    assert groq.is_closed and youtube.is_closed
+    assert http_clients.get_http_client_stats()["clients"] == []
+
+
+def test_client_is_replaced_on_a_new_event_loop():
+    async def get():
+        return http_clients.get_http_client("groq")
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second
+
+    asyncio.run(http_clients.close_http_clients())
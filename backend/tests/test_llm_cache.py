@@ -0,0 +1,134 @@
+"""Tests for the persistent LLM completion cache and chat_completion()"""
+import asyncio
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import llm_cache
+import llm_client
+from llm_cache import CACHE_OFF, CACHE_POOL, CompletionCache, fingerprint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _payload(text="Explain patience", temperature=0.7):
+    return {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [{"role": "user", "content": text}],
+        "temperature": temperature,
+        "max_tokens": 200,
+    }
+
+
+def test_fingerprint_covers_prompt_and_sampling_settings():
+    assert fingerprint(_payload()) == fingerprint(dict(_payload()))
+    assert fingerprint(_payload()) != fingerprint(_payload(text="Explain gratitude"))
+    assert fingerprint(_payload()) != fingerprint(_payload(temperature=0.2))
+
+
+def test_entries_persist_across_instances_and_expire(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "llm.db")
+    CompletionCache(path=path, ttl=60, clock=clock).put(_payload(), "Be patient.")
+
+    restarted = CompletionCache(path=path, ttl=60, clock=clock)
+    assert restarted.get(_payload()) == "Be patient."
+    assert restarted.get(_payload(), CACHE_OFF) is None
+
+    clock.now += 61
+    assert restarted.get(_payload()) is None
+
+
+def test_pool_serves_samples_only_once_full(tmp_path):
+    cache = CompletionCache(path=str(tmp_path / "llm.db"), pool_size=3)
+    for i in range(3):
+        assert cache.get(_payload(), CACHE_POOL) is None
+        cache.put(_payload(), f"dua {i}", CACHE_POOL)
+
+    served = {cache.get(_payload(), CACHE_POOL) for _ in range(50)}
+    assert served == {"dua 0", "dua 1", "dua 2"}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = FakeClock()
+    cache = CompletionCache(path=str(tmp_path / "llm.db"), max_entries=2, clock=clock)
+    for i in range(3):
+        clock.now += 1
+        cache.put(_payload(f"q{i}"), f"a{i}")
+    clock.now += 1
+    cache.get(_payload("q0"))  # q0 is now more recent than q1
+
+    cache.evict()
+    assert cache.get(_payload("q0")) == "a0"
+    assert cache.get(_payload("q1")) is None
+    assert cache.get(_payload("q2")) == "a2"
+
+
+def test_chat_completion_calls_the_provider_once(tmp_path, monkeypatch):
+    class FakeResponse:
+        status_code = 200
+        headers = {}
+
+        def json(self):
+            return {"choices": [{"message": {"content": "cached answer"}}]}
+
+    class FakeClient:
+        calls = 0
+
+        async def post(self, *args, **kwargs):
+            FakeClient.calls += 1
+            return FakeResponse()
+
+    monkeypatch.setattr(llm_client, "llm_cache", CompletionCache(path=str(tmp_path / "llm.db")))
+    monkeypatch.setattr(llm_client, "get_http_client", lambda name: FakeClient())
+
+    async def run():
+        return [await llm_client.chat_completion("groq", "http://groq", "key", _payload(), timeout=5) for _ in range(3)]
+
+    assert asyncio.run(run()) == ["cached answer"] * 3
+    assert FakeClient.calls == 1
+
+
+def test_cache_file_is_private(tmp_path):
+    path = tmp_path / "data" / "llm.db"
+    CompletionCache(path=str(path)).put(_payload(), "Be patient.")
+    assert oct(path.stat().st_mode & 0o777) == oct(0o600)
+    assert oct(path.parent.stat().st_mode & 0o777) == oct(0o700)
+
+    # An existing file with loose permissions is tightened
+    loose = tmp_path / "loose.db"
+    loose.touch(mode=0o666)
+    loose.chmod(0o666)
+    CompletionCache(path=str(loose)).put(_payload(), "Be patient.")
+    assert oct(loose.stat().st_mode & 0o777) == oct(0o600)
+
+
+def test_cache_file_owned_by_another_user_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache.os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+    cache = CompletionCache(path=str(tmp_path / "planted.db"))
+    cache.put(_payload(), "planted answer")
+    assert cache.get(_payload()) is None
+
+
+def test_async_access_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = CompletionCache(path=str(tmp_path / "llm.db"))
+    threads = []
+    original = cache.get
+    monkeypatch.setattr(cache, "get", lambda *args: threads.append(threading.get_ident()) or original(*args))
+
+    async def run():
+        await cache.aput(_payload(), "Be patient.")
+        return await cache.aget(_payload()), threading.get_ident()
+
+    content, loop_thread = asyncio.run(run())
+    assert content == "Be patient."
+    assert threads and threads[0] != loop_thread
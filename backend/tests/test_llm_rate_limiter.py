@@ -0,0 +1,211 @@
+"""Tests for the SQLite-backed LLM rate limiter (fake clock, no network)"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import llm_rate_limiter
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_rate_limiter import BACKGROUND, INTERACTIVE, LLMRateLimiter, RateLimitTimeout, llm_priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, usage=None, headers=None):
+        self.status_code = status_code
+        self._usage = usage
+        self.headers = headers or {}
+
+    def json(self):
+        return {"usage": {"total_tokens": self._usage}} if self._usage else {}
+
+
+def _limiter(tmp_path, clock, rpm=6, tpm=1000, **kwargs):
+    return LLMRateLimiter(path=str(tmp_path / "limits.db"), limits={"groq": (rpm, tpm)}, clock=clock, **kwargs)
+
+
+def test_request_bucket_empties_and_refills(tmp_path):
+    clock = FakeClock()
+    limiter = _limiter(tmp_path, clock, rpm=2)
+    assert limiter.try_acquire("groq", 10) == 0
+    assert limiter.try_acquire("groq", 10) == 0
+    wait = limiter.try_acquire("groq", 10)
+    assert wait == pytest.approx(30.0)  # one request refills every 30s at 2 rpm
+
+    clock.now += 30
+    assert limiter.try_acquire("groq", 10) == 0
+
+
+def test_token_bucket_limits_large_calls(tmp_path):
+    clock = FakeClock()
+    limiter = _limiter(tmp_path, clock, tpm=1000)
+    assert limiter.try_acquire("groq", 800) == 0
+    assert limiter.try_acquire("groq", 800) > 0
+    assert limiter.try_acquire("groq", 150) == 0
+
+
+def test_buckets_are_shared_between_limiter_instances(tmp_path):
+    """Two instances on one file behave like two worker processes"""
+    clock = FakeClock()
+    first, second = _limiter(tmp_path, clock, rpm=2), _limiter(tmp_path, clock, rpm=2)
+    assert first.try_acquire("groq", 10) == 0
+    assert second.try_acquire("groq", 10) == 0
+    assert first.try_acquire("groq", 10) > 0
+
+
+def test_background_calls_leave_a_reserve_for_interactive(tmp_path):
+    clock = FakeClock()
+    limiter = _limiter(tmp_path, clock, rpm=4, background_reserve=0.5)
+    assert limiter.try_acquire("groq", 10, BACKGROUND) == 0
+    assert limiter.try_acquire("groq", 10, BACKGROUND) == 0
+    assert limiter.try_acquire("groq", 10, BACKGROUND) > 0  # 2 of 4 requests are reserved
+    assert limiter.try_acquire("groq", 10, INTERACTIVE) == 0
+
+
+def test_settle_uses_reported_usage_and_429_blocks_everyone(tmp_path):
+    clock = FakeClock()
+    limiter = _limiter(tmp_path, clock, tpm=1000)
+
+    async def run():
+        async with limiter.slot("groq", 600) as slot:
+            await slot.settle(FakeResponse(usage=100))  # only 100 of the 600 estimated were used
+
+    asyncio.run(run())
+    assert limiter.try_acquire("groq", 850) == 0
+
+    clock.now += 60
+    async def throttled():
+        async with limiter.slot("groq", 10) as slot:
+            await slot.settle(FakeResponse(status_code=429, headers={"retry-after": "20"}))
+
+    asyncio.run(throttled())
+    assert limiter.try_acquire("groq", 10) == pytest.approx(20.0)
+
+
+def test_deadline_raises_rate_limit_timeout(tmp_path):
+    limiter = _limiter(tmp_path, FakeClock(), rpm=1, deadlines={INTERACTIVE: 0.05, BACKGROUND: 0.05})
+    assert limiter.try_acquire("groq", 10) == 0
+
+    async def run():
+        with llm_priority(BACKGROUND):
+            async with limiter.slot("groq", 10):
+                pass
+
+    with pytest.raises(RateLimitTimeout):
+        asyncio.run(run())
+    assert limiter.get_stats()["timeouts"] == 1
+
+
+def test_open_circuit_refunds_the_reservation(tmp_path):
+    limiter = _limiter(tmp_path, FakeClock(), rpm=1)
+
+    async def run():
+        async with limiter.slot("groq", 10):
+            raise CircuitOpenError("open")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(run())
+    assert limiter.try_acquire("groq", 10) == 0
+
+
+def test_queued_calls_do_not_hold_budget_and_share_the_deadline(tmp_path):
+    limiter = _limiter(tmp_path, FakeClock(), rpm=6, max_concurrency=1,
+                       deadlines={INTERACTIVE: 0.1, BACKGROUND: 0.1})
+
+    async def run():
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot("groq", 10):
+                await release.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitTimeout):
+            async with limiter.slot("groq", 10):
+                pass
+        release.set()
+        await task
+
+    asyncio.run(run())
+    # Only the call that ran was charged: 5 of 6 requests are left
+    for _ in range(5):
+        assert limiter.try_acquire("groq", 10) == 0
+    assert limiter.try_acquire("groq", 10) > 0
+    assert limiter.get_stats()["timeouts"] == 1
+
+
+def test_settle_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    limiter = _limiter(tmp_path, FakeClock())
+    threads = []
+    monkeypatch.setattr(limiter, "block", lambda provider, seconds: threads.append(threading.get_ident()))
+
+    async def run():
+        async with limiter.slot("groq", 10) as slot:
+            await slot.settle(FakeResponse(status_code=429))
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and threads[0] != loop_thread
+
+
+def test_wait_past_the_deadline_fails_at_once(tmp_path):
+    limiter = _limiter(tmp_path, FakeClock(), deadlines={INTERACTIVE: 5.0, BACKGROUND: 5.0})
+    limiter.block("groq", 60)  # a 429 paused the provider for longer than any caller waits
+
+    async def run():
+        async with limiter.slot("groq", 10):
+            pass
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        asyncio.run(run())
+    assert time.monotonic() - started < 1.0
+    assert limiter.get_stats()["timeouts"] == 1
+
+
+def test_open_circuit_fails_before_queueing_or_charging(tmp_path, monkeypatch):
+    limiter = _limiter(tmp_path, FakeClock(), rpm=6, max_concurrency=1)
+    breaker = CircuitBreaker("groq", min_calls=1)
+    with pytest.raises(RuntimeError):
+        with breaker.track():
+            raise RuntimeError("upstream down")
+    monkeypatch.setattr(llm_rate_limiter, "llm_rate_limiter", limiter)
+    monkeypatch.setattr(llm_rate_limiter, "get_breaker", lambda name: breaker)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot("groq", 10):
+                await release.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(CircuitOpenError):
+            async with llm_rate_limiter.llm_slot("groq", "prompt", max_tokens=10):
+                pass
+        elapsed = time.monotonic() - started
+        release.set()
+        await task
+        return elapsed
+
+    assert asyncio.run(run()) < 0.1
+    # Only the holder was charged: 5 of 6 requests are left
+    assert limiter.get_stats()["acquired"] == 1
+    for _ in range(5):
+        assert limiter.try_acquire("groq", 10) == 0
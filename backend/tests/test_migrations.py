@@ -0,0 +1,217 @@
+"""Tests for the schema migrations and the query plans of the hot list queries"""
+import importlib
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine, func, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from migrations import MIGRATIONS, applied_versions, run_migrations
+from models_extended import Conversation, DuaHistory, Event, Message
+from services_chat import ChatService
+
+
+def _engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+
+
+def _legacy_schema(engine):
+    """Tables as an early version created them: no account columns, counters or composite indexes"""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, password_hash VARCHAR, created_at DATETIME)"))
+        conn.execute(text("CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER, user_email VARCHAR, imam_id INTEGER, topic VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("INSERT INTO users (email) VALUES ('old@x.com')"))
+    Base.metadata.create_all(bind=engine)
+
+
+def test_migrations_upgrade_a_legacy_database(tmp_path):
+    engine = _engine(tmp_path)
+    _legacy_schema(engine)
+
+    assert run_migrations(engine) == [version for version, _, _ in MIGRATIONS]
+
+    columns = {column["name"]: column for column in inspect(engine).get_columns("users")}
+    assert {"user_type", "is_active", "last_login", "login_attempts", "locked_until", "updated_at"} <= set(columns)
+    assert {"unread_for_user", "last_message_preview"} <= {c["name"] for c in inspect(engine).get_columns("conversations")}
+    with engine.connect() as conn:
+        assert tuple(conn.execute(text("SELECT user_type, is_active, login_attempts FROM users"))) == (("user", 1, 0),)
+    indexes = {index["name"] for index in inspect(engine).get_indexes("conversations")}
+    assert "ix_conversations_user_email_updated_at" in indexes
+
+
+def test_counter_migration_backfills_existing_conversations(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER, user_email VARCHAR, imam_id INTEGER, topic VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("INSERT INTO conversations (id, user_email, imam_id, updated_at) VALUES (1, 'u@x.com', 1, '2024-03-01 10:00:00'), (2, 'v@x.com', 1, '2024-03-01 11:00:00')"))
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO messages (id, conversation_id, sender_type, message_text, is_read, created_at) VALUES "
+            "(1, 1, 'user', 'Assalamu alaikum', 1, '2024-03-01 09:00:00'), "
+            "(2, 1, 'user', 'I need advice', 0, '2024-03-01 09:05:00'), "
+            "(3, 1, 'imam', :reply, 0, '2024-03-01 09:10:00')"
+        ), {"reply": "Wa alaikum assalam " + "x" * 200})
+
+    run_migrations(engine)
+
+    db = sessionmaker(bind=engine)()
+    first, second = db.get(Conversation, 1), db.get(Conversation, 2)
+    assert (first.unread_for_imam, first.unread_for_user) == (1, 1)
+    assert first.last_message_preview.startswith("Wa alaikum") and len(first.last_message_preview) == 100
+    assert first.last_message_at == datetime(2024, 3, 1, 9, 10)
+    assert first.updated_at == datetime(2024, 3, 1, 10, 0)
+    assert (second.unread_for_imam, second.unread_for_user, second.last_message_preview) == (0, 0, None)
+    assert ChatService.reconcile_counters(db) == 0
+
+
+def test_concurrent_startups_apply_each_migration_once(tmp_path):
+    """Workers starting together: one applies each step, the others wait and skip it"""
+    engine = _engine(tmp_path)
+    _legacy_schema(engine)
+    # Every worker has already read the (empty) list of applied versions
+    stale = applied_versions(engine)
+    applied = []
+    errors = []
+
+    def worker():
+        worker_engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"timeout": 30})
+        try:
+            applied.extend(run_migrations(worker_engine))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    with patch("migrations.applied_versions", return_value=stale):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert sorted(applied) == [version for version, _, _ in MIGRATIONS]
+    assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+
+
+def test_app_chat_counter_migration_backfills_existing_chats(tmp_path, monkeypatch):
+    """app/migrations.py 0001 on a chats table created before the counters existed"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+    app_migrations = importlib.import_module("app.migrations")
+
+    engine = _engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE chats (id INTEGER PRIMARY KEY, imam_id INTEGER, user_email VARCHAR, last_message_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, chat_id INTEGER, sender_type VARCHAR, sender_id VARCHAR, message TEXT, is_read BOOLEAN, created_at DATETIME)"))
+        conn.execute(text("INSERT INTO chats (id, imam_id, user_email, last_message_at) VALUES (1, 1, 'u@x.com', NULL), (2, 1, 'v@x.com', '2024-02-01 08:00:00')"))
+        conn.execute(text(
+            "INSERT INTO chat_messages (chat_id, sender_type, sender_id, message, is_read, created_at) VALUES "
+            "(1, 'user', 'u@x.com', 'Salam', 0, '2024-03-01 09:00:00'), "
+            "(1, 'imam', '1', 'Wa alaikum assalam', 1, '2024-03-01 09:05:00')"
+        ))
+
+    app_migrations.run_migrations(engine, app_migrations.MIGRATIONS[:1])
+
+    with engine.connect() as conn:
+        rows = list(conn.execute(text(
+            "SELECT unread_for_user, unread_for_imam, last_message_preview, last_message_at FROM chats ORDER BY id"
+        )))
+    assert rows == [(0, 1, "Wa alaikum assalam", "2024-03-01 09:05:00"), (0, 0, None, "2024-02-01 08:00:00")]
+
+
+def test_migrations_are_recorded_and_idempotent(tmp_path):
+    engine = _engine(tmp_path)
+    Base.metadata.create_all(bind=engine)
+
+    # A fresh database already has everything: the steps are no-ops, but recorded
+    assert len(run_migrations(engine)) == len(MIGRATIONS)
+    assert run_migrations(engine) == []
+    assert applied_versions(engine) == {version for version, _, _ in MIGRATIONS}
+
+
+def test_every_model_index_is_created_by_a_migration(tmp_path):
+    """Composite indexes declared on the models reach existing databases too"""
+    fresh, migrated = _engine(tmp_path), create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=fresh)
+    _legacy_schema(migrated)
+    run_migrations(migrated)
+
+    for table in ("users", "conversations", "messages", "events", "dua_history"):
+        expected = {index["name"] for index in inspect(fresh).get_indexes(table) if len(index["column_names"]) > 1}
+        assert expected <= {index["name"] for index in inspect(migrated).get_indexes(table)}, table
+
+
+# ============= QUERY PLANS =============
+
+@pytest.fixture
+def db(tmp_path):
+    engine = _engine(tmp_path)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    return sessionmaker(bind=engine)()
+
+
+def _plan(db, query) -> str:
+    sql = query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return " | ".join(row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+@pytest.mark.parametrize("name, build, index", [
+    (
+        "conversation messages page",
+        lambda db: db.query(Message).filter(Message.conversation_id == 1)
+        .order_by(Message.created_at.desc(), Message.id.desc()).limit(51),
+        "ix_messages_conversation_id_created_at_id",
+    ),
+    (
+        "unread count",
+        lambda db: db.query(func.count(Message.id)).filter(
+            Message.conversation_id == 1, Message.sender_type == "imam", Message.is_read == False
+        ),
+        "ix_messages_conversation_id_sender_type_is_read",
+    ),
+    (
+        "user inbox",
+        lambda db: db.query(Conversation).filter(Conversation.user_email == "u@x.com")
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(51),
+        "ix_conversations_user_email_updated_at",
+    ),
+    (
+        "imam inbox",
+        lambda db: db.query(Conversation).filter(Conversation.imam_id == 1)
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(51),
+        "ix_conversations_imam_id_updated_at",
+    ),
+    (
+        "events by city and category",
+        lambda db: db.query(Event).filter(Event.city == "Tunis", Event.category == "iftar")
+        .order_by(Event.event_date.desc(), Event.id.desc()).limit(51),
+        "ix_events_city_category_event_date_id",
+    ),
+    (
+        "events by city",
+        lambda db: db.query(Event).filter(Event.city == "Tunis")
+        .order_by(Event.event_date.desc(), Event.id.desc()).limit(51),
+        "ix_events_city_event_date_id",
+    ),
+    (
+        "dua history",
+        lambda db: db.query(DuaHistory).filter(DuaHistory.email == "u@x.com")
+        .order_by(DuaHistory.created_at.desc(), DuaHistory.id.desc()).limit(51),
+        "ix_dua_history_email_created_at_id",
+    ),
+])
+def test_hot_queries_use_their_index(db, name, build, index):
+    plan = _plan(db, build(db))
+    assert index in plan, f"{name}: {plan}"
+    # Ordered straight off the index: no sort step
+    if "ORDER BY" in str(build(db).statement):
+        assert "TEMP B-TREE" not in plan, f"{name}: {plan}"
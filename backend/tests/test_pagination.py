@@ -0,0 +1,103 @@
+"""Tests for keyset (cursor) pagination"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models_extended import DuaHistory, Event, Message
+from pagination import InvalidCursorError, decode_cursor, encode_cursor, paginate
+
+
+def _session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pages.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _all_pages(query, columns, limit):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = paginate(query, columns, cursor=cursor, limit=limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 3, 1, 12, 30, 5, 250), 42, "x"]
+    columns = [Message.created_at, Message.id, Message.sender_type]
+    assert decode_cursor(encode_cursor(values), columns) == values
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor!",
+    encode_cursor([1]),
+    encode_cursor([None, 1]),
+    "e30",
+    encode_cursor([datetime(2026, 3, 1), 1, 2]),  # wrong arity
+    encode_cursor(["yesterday", 1]),  # plain string for a DateTime column
+    encode_cursor([{"dt": "not a date"}, 1]),
+    encode_cursor([{"dt": 20260301}, 1]),
+    encode_cursor([datetime(2026, 3, 1), "7"]),  # string id
+    encode_cursor([datetime(2026, 3, 1), True]),
+    encode_cursor([datetime(2026, 3, 1), 1.5]),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, [Message.created_at, Message.id])
+
+
+def test_mistyped_cursor_is_rejected_before_the_query(tmp_path):
+    db = _session(tmp_path)
+    with pytest.raises(InvalidCursorError):
+        paginate(db.query(Message), (Message.created_at, Message.id), cursor=encode_cursor(["2026-03-01", 1]))
+
+
+def test_pages_cover_every_row_once_despite_ties(tmp_path):
+    db = _session(tmp_path)
+    start = datetime(2026, 3, 1, 20, 0)
+    # Three messages share each timestamp: id breaks the tie
+    for i in range(10):
+        db.add(Message(conversation_id=1, sender_type="user", message_text=str(i), created_at=start + timedelta(minutes=i // 3)))
+    db.add(Message(conversation_id=2, sender_type="user", message_text="other", created_at=start))
+    db.commit()
+
+    query = db.query(Message).filter(Message.conversation_id == 1)
+    pages = _all_pages(query, (Message.created_at, Message.id), limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 2]
+    expected = [m.id for m in query.order_by(Message.created_at.desc(), Message.id.desc())]
+    assert sum(pages, []) == expected
+
+
+def test_server_default_timestamps(tmp_path):
+    """Rows stamped by SQLite's CURRENT_TIMESTAMP (no fractional seconds) are neither skipped nor repeated"""
+    db = _session(tmp_path)
+    for i in range(5):
+        db.execute(text("INSERT INTO dua_history (email, category) VALUES ('u@x.com', :category)"), {"category": str(i)})
+    db.commit()
+
+    pages = _all_pages(db.query(DuaHistory), (DuaHistory.created_at, DuaHistory.id), limit=2)
+    assert sum(pages, []) == [5, 4, 3, 2, 1]
+
+
+def test_rows_inserted_between_pages_do_not_shift(tmp_path):
+    db = _session(tmp_path)
+    for day in range(1, 6):
+        db.add(Event(title=f"Iftar {day}", city="Tunis", event_date=datetime(2026, 3, day)))
+    db.commit()
+
+    columns = (Event.event_date, Event.id)
+    first, cursor = paginate(db.query(Event), columns, limit=2)
+    db.add(Event(title="Late addition", city="Tunis", event_date=datetime(2026, 3, 10)))
+    db.commit()
+    second, _ = paginate(db.query(Event), columns, cursor=cursor, limit=2)
+
+    assert [e.event_date.day for e in first] == [5, 4]
+    assert [e.event_date.day for e in second] == [3, 2]
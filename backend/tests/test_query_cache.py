@@ -0,0 +1,124 @@
+"""Tests for the LRU + TTL query cache and its use in Quran search"""
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import query_cache
+import services_quran_search as qs
+from query_cache import QueryCache, normalize_query
+
+
+def test_normalize_query_ignores_case_punctuation_and_spacing():
+    assert normalize_query("  I am struggling   with MONEY! ") == "i am struggling with money"
+    assert normalize_query("I am struggling with money?") == normalize_query("i am struggling with money")
+
+
+def test_lru_eviction_and_counters():
+    cache = QueryCache(max_size=2, ttl=60, persist_path="")
+    cache.put("a", 3, [{"x": 1}])
+    cache.put("b", 3, [{"x": 2}])
+    assert cache.get("a") is not None       # a becomes most recently used
+    cache.put("c", 3, [{"x": 3}])           # evicts b
+    assert cache.get("b") is None
+    assert cache.get("c").results[3] == [{"x": 3}]
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+    assert stats["size"] == 2
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "time", lambda: now[0])
+    cache = QueryCache(max_size=10, ttl=5, persist_path="")
+    cache.put("q", embedding=[0.1, 0.2])
+    now[0] += 6
+    assert cache.get("q") is None
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_sqlite_persistence_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = QueryCache(max_size=10, ttl=60, persist_path=path, namespace="curated:abc")
+    cache.put("I am struggling with money", 3, [{"reference": "Quran 65:3"}], embedding=np.ones(4, dtype=np.float32))
+
+    reloaded = QueryCache(max_size=10, ttl=60, persist_path=path, namespace="curated:abc")
+    entry = reloaded.get("i am struggling with money")
+    assert entry.results[3] == [{"reference": "Quran 65:3"}]
+    assert entry.embedding == [1.0, 1.0, 1.0, 1.0]
+
+    # A different index namespace never sees those rows
+    other = QueryCache(max_size=10, ttl=60, persist_path=path, namespace="full:def")
+    assert other.get("i am struggling with money") is None
+
+
+def test_search_serves_repeated_queries_from_cache(monkeypatch):
+    monkeypatch.setattr(qs, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+    search = qs.QuranSemanticSearch()
+    calls = []
+    original = search._keyword_search
+    monkeypatch.setattr(search, "_keyword_search", lambda q, k: calls.append(q) or original(q, k))
+
+    first = search.search("I am struggling with money", top_k=3)
+    first[0]["score"] = -1  # callers must not be able to corrupt the cache
+    second = search.search("i am struggling with money!", top_k=3)
+
+    assert len(calls) == 1
+    assert second[0]["score"] >= 0
+    assert search.cache.get_stats()["hits"] == 1
+
+
+@pytest.fixture
+def semantic_search(monkeypatch):
+    """Search that takes the semantic path, ranking with a recording stub"""
+    monkeypatch.setattr(qs, "SENTENCE_TRANSFORMERS_AVAILABLE", False)
+    search = qs.QuranSemanticSearch()
+    monkeypatch.setattr(qs.QuranSemanticSearch, "semantic_enabled", property(lambda self: True))
+    search.ranked = []
+
+    def search_by_embedding(query_embedding, top_k=3, query=None):
+        search.ranked.append(query_embedding)
+        return [{"reference": "ranked", "score": 0.9}]
+
+    monkeypatch.setattr(search, "search_by_embedding", search_by_embedding)
+    monkeypatch.setattr(qs, "_quran_search", search)
+    return search
+
+
+def test_async_search_skips_encoder_for_cached_embedding(semantic_search, monkeypatch):
+    embedding = np.ones(8, dtype=np.float32)
+    # Only the embedding is cached: the result lists are for another top_k
+    semantic_search.cache.put("patience in hardship", embedding=embedding)
+
+    def fail():
+        raise AssertionError("encoder should not be used for a cached query")
+
+    monkeypatch.setattr(qs, "get_query_encoder", fail)
+    result = asyncio.run(qs.search_quran_by_topic("Patience in hardship"))
+
+    assert result == {"reference": "ranked", "score": 0.9}
+    assert semantic_search.ranked == [embedding]
+    assert semantic_search.cache.get_stats()["embedding_hits"] == 1
+    # The results are cached now, so the next call skips ranking too
+    asyncio.run(qs.search_quran_by_topic("patience in hardship"))
+    assert len(semantic_search.ranked) == 1
+
+
+def test_search_skips_model_for_cached_embedding(semantic_search):
+    embedding = np.ones(8, dtype=np.float32)
+    semantic_search.cache.put("patience in hardship", 3, [{"reference": "top3"}], embedding=embedding)
+
+    class FailingModel:
+        def encode(self, *args, **kwargs):
+            raise AssertionError("model should not be used for a cached query")
+
+    semantic_search.model = FailingModel()
+    assert semantic_search.search("patience in hardship", top_k=1) == [{"reference": "ranked", "score": 0.9}]
+    assert semantic_search.search("patience in hardship", top_k=3) == [{"reference": "top3"}]
+    assert semantic_search.ranked == [embedding]
+    assert semantic_search.cache.get_stats()["embedding_hits"] == 1
@@ -0,0 +1,171 @@
+"""Offline tests for the full-Quran vector index (no model download needed)"""
+import asyncio
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import embedding_store
+import services_quran_search as qs
+import vector_index
+
+
+class HashingModel:
+    """Tiny stand-in for SentenceTransformer: bag-of-words hashed into 384 dims"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, convert_to_numpy=True, batch_size=32):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        vectors = np.zeros((len(texts), 384), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for word in t.lower().split():
+                vectors[i, hash(word) % 384] += 1.0
+        return vectors[0] if single else vectors
+
+
+@pytest.fixture
+def quran_db(tmp_path):
+    url = f"sqlite:///{tmp_path / 'quran.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE quran_english (id INTEGER PRIMARY KEY, surah_number INT, surah_name TEXT, ayah_number INT, ayah_text TEXT, topic TEXT)"))
+        conn.execute(text("CREATE TABLE quran_arabic (id INTEGER PRIMARY KEY, surah_number INT, surah_name TEXT, ayah_number INT, ayah_text TEXT, topic TEXT)"))
+        rows = [
+            (94, "Ash-Sharh", 5, "For indeed, with hardship comes ease.", "فَإِنَّ مَعَ الْعُسْرِ يُسْرًا"),
+            (26, "Ash-Shuara", 80, "And when I am ill, it is He who cures me.", "وَإِذَا مَرِضْتُ فَهُوَ يَشْفِينِ"),
+            (2, "Al-Baqarah", 255, "Allah - there is no deity except Him, the Ever-Living.", "اللَّهُ لَا إِلَٰهَ إِلَّا هُوَ"),
+        ]
+        for surah, name, ayah, en, ar in rows:
+            conn.execute(text("INSERT INTO quran_english (surah_number, surah_name, ayah_number, ayah_text, topic) VALUES (:s, :n, :a, :t, 'general')"),
+                         {"s": surah, "n": name, "a": ayah, "t": en})
+            conn.execute(text("INSERT INTO quran_arabic (surah_number, surah_name, ayah_number, ayah_text, topic) VALUES (:s, :n, :a, :t, 'general')"),
+                         {"s": surah, "n": name, "a": ayah, "t": ar})
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def fake_model(monkeypatch, tmp_path):
+    monkeypatch.setattr(qs, "SENTENCE_TRANSFORMERS_AVAILABLE", True)
+    monkeypatch.setattr(qs, "np", np)
+    monkeypatch.setattr(qs, "EmbeddingStore", embedding_store.EmbeddingStore, raising=False)
+    monkeypatch.setattr(qs, "corpus_checksum", embedding_store.corpus_checksum, raising=False)
+    monkeypatch.setattr(qs, "unique_temp_path", embedding_store.unique_temp_path, raising=False)
+    monkeypatch.setattr(qs, "load_or_build_index", vector_index.load_or_build_index, raising=False)
+    monkeypatch.setattr(qs, "QURAN_DATABASE_URL", f"sqlite:///{tmp_path / 'missing.db'}")
+    monkeypatch.setattr(qs, "SentenceTransformer", HashingModel, raising=False)
+    monkeypatch.setattr(qs, "INDEX_DIR", tmp_path / "quran_index")
+
+
+def test_stream_quran_verses_joins_arabic_and_curated_topics(quran_db):
+    verses = list(qs.stream_quran_verses(quran_db, batch_size=2))
+    assert [(v["surah"], v["ayah"]) for v in verses] == [(2, 255), (26, 80), (94, 5)]
+    assert verses[2]["arabic"].startswith("فَإِنَّ")
+    # 94:5 is in the curated list, so it inherits the hand-written topics
+    assert "hardship" in verses[2]["topics"]
+
+
+def test_full_index_build_and_search(quran_db, fake_model):
+    assert qs.build_full_index(quran_db, batch_size=2) == 3
+
+    search = qs.QuranSemanticSearch(mode="full")
+    assert len(search.database) == 3
+    results = search.search("when I am ill who cures me", top_k=2)
+    assert results[0]["reference"] == "Quran 26:80 (Ash-Shuara)"
+    assert results[0]["score"] >= results[1]["score"]
+
+
+def test_full_mode_falls_back_to_curated_when_index_missing(fake_model):
+    search = qs.QuranSemanticSearch(mode="full")
+    assert search.database is qs.QURAN_DATABASE
+    assert len(search.store) == len(qs.QURAN_DATABASE)
+
+
+def test_stale_full_index_is_rebuilt_in_the_background(quran_db, fake_model, monkeypatch):
+    qs.build_full_index(quran_db, batch_size=2)
+    _, verses_path = qs._full_index_paths()
+    meta = json.loads(verses_path.read_text(encoding="utf-8"))
+    meta["verses"][0]["translation"] = "edited after the embeddings were built"
+    verses_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    monkeypatch.setattr(qs, "QURAN_DATABASE_URL", quran_db)
+    monkeypatch.setattr(qs, "QURAN_INDEX_MODE", "full")
+    monkeypatch.setattr(qs, "_quran_search", None)
+    monkeypatch.setattr(qs, "_full_index_build", None)
+
+    # The first caller is served curated verses at once...
+    first = qs.get_quran_search()
+    assert first.database is qs.QURAN_DATABASE
+    # ...while one background build replaces the stale index
+    qs._full_index_build.join(timeout=10)
+    assert not qs.start_full_index_build()
+    search = qs.get_quran_search()
+    assert search is not first
+    assert search.database[0]["translation"].startswith("Allah - there is no deity")
+
+
+def test_first_search_does_not_wait_for_the_full_build(quran_db, fake_model, monkeypatch):
+    building = threading.Event()
+    release = threading.Event()
+    real_build = qs.build_full_index
+
+    def slow_build(*args, **kwargs):
+        building.set()
+        release.wait(10)
+        return real_build(quran_db, batch_size=2)
+
+    monkeypatch.setattr(qs, "build_full_index", slow_build)
+    monkeypatch.setattr(qs, "QURAN_INDEX_MODE", "full")
+    monkeypatch.setattr(qs, "_quran_search", None)
+    monkeypatch.setattr(qs, "_full_index_build", None)
+
+    results = qs.get_quran_search().search("hardship and ease", top_k=1)
+    assert results and building.wait(5)
+    assert qs.get_quran_search().database is qs.QURAN_DATABASE
+
+    release.set()
+    qs._full_index_build.join(timeout=10)
+    assert len(qs.get_quran_search().database) == 3
+
+
+def test_full_size_query_is_fast(fake_model, tmp_path):
+    search = qs.QuranSemanticSearch(mode="curated")
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((6236, 384)).astype(np.float32)
+    search.store = embedding_store.EmbeddingStore.build(tmp_path / "big.npy", embeddings, "test-model", "checksum")
+    search.index = vector_index.FlatIndex(search.store)
+    search.database = [dict(qs.QURAN_DATABASE[0]) for _ in range(6236)]
+
+    search.search("warm up", top_k=3)
+    started = time.perf_counter()
+    for i in range(50):
+        # Distinct queries so the query cache cannot answer them
+        search.search(f"I am struggling with money {i}", top_k=3)
+    per_query = (time.perf_counter() - started) / 50
+    assert per_query < 0.010
+
+
+def test_async_search_uses_encoder_pool(quran_db, fake_model, monkeypatch):
+    qs.build_full_index(quran_db, batch_size=2)
+    monkeypatch.setattr(qs, "_quran_search", qs.QuranSemanticSearch(mode="full"))
+    monkeypatch.setattr(qs, "_query_encoder", None)
+
+    async def run():
+        results = await qs.search_quran("when I am ill who cures me", top_k=1)
+        stats = qs.get_query_encoder().get_stats()
+        await qs.get_query_encoder().close()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    assert results[0]["reference"] == "Quran 26:80 (Ash-Shuara)"
+    assert stats["requests"] == 1 and stats["batches"] == 1
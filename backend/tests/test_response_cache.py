@@ -0,0 +1,110 @@
+"""Tests for the semantic response cache used by AIAnalyzerService.analyze"""
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import response_cache
+import services_ai_analyzer
+from response_cache import SemanticResponseCache
+
+
+def _vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_exact_and_semantic_hits():
+    cache = SemanticResponseCache(threshold=0.9, ttl=60, max_size=10)
+    cache.store("I am struggling with money", {"answer": 1}, _vector(1, 0, 0))
+
+    assert cache.lookup("i am struggling with money!") == {"answer": 1}
+    assert cache.lookup("money is tight", _vector(0.95, 0.1, 0)) == {"answer": 1}
+    assert cache.lookup("my mother is sick", _vector(0, 1, 0)) is None
+
+    stats = cache.get_stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_cached_responses_are_copies():
+    cache = SemanticResponseCache(threshold=0.9, ttl=60, max_size=10)
+    cache.store("q", {"ayah": {"reference": "Quran 94:5"}})
+    cache.lookup("q")["ayah"]["reference"] = "changed"
+    assert cache.lookup("q")["ayah"]["reference"] == "Quran 94:5"
+
+
+def test_ttl_and_max_size(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    cache = SemanticResponseCache(threshold=0.9, ttl=10, max_size=2)
+    cache.store("a", {"a": 1}, _vector(1, 0))
+    cache.store("b", {"b": 1}, _vector(0, 1))
+    cache.store("c", {"c": 1})
+    assert cache.lookup("a") is None
+    assert cache.get_stats()["evictions"] == 1
+
+    now[0] += 11
+    assert cache.lookup("b", _vector(0, 1)) is None
+    assert len(cache) == 0
+
+
+def test_analyze_reuses_answer_for_paraphrase(monkeypatch):
+    embeddings = {
+        "I am struggling with money": _vector(1, 0, 0),
+        "I have money problems": _vector(0.97, 0.2, 0),
+    }
+    llm_calls = []
+
+    async def fake_encode(question):
+        return embeddings.get(question)
+
+    async def fake_search(question):
+        return {"reference": "Quran 65:3", "translation": "And will provide for him", "surah_name": "At-Talaq",
+                "arabic": "", "topics": ["money"], "score": 0.6}
+
+    async def fake_explanation(self, question, quran_result):
+        llm_calls.append(question)
+        return "AI explanation"
+
+    monkeypatch.setattr(services_ai_analyzer, "SEMANTIC_SEARCH_AVAILABLE", True)
+    monkeypatch.setattr(services_ai_analyzer, "encode_query", fake_encode, raising=False)
+    monkeypatch.setattr(services_ai_analyzer, "search_quran_by_topic", fake_search, raising=False)
+    monkeypatch.setattr(services_ai_analyzer.AIAnalyzerService, "_request_explanation", fake_explanation)
+
+    service = services_ai_analyzer.AIAnalyzerService()
+
+    async def run():
+        first = await service.analyze("I am struggling with money")
+        second = await service.analyze("I have money problems")
+        fresh = await service.analyze("I have money problems", bypass_cache=True)
+        return first, second, fresh
+
+    first, second, fresh = asyncio.run(run())
+    assert second == first
+    assert fresh["ai_explanation"] == "AI explanation"
+    assert llm_calls == ["I am struggling with money", "I have money problems"]
+    assert service.response_cache.get_stats()["bypassed"] == 1
+
+
+def test_analyze_does_not_cache_fallback_explanations(monkeypatch):
+    async def fake_search(question):
+        return {"reference": "Quran 94:5", "translation": "With hardship comes ease", "score": 0.5}
+
+    async def failing_explanation(self, question, quran_result):
+        return None
+
+    async def no_embedding(question):
+        return None
+
+    monkeypatch.setattr(services_ai_analyzer, "SEMANTIC_SEARCH_AVAILABLE", True)
+    monkeypatch.setattr(services_ai_analyzer, "encode_query", no_embedding, raising=False)
+    monkeypatch.setattr(services_ai_analyzer, "search_quran_by_topic", fake_search, raising=False)
+    monkeypatch.setattr(services_ai_analyzer.AIAnalyzerService, "_request_explanation", failing_explanation)
+
+    service = services_ai_analyzer.AIAnalyzerService()
+    result = asyncio.run(service.analyze("hard times"))
+    assert result["match_found"] is True
+    assert "Quran 94:5" in result["ai_explanation"]
+    assert len(service.response_cache) == 0
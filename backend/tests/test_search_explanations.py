@@ -0,0 +1,135 @@
+"""Tests for find_answer explanation generation (app/routes/search.py)"""
+import asyncio
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+ITEMS = [(f"text {i}", "Hadith") for i in range(6)]
+
+
+class FakeDeepseek:
+    """Records concurrency; item texts listed in `slow` never answer in time"""
+
+    def __init__(self, delay=0.05, slow=()):
+        self.delay = delay
+        self.slow = set(slow)
+        self.active = 0
+        self.peak = 0
+        self.calls = []
+
+    async def generate_explanation(self, user_prompt, text, item_type="verse"):
+        self.calls.append(text)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(60 if text in self.slow else self.delay)
+            return {"explanation_english": f"why {text}", "explanation_arabic": "..."}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """app.routes.search, imported with the settings it requires (env restored afterwards)"""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    return importlib.import_module("app.routes.search")
+
+
+@pytest.fixture
+def parallel(search, monkeypatch):
+    monkeypatch.setattr(search.settings, "explanation_mode", "parallel")
+    monkeypatch.setattr(search.settings, "explanation_concurrency", 2)
+    monkeypatch.setattr(search.settings, "explanation_deadline_seconds", 2.0)
+
+
+def test_concurrency_is_capped(search, parallel):
+    service = FakeDeepseek()
+    explanations = asyncio.run(search.generate_explanations(service, "prompt", ITEMS))
+
+    assert service.peak == 2
+    assert sorted(service.calls) == [text for text, _ in ITEMS]
+    assert [e["explanation_english"] for e in explanations] == [f"why {text}" for text, _ in ITEMS]
+
+
+def test_late_item_gets_fallback_and_others_keep_their_results(search, parallel, monkeypatch):
+    monkeypatch.setattr(search.settings, "explanation_deadline_seconds", 0.5)
+    service = FakeDeepseek(slow={"text 1"})
+    explanations = asyncio.run(search.generate_explanations(service, "prompt", ITEMS))
+
+    assert explanations[1] == search.DeepseekService.FALLBACK_EXPLANATION
+    for i in (0, 2, 3, 4, 5):
+        assert explanations[i]["explanation_english"] == f"why text {i}"
+
+
+# ============= BATCH MODE =============
+
+def _explained(*ids):
+    return "[" + ", ".join(
+        f'{{"id": {i}, "explanation_english": "batch {i}", "explanation_arabic": "..."}}' for i in ids
+    ) + "]"
+
+
+class FakeBatchDeepseek(FakeDeepseek):
+    """Answers the batch call with `reply` after `batch_delay` seconds"""
+
+    def __init__(self, reply="", batch_delay=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.reply = reply
+        self.batch_delay = batch_delay
+
+    async def generate_explanations_batch(self, user_prompt, items):
+        from app.services.deepseek_service import DeepseekService
+
+        await asyncio.sleep(self.batch_delay)
+        return DeepseekService._parse_batch_explanations(self.reply, len(items))
+
+
+@pytest.fixture
+def batch(search, monkeypatch):
+    monkeypatch.setattr(search.settings, "explanation_mode", "batch")
+    monkeypatch.setattr(search.settings, "explanation_concurrency", 3)
+    monkeypatch.setattr(search.settings, "explanation_deadline_seconds", 1.0)
+    monkeypatch.setattr(search.settings, "explanation_batch_share", 0.6)
+
+
+@pytest.mark.parametrize("reply", [
+    "```json\n" + _explained(1, 2, 3) + "\n```",
+    "Here are the explanations:\n" + _explained(1, 2, 3) + "\nMay this help.",
+    '{"explanations": ' + _explained(1, 2, 3) + "}",
+])
+def test_parse_batch_tolerates_fences_prose_and_wrappers(search, reply):
+    parsed = search.DeepseekService._parse_batch_explanations(reply, 3)
+    assert [p["explanation_english"] for p in parsed] == ["batch 1", "batch 2", "batch 3"]
+
+
+def test_parse_batch_leaves_gaps_for_short_partial_and_bad_replies(search):
+    parse = search.DeepseekService._parse_batch_explanations
+    assert [p and p["explanation_english"] for p in parse(_explained(1, 2), 3)] == ["batch 1", "batch 2", None]
+    # Out of order, out of range, unnumbered and empty entries
+    reply = '[{"id": 3, "explanation_english": "batch 3"}, {"id": 9, "explanation_english": "x"},' \
+            ' {"explanation_english": "no id"}, {"id": 1, "explanation_english": ""}]'
+    assert [p and p["explanation_english"] for p in parse(reply, 3)] == [None, None, "batch 3"]
+    assert parse("Sorry, I cannot help with that.", 2) == [None, None]
+    assert parse('[{"id": 1, "explanation_english": "trunc', 2) == [None, None]
+
+
+def test_items_missing_from_batch_are_retried_individually(search, batch):
+    items = ITEMS[:4]
+    service = FakeBatchDeepseek(reply=_explained(1, 3))
+    explanations = asyncio.run(search.generate_explanations(service, "prompt", items))
+
+    assert sorted(service.calls) == ["text 1", "text 3"]
+    assert [e["explanation_english"] for e in explanations] == ["batch 1", "why text 1", "batch 3", "why text 3"]
+
+
+def test_batch_timeout_leaves_time_for_per_item_retries(search, batch):
+    items = ITEMS[:3]
+    service = FakeBatchDeepseek(reply=_explained(1, 2, 3), batch_delay=60)
+    explanations = asyncio.run(search.generate_explanations(service, "prompt", items))
+
+    assert [e["explanation_english"] for e in explanations] == ["why text 0", "why text 1", "why text 2"]
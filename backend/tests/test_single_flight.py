@@ -0,0 +1,88 @@
+"""Tests for coalescing identical in-flight calls"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from single_flight import SingleFlight, single_flight
+
+
+def test_concurrent_identical_calls_run_once():
+    calls = []
+
+    @single_flight("test_coalesce", key=lambda query: query.lower())
+    async def search(query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return {"results": [query.lower()]}
+
+    async def run():
+        return await asyncio.gather(*[search("Patience") for _ in range(5)], search("PATIENCE"), search("gratitude"))
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert results[0] == {"results": ["patience"]}
+    assert results[6] == {"results": ["gratitude"]}
+    stats = search.flight.get_stats()
+    assert stats["executions"] == 2 and stats["coalesced"] == 5 and stats["in_flight"] == 0
+
+
+def test_callers_get_independent_copies():
+    @single_flight("test_copies")
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return {"videos": []}
+
+    async def run():
+        return await asyncio.gather(fetch(), fetch())
+
+    first, second = asyncio.run(run())
+    first["videos"].append("mutated")
+    assert second == {"videos": []}
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    attempts = []
+
+    @single_flight("test_errors")
+    async def flaky():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("quota exceeded")
+
+    async def run():
+        return await asyncio.gather(flaky(), flaky(), flaky(), return_exceptions=True)
+
+    errors = asyncio.run(run())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert len(attempts) == 1
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(flaky())
+    assert len(attempts) == 2
+    assert flaky.flight.get_stats()["errors"] == 2
+
+
+def test_timeout_applies_per_caller_while_shared_call_continues():
+    flight = SingleFlight("test_timeout", timeout=1.0)
+    executions = []
+
+    async def slow():
+        executions.append(1)
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def impatient():
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", slow, timeout=0.01)
+
+    async def run():
+        _, result = await asyncio.gather(impatient(), flight.do("key", slow))
+        return result
+
+    assert asyncio.run(run()) == "answer"
+    assert len(executions) == 1
+    assert flight.get_stats()["timeouts"] == 1
@@ -0,0 +1,106 @@
+"""Tests for the tuned SQLite profile: pragmas, write routing and concurrency"""
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models_extended import Conversation, Message
+from services_chat import ChatService
+from sqlite_tuning import RoutingSession, create_sqlite_engines
+
+
+def _tuned(tmp_path):
+    read_engine, write_engine = create_sqlite_engines(f"sqlite:///{tmp_path / 'tuned.db'}")
+    Base.metadata.create_all(bind=read_engine)
+    factory = sessionmaker(class_=RoutingSession, autoflush=False, bind=read_engine, write_bind=write_engine)
+    return read_engine, write_engine, factory
+
+
+def _record(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_pragmas_applied_to_every_connection(tmp_path):
+    read_engine, write_engine, _ = _tuned(tmp_path)
+    for engine in (read_engine, write_engine):
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+            assert conn.exec_driver_sql("PRAGMA cache_size").scalar() < 0  # sized in KiB
+
+
+def test_writes_go_through_the_writer_and_see_their_own_changes(tmp_path):
+    read_engine, write_engine, factory = _tuned(tmp_path)
+    reads, writes = _record(read_engine), _record(write_engine)
+    db = factory()
+
+    db.query(Conversation).all()
+    assert len(reads) == 1 and not writes
+
+    db.add(Conversation(user_email="u@x.com", imam_id=1, topic="patience"))
+    db.flush()
+    assert any(statement.startswith("INSERT") for statement in writes)
+    # Same transaction: read from the writer, which has the uncommitted row
+    assert db.query(Conversation).count() == 1
+    assert len(reads) == 1
+
+    db.commit()
+    assert db.query(Conversation).count() == 1
+    assert len(reads) == 2
+
+
+def test_open_reader_does_not_block_writer(tmp_path):
+    read_engine, _, factory = _tuned(tmp_path)
+    with read_engine.connect() as reader:
+        reader.exec_driver_sql("BEGIN")
+        reader.exec_driver_sql("SELECT count(*) FROM conversations").scalar()
+
+        db = factory()
+        db.add(Conversation(user_email="u@x.com", imam_id=1, topic="patience"))
+        db.commit()  # would wait on the reader's lock with the rollback journal
+
+        # The reader keeps its snapshot until its transaction ends
+        assert reader.exec_driver_sql("SELECT count(*) FROM conversations").scalar() == 0
+        reader.exec_driver_sql("COMMIT")
+        assert reader.exec_driver_sql("SELECT count(*) FROM conversations").scalar() == 1
+
+
+def test_concurrent_writers_do_not_lock(tmp_path):
+    _, _, factory = _tuned(tmp_path)
+    db = factory()
+    conv = Conversation(user_email="u@x.com", imam_id=1, topic="patience")
+    db.add(conv)
+    db.commit()
+    conv_id = conv.id
+    db.close()
+
+    errors = []
+
+    def send(n):
+        session = factory()
+        try:
+            for i in range(20):
+                ChatService.send_message(session, conv_id, "u@x.com", "user", f"{n}-{i}")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=send, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    db = factory()
+    assert db.query(Message).count() == 160
+    assert db.get(Conversation, conv_id).unread_for_imam == 160
@@ -0,0 +1,76 @@
+"""Tests for the pluggable nearest-neighbour backends"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import vector_index
+from embedding_store import EmbeddingStore
+from vector_index import FlatIndex, IVFIndex, load_or_build_index, recall_at_k, sample_queries
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Clustered data, like sentence embeddings of verses grouped by theme
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, 32))
+    vectors = centers[rng.integers(40, size=4000)] + 0.3 * rng.standard_normal((4000, 32))
+    return EmbeddingStore.build(tmp_path / "store.npy", vectors, "m", "checksum-1")
+
+
+def test_flat_index_is_exact(store):
+    query = np.asarray(store.matrix[7], dtype=np.float32)
+    indices, scores = FlatIndex(store).search(query, 5)
+    assert indices[0] == 7
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_ivf_recall_against_flat(store):
+    index = IVFIndex(store, nprobe=8).train()
+    recall = recall_at_k(index, FlatIndex(store), sample_queries(store, n=100), k=10)
+    assert recall >= 0.9
+
+
+def test_ivf_is_persisted_and_invalidated_by_store_checksum(store, tmp_path):
+    built = load_or_build_index(store, kind="ivf")
+    assert (tmp_path / "store.ivf.npz").exists()
+    assert built.recall is not None
+
+    reloaded = IVFIndex.load(tmp_path / "store.ivf.npz", store)
+    query = sample_queries(store, n=1)[0]
+    assert np.array_equal(built.search(query, 5)[0], reloaded.search(query, 5)[0])
+
+    rebuilt_store = EmbeddingStore.build(tmp_path / "store.npy", np.asarray(store.matrix), "m", "checksum-2")
+    assert IVFIndex.load(tmp_path / "store.ivf.npz", rebuilt_store) is None
+
+
+def test_unavailable_backend_falls_back_to_flat(store, monkeypatch):
+    monkeypatch.setattr(vector_index, "HNSWLIB_AVAILABLE", False)
+    assert isinstance(load_or_build_index(store, kind="hnsw"), FlatIndex)
+    assert isinstance(load_or_build_index(store, kind="nonsense"), FlatIndex)
+
+
+def test_hnsw_meta_is_written_atomically_and_paired_with_its_graph(store, tmp_path, monkeypatch):
+    class GraphFile:
+        """Stands in for the hnswlib graph: only its serialized bytes matter here"""
+
+        def __init__(self, payload):
+            self.payload = payload
+
+        def save_index(self, path):
+            Path(path).write_bytes(self.payload)
+
+    monkeypatch.setattr(vector_index, "HNSWLIB_AVAILABLE", True)
+    path = tmp_path / "store.hnsw.bin"
+    index = vector_index.HNSWIndex(store)
+    index.graph = GraphFile(b"graph v1")
+    index.save(path)
+    assert sorted(p.name for p in tmp_path.glob("store.hnsw.*")) == ["store.hnsw.bin", "store.hnsw.json"]
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    # A new graph next to the old meta (crash or reader between the two renames) is stale
+    path.write_bytes(b"graph v2")
+    assert vector_index.HNSWIndex.load(path, store) is None
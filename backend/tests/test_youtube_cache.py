@@ -0,0 +1,111 @@
+"""Tests for the YouTube search cache (fake clock and fetch, no network)"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from youtube_cache import YOUTUBE_SEARCH_COST, QuotaExhaustedError, YouTubeSearchCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeFetch:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, query, max_results):
+        self.calls += 1
+        return [{"video_id": f"v{self.calls}", "title": query}][:max_results]
+
+
+def _cache(tmp_path, clock, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'yt.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    options = dict(ttl=60, max_stale=600, daily_quota=1000)
+    options.update(kwargs)
+    return YouTubeSearchCache(session_factory=sessionmaker(bind=engine), clock=clock, **options)
+
+
+def test_normalized_queries_share_one_api_call(tmp_path):
+    clock, fetch = FakeClock(), FakeFetch()
+    cache = _cache(tmp_path, clock)
+
+    async def run():
+        first = await cache.search("videos", "Islamic Patience!", 5, fetch)
+        second = await cache.search("videos", "islamic   patience", 5, fetch)
+        other_size = await cache.search("videos", "islamic patience", 3, fetch)
+        return first, second, other_size
+
+    first, second, _ = asyncio.run(run())
+    assert first == second
+    assert fetch.calls == 2
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["quota_used"] == 2 * YOUTUBE_SEARCH_COST
+    assert stats["quota_saved"] == YOUTUBE_SEARCH_COST
+
+
+def test_stale_results_are_served_while_refreshing(tmp_path):
+    clock, fetch = FakeClock(), FakeFetch()
+    cache = _cache(tmp_path, clock)
+
+    async def run():
+        await cache.search("videos", "sabr", 5, fetch)
+        clock.now += 120  # past the TTL, within max_stale
+        stale = await cache.search("videos", "sabr", 5, fetch)
+        await asyncio.gather(*cache._refreshing.values())
+        fresh = await cache.search("videos", "sabr", 5, fetch)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+    assert stale[0]["video_id"] == "v1"
+    assert fresh[0]["video_id"] == "v2"
+    assert cache.stats["stale_hits"] == 1 and cache.stats["refreshes"] == 1
+
+
+def test_expired_rows_and_empty_results(tmp_path):
+    clock, fetch = FakeClock(), FakeFetch()
+    cache = _cache(tmp_path, clock)
+
+    async def empty(query, max_results):
+        return []
+
+    async def run():
+        await cache.search("videos", "dhikr", 5, fetch)
+        clock.now += 1000  # beyond ttl + max_stale: refetched before answering
+        expired = await cache.search("videos", "dhikr", 5, fetch)
+        await cache.search("videos", "nothing", 5, empty)
+        await cache.search("videos", "nothing", 5, empty)
+        return expired
+
+    assert asyncio.run(run())[0]["video_id"] == "v2"
+    assert cache.stats["misses"] == 4  # empty lists are not cached
+
+
+def test_spent_quota_serves_cache_or_raises(tmp_path):
+    clock, fetch = FakeClock(), FakeFetch()
+    cache = _cache(tmp_path, clock, daily_quota=YOUTUBE_SEARCH_COST)
+
+    async def run():
+        await cache.search("videos", "tawbah", 5, fetch)
+        clock.now += 1000
+        old = await cache.search("videos", "tawbah", 5, fetch)
+        with pytest.raises(QuotaExhaustedError):
+            await cache.search("videos", "zakat", 5, fetch)
+        return old
+
+    assert asyncio.run(run())[0]["video_id"] == "v1"
+    assert fetch.calls == 1
+    assert cache.get_stats()["quota_remaining"] == 0
@@ -0,0 +1,75 @@
+"""Tests for the pipelined local + AI YouTube search (fake Groq and YouTube, no network)"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services_youtube_ai import YouTubeAIService, merge_video_results
+
+AI_QUERY = "Islamic patience during exams hadith"
+
+
+def _video(video_id):
+    return {"video_id": video_id, "title": video_id}
+
+
+def _fake_services(monkeypatch, ai_query=AI_QUERY, delay=0.1, timeline=None):
+    searches = []
+    timeline = [] if timeline is None else timeline
+
+    async def extract(user_prompt):
+        timeline.append("extract started")
+        await asyncio.sleep(delay)
+        timeline.append("extract finished")
+        return {"main_topic": "Patience", "keywords": ["sabr"], "search_query": ai_query, "success": True}
+
+    async def search(search_query, max_results=6):
+        searches.append(search_query)
+        prefix = "ai" if search_query == ai_query else "local"
+        timeline.append(f"{prefix} search started")
+        await asyncio.sleep(delay)
+        timeline.append(f"{prefix} search finished")
+        return [_video(f"{prefix}-1"), _video("shared")]
+
+    monkeypatch.setattr(YouTubeAIService, "extract_keywords_from_prompt", staticmethod(extract))
+    monkeypatch.setattr(YouTubeAIService, "search_youtube_videos", staticmethod(search))
+    return searches
+
+
+def _collect(user_prompt):
+    async def run():
+        return [item async for item in YouTubeAIService.stream_personalized_videos(user_prompt, max_results=6)]
+    return asyncio.run(run())
+
+
+def test_local_results_arrive_first_and_are_merged(monkeypatch):
+    timeline = []
+    _fake_services(monkeypatch, timeline=timeline)
+    events = _collect("I keep losing my patience before exams")
+
+    assert [event for event, _ in events] == ["local", "ai", "complete"]
+    assert events[0][1]["search_query"] == "Islamic patience sabr in hardship Quran"
+    complete = events[-1][1]
+    assert [video["video_id"] for video in complete["videos"]] == ["ai-1", "shared", "local-1"]
+    assert complete["ai_generated"] is True
+    # Extraction overlaps the local search instead of following it
+    assert timeline.index("local search started") < timeline.index("extract finished")
+    assert timeline.index("extract started") < timeline.index("local search finished")
+
+
+def test_matching_queries_share_one_search(monkeypatch):
+    searches = _fake_services(monkeypatch, ai_query="Islamic patience sabr in hardship Quran")
+    events = _collect("patience")
+    assert len(searches) == 1
+    assert events[-1][1]["video_count"] == 2
+
+
+def test_local_keywords_fall_back_to_defaults():
+    assert YouTubeAIService.get_local_keywords("my mother is in hospital")["main_topic"] == "Health & Illness"
+    assert YouTubeAIService.get_local_keywords("xyzzy") == YouTubeAIService.get_default_keywords()
+
+
+def test_merge_deduplicates_and_caps():
+    merged = merge_video_results([_video("a"), _video("b")], [_video("b"), _video("c"), _video("d")], 3)
+    assert [video["video_id"] for video in merged] == ["a", "b", "c"]
@@ -0,0 +1,327 @@
+"""
+Vector Index - Pluggable nearest-neighbour engines over an EmbeddingStore
+
+    flat  exact brute force (one matrix-vector product + argpartition)
+    ivf   inverted file: k-means coarse quantizer, only the nprobe closest
+          clusters are scored. Pure numpy, no extra dependency.
+    hnsw  graph index via the optional hnswlib package (pip install hnswlib)
+
+All backends return the same (indices, scores) pair, so callers such as
+QuranSemanticSearch.search() do not change when the backend does. Approximate
+indexes are persisted next to their store and carry the store checksum, so a
+rebuilt store invalidates them. When an approximate index is built, its
+recall@k against the flat backend is measured and kept in index.recall.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from embedding_store import unique_temp_path
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    hnswlib = None
+    HNSWLIB_AVAILABLE = False
+
+ANN_BACKEND = os.getenv("QURAN_ANN_BACKEND", "flat").strip().lower()
+IVF_NPROBE = int(os.getenv("QURAN_IVF_NPROBE", "8"))
+HNSW_EF_SEARCH = int(os.getenv("QURAN_HNSW_EF", "64"))
+RECALL_K = 10
+RECALL_SAMPLE = 200
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class VectorIndex:
+    """Interface shared by all nearest-neighbour backends"""
+
+    kind = "base"
+
+    def __init__(self, store):
+        self.store = store
+        self.recall = None  # recall@RECALL_K against FlatIndex, when measured
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, cosine scores) of the k nearest stored vectors, best first"""
+        raise NotImplementedError
+
+    def save(self, path: Path):
+        """Persist index structures (the vectors themselves stay in the store)"""
+
+    @classmethod
+    def load(cls, path: Path, store) -> Optional["VectorIndex"]:
+        """Load a persisted index for store, or None if missing/stale"""
+        raise NotImplementedError
+
+    def _meta(self) -> dict:
+        return {"kind": self.kind, "checksum": self.store.header["checksum"], "count": len(self.store), "recall": self.recall}
+
+    def _meta_matches(self, meta: dict) -> bool:
+        return meta.get("kind") == self.kind and meta.get("checksum") == self.store.header["checksum"] \
+            and meta.get("count") == len(self.store)
+
+
+class FlatIndex(VectorIndex):
+    """Exact search: scores every vector"""
+
+    kind = "flat"
+
+    def __init__(self, store):
+        super().__init__(store)
+        self.recall = 1.0
+
+    def search(self, query, k):
+        scores = self.store.scores(query)
+        indices = _top_k(scores, k)
+        return indices, scores[indices]
+
+    @classmethod
+    def load(cls, path, store):
+        return cls(store)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: k-means clusters, search probes the closest nprobe lists"""
+
+    kind = "ivf"
+
+    def __init__(self, store, nprobe: int = IVF_NPROBE):
+        super().__init__(store)
+        self.nprobe = nprobe
+        self.centroids = None   # (nlist, dim) unit vectors
+        self.order = None       # row ids grouped by cluster
+        self.offsets = None     # cluster c owns order[offsets[c]:offsets[c + 1]]
+
+    def train(self, nlist: int = None, iterations: int = 15, seed: int = 0) -> "IVFIndex":
+        """Spherical k-means over the stored vectors"""
+        vectors = self._dense_rows(np.arange(len(self.store)))
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(4 * np.sqrt(n)), n))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms < 1e-12
+            centroids[~empty] = sums[~empty] / norms[~empty, None]
+            # Re-seed empty clusters so every list stays useful
+            if empty.any():
+                centroids[empty] = vectors[rng.integers(n, size=int(empty.sum()))]
+
+        assignment = self._assign(vectors, centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.order = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+        return self
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_rows: int = 8192) -> np.ndarray:
+        """Nearest centroid per vector, in chunks to bound the score matrix size"""
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_rows):
+            assignment[start:start + chunk_rows] = np.argmax(vectors[start:start + chunk_rows] @ centroids.T, axis=1)
+        return assignment
+
+    def _dense_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Rows of the store as float32 unit vectors, whatever the storage dtype"""
+        matrix = np.asarray(self.store.matrix[rows], dtype=np.float32)
+        if self.store.dtype == "int8":
+            matrix /= 127.0
+        return matrix
+
+    def search(self, query, k):
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes])
+        if len(rows) < k:
+            # Too few candidates in the probed lists: fall back to exact search
+            scores = self.store.scores(query)
+            indices = _top_k(scores, k)
+            return indices, scores[indices]
+
+        rows.sort()  # sequential access through the memory map
+        scores = self._dense_rows(rows) @ query
+        best = _top_k(scores, k)
+        return rows[best], scores[best]
+
+    def save(self, path):
+        path = Path(path)
+        tmp = unique_temp_path(path)
+        try:
+            with open(tmp, "wb") as f:
+                np.savez(f, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                         meta=np.array(json.dumps(self._meta())))
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path, store):
+        path = Path(path)
+        if not path.exists():
+            return None
+        index = cls(store)
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if not index._meta_matches(meta):
+                    return None
+                index.centroids = data["centroids"]
+                index.order = data["order"]
+                index.offsets = data["offsets"]
+                index.recall = meta.get("recall")
+        except Exception as e:
+            print(f"Error loading IVF index {path}: {e}")
+            return None
+        return index
+
+
+class HNSWIndex(VectorIndex):
+    """Hierarchical navigable small-world graph (requires hnswlib)"""
+
+    kind = "hnsw"
+
+    def __init__(self, store, ef_search: int = HNSW_EF_SEARCH):
+        if not HNSWLIB_AVAILABLE:
+            raise ImportError("hnswlib is not installed (pip install hnswlib)")
+        super().__init__(store)
+        self.ef_search = ef_search
+        self.graph = None
+
+    def train(self, m: int = 16, ef_construction: int = 200) -> "HNSWIndex":
+        self.graph = hnswlib.Index(space="ip", dim=self.store.dimension)
+        self.graph.init_index(max_elements=len(self.store), M=m, ef_construction=ef_construction)
+        for start in range(0, len(self.store), 4096):
+            chunk = np.asarray(self.store.matrix[start:start + 4096], dtype=np.float32)
+            if self.store.dtype == "int8":
+                chunk /= 127.0
+            self.graph.add_items(chunk, np.arange(start, start + len(chunk)))
+        self.graph.set_ef(self.ef_search)
+        return self
+
+    def search(self, query, k):
+        k = min(k, len(self.store))
+        labels, distances = self.graph.knn_query(query.reshape(1, -1), k=k)
+        # hnswlib "ip" distance is 1 - inner product
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+    def save(self, path):
+        """
+        Write the graph and its .json meta under temporary names, then rename
+        both into place. The meta carries the graph's sha256, so a reader
+        that catches one file new and the other old sees a stale index.
+        """
+        path = Path(path)
+        meta_path = path.with_suffix(".json")
+        tmp, tmp_meta = unique_temp_path(path), unique_temp_path(meta_path)
+        try:
+            self.graph.save_index(str(tmp))
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({**self._meta(), "graph_sha256": _file_sha256(tmp)}, f)
+            os.replace(tmp, path)
+            os.replace(tmp_meta, meta_path)
+        finally:
+            for leftover in (tmp, tmp_meta):
+                leftover.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path, store):
+        path = Path(path)
+        meta_path = path.with_suffix(".json")
+        if not HNSWLIB_AVAILABLE or not path.exists() or not meta_path.exists():
+            return None
+        index = cls(store)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if not index._meta_matches(meta) or meta.get("graph_sha256") != _file_sha256(path):
+                return None
+            index.graph = hnswlib.Index(space="ip", dim=store.dimension)
+            index.graph.load_index(str(path), max_elements=len(store))
+            index.graph.set_ef(index.ef_search)
+            index.recall = meta.get("recall")
+        except Exception as e:
+            print(f"Error loading HNSW index {path}: {e}")
+            return None
+        return index
+
+
+INDEX_BACKENDS = {"flat": FlatIndex, "ivf": IVFIndex, "hnsw": HNSWIndex}
+INDEX_SUFFIXES = {"ivf": ".ivf.npz", "hnsw": ".hnsw.bin"}
+
+
+def recall_at_k(index: VectorIndex, exact: VectorIndex, queries: np.ndarray, k: int = RECALL_K) -> float:
+    """Fraction of the exact top-k that the index also returns, averaged over queries"""
+    if len(queries) == 0:
+        return 1.0
+    hits = 0
+    for query in queries:
+        expected = set(exact.search(query, k)[0].tolist())
+        hits += len(expected & set(index.search(query, k)[0].tolist()))
+    return hits / (len(queries) * min(k, len(exact)))
+
+
+def sample_queries(store, n: int = RECALL_SAMPLE, noise: float = 0.05, seed: int = 0) -> np.ndarray:
+    """Perturbed copies of stored vectors, used as recall probes"""
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(store), min(n, len(store)), replace=False))
+    queries = np.asarray(store.matrix[rows], dtype=np.float32)
+    if store.dtype == "int8":
+        queries /= 127.0
+    queries += rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def load_or_build_index(store, kind: str = None) -> VectorIndex:
+    """
+    Return the configured index for store, loading a persisted one if it is
+    still valid and otherwise building, measuring recall and saving it.
+    Unknown or unavailable backends fall back to flat.
+    """
+    kind = (kind or ANN_BACKEND).lower()
+    if kind not in INDEX_BACKENDS:
+        print(f"Unknown ANN backend '{kind}', using flat")
+        kind = "flat"
+    if kind == "hnsw" and not HNSWLIB_AVAILABLE:
+        print("hnswlib not installed, using flat index")
+        kind = "flat"
+    if kind == "flat":
+        return FlatIndex(store)
+
+    path = Path(str(store.path)[:-len(".npy")] + INDEX_SUFFIXES[kind])
+    index = INDEX_BACKENDS[kind].load(path, store)
+    if index is not None:
+        print(f"Loaded {kind} index ({len(store)} vectors, recall@{RECALL_K}={index.recall})")
+        return index
+
+    index = INDEX_BACKENDS[kind](store).train()
+    index.recall = recall_at_k(index, FlatIndex(store), sample_queries(store))
+    index.save(path)
+    print(f"Built {kind} index ({len(store)} vectors, recall@{RECALL_K}={index.recall:.3f})")
+    return index
@@ -0,0 +1,217 @@
+"""
+YouTube Cache - Database cache for YouTube Data API searches
+
+Every search.list call costs YOUTUBE_SEARCH_COST (100) quota units, out of a
+daily quota of YOUTUBE_DAILY_QUOTA (10,000 by default), so searches are
+cached in the youtube_search_cache table, keyed by namespace + normalized
+query + max_results:
+
+- fresh   (younger than YOUTUBE_CACHE_TTL): served, no API call
+- stale   (younger than YOUTUBE_CACHE_TTL + YOUTUBE_CACHE_MAX_STALE): served
+          immediately while one background task refreshes the row
+- expired or missing: fetched before answering
+
+Empty result lists are never stored (the search helpers return [] on API
+errors). Calls are counted per quota day (midnight Pacific time, when
+YouTube resets quotas) in the youtube_quota table, so every process shares
+one count. Once the day's quota is spent no more calls are made: any cached
+row is served regardless of age, otherwise QuotaExhaustedError is raised.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models_extended import CachedVideoSearch, YouTubeQuotaUsage
+from query_cache import normalize_query
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:  # no tz database: count quota days in UTC
+    from datetime import timezone
+    QUOTA_TIMEZONE = timezone.utc
+
+YOUTUBE_CACHE_TTL = float(os.getenv("YOUTUBE_CACHE_TTL", str(6 * 3600)))
+YOUTUBE_CACHE_MAX_STALE = float(os.getenv("YOUTUBE_CACHE_MAX_STALE", str(7 * 24 * 3600)))
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_SEARCH_COST = 100
+
+Fetch = Callable[[str, int], Awaitable[List[dict]]]
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when the day's YouTube quota is spent and nothing is cached"""
+
+
+class YouTubeSearchCache:
+    """Stale-while-revalidate cache of YouTube searches with quota accounting"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        ttl: float = YOUTUBE_CACHE_TTL,
+        max_stale: float = YOUTUBE_CACHE_MAX_STALE,
+        daily_quota: int = YOUTUBE_DAILY_QUOTA,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.daily_quota = daily_quota
+        self.clock = clock
+        self._refreshing = {}  # key -> background refresh task
+
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0, "quota_rejections": 0}
+
+    async def search(self, namespace: str, query: str, max_results: int, fetch: Fetch) -> List[dict]:
+        """Cached results for query, calling fetch(query, max_results) when needed"""
+        key = (namespace, normalize_query(query), max_results)
+        row = self._load(key)
+        age = self.clock() - row.fetched_at if row is not None else None
+
+        if row is not None and age < self.ttl:
+            self.stats["hits"] += 1
+            return row.results
+
+        if row is not None and (age < self.ttl + self.max_stale or self.quota_remaining() < YOUTUBE_SEARCH_COST):
+            self.stats["stale_hits"] += 1
+            self._schedule_refresh(key, query, fetch)
+            return row.results
+
+        self.stats["misses"] += 1
+        try:
+            return await self._fetch(key, query, fetch)
+        except QuotaExhaustedError:
+            if row is not None:
+                return row.results
+            raise
+
+    async def _fetch(self, key, query: str, fetch: Fetch) -> List[dict]:
+        if not self._spend_quota():
+            self.stats["quota_rejections"] += 1
+            raise QuotaExhaustedError("YouTube API quota for today is spent")
+        results = await fetch(query, key[2])
+        if results:
+            self._store(key, results)
+        return results
+
+    def _schedule_refresh(self, key, query: str, fetch: Fetch):
+        if key in self._refreshing or self.quota_remaining() < YOUTUBE_SEARCH_COST:
+            return
+        task = asyncio.get_running_loop().create_task(self._refresh(key, query, fetch))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda done, key=key: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key, query: str, fetch: Fetch):
+        try:
+            await self._fetch(key, query, fetch)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            print(f"YouTube cache refresh failed for {key[1]!r}: {e}")
+
+    def _load(self, key) -> Optional[CachedVideoSearch]:
+        namespace, query_key, max_results = key
+        db = self.session_factory()
+        try:
+            row = db.query(CachedVideoSearch).filter(
+                CachedVideoSearch.namespace == namespace,
+                CachedVideoSearch.query_key == query_key,
+                CachedVideoSearch.max_results == max_results
+            ).first()
+            if row is not None:
+                db.expunge(row)
+            return row
+        finally:
+            db.close()
+
+    def _store(self, key, results: List[dict]):
+        namespace, query_key, max_results = key
+        db = self.session_factory()
+        try:
+            updated = db.execute(
+                update(CachedVideoSearch)
+                .where(
+                    CachedVideoSearch.namespace == namespace,
+                    CachedVideoSearch.query_key == query_key,
+                    CachedVideoSearch.max_results == max_results
+                )
+                .values(results=results, fetched_at=self.clock())
+            ).rowcount
+            if not updated:
+                db.add(CachedVideoSearch(
+                    namespace=namespace,
+                    query_key=query_key,
+                    max_results=max_results,
+                    results=results,
+                    fetched_at=self.clock()
+                ))
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another process stored the same search first
+        finally:
+            db.close()
+
+    def quota_day(self) -> str:
+        return datetime.fromtimestamp(self.clock(), QUOTA_TIMEZONE).date().isoformat()
+
+    def quota_used(self) -> int:
+        db = self.session_factory()
+        try:
+            usage = db.query(YouTubeQuotaUsage).filter(YouTubeQuotaUsage.day == self.quota_day()).first()
+            return usage.units if usage else 0
+        finally:
+            db.close()
+
+    def quota_remaining(self) -> int:
+        return self.daily_quota - self.quota_used()
+
+    def _spend_quota(self) -> bool:
+        """Reserve one search call against today's quota; False when it is spent"""
+        day = self.quota_day()
+        db = self.session_factory()
+        try:
+            for _ in range(2):
+                spent = db.execute(
+                    update(YouTubeQuotaUsage)
+                    .where(
+                        YouTubeQuotaUsage.day == day,
+                        YouTubeQuotaUsage.units + YOUTUBE_SEARCH_COST <= self.daily_quota
+                    )
+                    .values(units=YouTubeQuotaUsage.units + YOUTUBE_SEARCH_COST, calls=YouTubeQuotaUsage.calls + 1)
+                ).rowcount
+                if spent:
+                    db.commit()
+                    return True
+                if db.query(YouTubeQuotaUsage).filter(YouTubeQuotaUsage.day == day).first() is not None:
+                    db.rollback()
+                    return False
+                try:
+                    db.add(YouTubeQuotaUsage(day=day, units=0, calls=0))
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()  # created concurrently; retry the update
+            return False
+        finally:
+            db.close()
+
+    def get_stats(self) -> dict:
+        used = self.quota_used()
+        return {
+            **self.stats,
+            "refreshing": len(self._refreshing),
+            "quota_day": self.quota_day(),
+            "quota_used": used,
+            "quota_remaining": self.daily_quota - used,
+            "quota_saved": (self.stats["hits"] + self.stats["stale_hits"]) * YOUTUBE_SEARCH_COST,
+        }
+
+
+# Shared cache used by routes/videos.py and services_youtube_ai.py
+youtube_search_cache = YouTubeSearchCache()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Recompute the live chats' unread counters and last-message snapshot.
+
+Chat.unread_for_user / unread_for_imam / last_message_preview /
+last_message_at are maintained by the /api/v1/chat message endpoints. This
+script recomputes them from chat_messages (one windowed query, see
+ChatService.get_chat_summaries) to repair drift. Pending migrations (which
+add these columns to older databases) are applied first.
+
+Usage:
+    python scripts/reconcile_chat_counters.py
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import Base, SessionLocal, engine
+from app.migrations import run_migrations
+from app.services.chat_service import ChatService
+
+
+if __name__ == "__main__":
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        repaired = ChatService.reconcile_counters(db)
+    finally:
+        db.close()
+    print(f"✅ Reconciled chat counters: {repaired} chats repaired")